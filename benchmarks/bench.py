@@ -0,0 +1,198 @@
+"""
+Time the read_stats pipeline stages on synthetic data.
+
+Usage:
+    python -m benchmarks.bench --reads 1000000 --output results.json
+    python -m benchmarks.bench --reads 1000000 --compare results.json
+    python -m benchmarks.bench --reads 1000000 --io-threads 4 --compare results.json
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from benchmarks.synthetic import SyntheticConfig, make_dataset
+from read_stats.file_reader import read_bam, read_bed
+from read_stats.stats import StatsBatch, compute_stats_batches
+from read_stats.check_overlap import check_overlap
+from read_stats.report import write_tsv, write_html
+from read_stats.profiling import peak_rss_mb
+
+# Bump when stages or their meaning change; results of other versions are not compared
+BENCHMARK_VERSION = 1
+
+STAGES = ["scan", "stats", "overlap", "tsv", "html"]
+
+
+def run_stages(bam_path, bed_path, output_dir, io_threads=0):
+    """
+    Run each pipeline stage once and time it, reading the BAM file with
+    ``io_threads`` BGZF decompression threads.
+
+    Returns:
+        dict: Per stage, the wall-clock seconds, reads processed, reads per
+        second and the process peak RSS (MB) after the stage.
+    """
+    results = {}
+
+    def timed(stage, func, reads=None):
+        start = time.perf_counter()
+        value = func()
+        seconds = time.perf_counter() - start
+        if reads is not None:
+            count = reads
+        else:
+            count = value if isinstance(value, int) else len(value)
+        results[stage] = {"seconds": seconds, "reads": count,
+                          "reads_per_sec": count / seconds if seconds > 0 else None,
+                          "peak_rss_mb": peak_rss_mb()}
+        return value
+
+    bam = read_bam(bam_path, io_threads)
+    try:
+        # Iteration alone: BGZF decompression and record parsing in pysam
+        timed("scan", lambda: sum(1 for _ in bam.fetch()))
+        stats = timed("stats", lambda: StatsBatch.concat(
+            compute_stats_batches(bam.fetch(), bam.references), bam.references))
+        stats = timed("overlap", lambda: check_overlap(stats.to_frame(), read_bed(bed_path)),
+                      reads=len(stats))
+        timed("tsv", lambda: write_tsv(stats, os.path.join(output_dir, "output.tsv")),
+              reads=len(stats))
+        timed("html", lambda: write_html(stats, os.path.join(output_dir, "output.html")),
+              reads=len(stats))
+    finally:
+        bam.close()
+    return results
+
+
+def best_of(runs):
+    """Fastest run of each stage, with the highest peak RSS seen."""
+    best = {}
+    for stage in STAGES:
+        fastest = dict(min((run[stage] for run in runs), key=lambda r: r["seconds"]))
+        fastest["peak_rss_mb"] = max(run[stage]["peak_rss_mb"] for run in runs)
+        best[stage] = fastest
+    return best
+
+
+def run_benchmark(config, workdir=None, repeat=1, io_threads=0):
+    """
+    Generate a synthetic dataset for ``config`` and time the stages on it.
+
+    Returns:
+        dict: JSON-serializable results with the configuration, environment
+        and the best of ``repeat`` timings per stage.
+    """
+    with tempfile.TemporaryDirectory(dir=workdir) as tmpdir:
+        start = time.perf_counter()
+        bam_path, bed_path = make_dataset(tmpdir, config)
+        generate_seconds = time.perf_counter() - start
+        runs = [run_stages(bam_path, bed_path, os.path.join(tmpdir, f"run{i}"), io_threads)
+                for i in range(repeat)]
+        bam_bytes = os.path.getsize(bam_path)
+    return {
+        "version": BENCHMARK_VERSION,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "environment": {"python": platform.python_version(), "platform": platform.platform()},
+        "config": config.as_dict(),
+        "bam_bytes": bam_bytes,
+        "generate_seconds": generate_seconds,
+        "repeat": repeat,
+        # Not part of the config: comparing thread counts is the point of --compare
+        "io_threads": io_threads,
+        "stages": best_of(runs),
+    }
+
+
+def compare(baseline, current, tolerance=0.1):
+    """
+    Compare the stage timings of two benchmark results.
+
+    Args:
+        baseline (dict): Earlier results, as written by ``run_benchmark``.
+        current (dict): New results.
+        tolerance (float): Allowed relative slowdown, e.g. 0.1 for 10%.
+
+    Returns:
+        tuple[list[str], list[str]]: Report lines for every stage, and the
+        stages that got slower than ``tolerance`` allows.
+    """
+    if baseline.get("version") != current.get("version"):
+        raise ValueError("Benchmark results of different versions cannot be compared.")
+    if baseline.get("config") != current.get("config"):
+        raise ValueError("Benchmark results of different configurations cannot be compared.")
+    lines, regressions = [], []
+    for stage in STAGES:
+        before = baseline["stages"][stage]["seconds"]
+        after = current["stages"][stage]["seconds"]
+        ratio = after / before if before > 0 else float("inf")
+        lines.append(f"{stage:8s} {before:9.3f}s -> {after:9.3f}s  ({ratio:.2f}x)")
+        if ratio > 1 + tolerance:
+            regressions.append(stage)
+    return lines, regressions
+
+
+def format_results(results):
+    lines = [f"{results['config']['reads']} reads, BAM {results['bam_bytes'] / 1e6:.1f} MB, "
+             f"{results.get('io_threads', 0)} decompression threads"]
+    for stage, r in results["stages"].items():
+        rate = f"{r['reads_per_sec']:,.0f} reads/s" if r["reads_per_sec"] else "-"
+        lines.append(f"{stage:8s} {r['seconds']:9.3f}s  {rate:>20s}  "
+                     f"peak RSS {r['peak_rss_mb']:.0f} MB")
+    return "\n".join(lines)
+
+
+def parse_args(argv=None):
+    defaults = SyntheticConfig()
+    parser = argparse.ArgumentParser(description="Benchmark read_stats on a synthetic BAM file.")
+    parser.add_argument("--reads", type=int, default=defaults.reads)
+    parser.add_argument("--contigs", type=int, default=defaults.contigs)
+    parser.add_argument("--contig-length", type=int, default=defaults.contig_length)
+    parser.add_argument("--read-length", type=int, default=defaults.read_length)
+    parser.add_argument("--unmapped-fraction", type=float, default=defaults.unmapped_fraction)
+    parser.add_argument("--nm-fraction", type=float, default=defaults.nm_fraction)
+    parser.add_argument("--duplicate-fraction", type=float, default=defaults.duplicate_fraction)
+    parser.add_argument("--intervals", type=int, default=defaults.intervals)
+    parser.add_argument("--interval-length", type=int, default=defaults.interval_length)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="Run the stages this many times and keep the fastest")
+    parser.add_argument("--io-threads", type=int, default=0,
+                        help="BGZF decompression threads of the BAM file (default: 0)")
+    parser.add_argument("--workdir",
+                        help="Directory for the synthetic files (default: system temp)")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Earlier JSON results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="Allowed relative slowdown per stage with --compare (default: 0.1)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    config = SyntheticConfig(
+        reads=args.reads, contigs=args.contigs, contig_length=args.contig_length,
+        read_length=args.read_length, unmapped_fraction=args.unmapped_fraction,
+        nm_fraction=args.nm_fraction, duplicate_fraction=args.duplicate_fraction,
+        intervals=args.intervals, interval_length=args.interval_length, seed=args.seed)
+    results = run_benchmark(config, args.workdir, args.repeat, args.io_threads)
+    print(format_results(results))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        lines, regressions = compare(baseline, results, args.tolerance)
+        print("\n".join(lines))
+        if regressions:
+            print(f"Slower than {args.tolerance:.0%} tolerance: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
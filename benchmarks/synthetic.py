@@ -0,0 +1,122 @@
+import os
+from dataclasses import dataclass, asdict
+import numpy as np
+import pysam
+
+_BASES = np.frombuffer(b"ACGT", dtype=np.uint8)
+
+
+@dataclass
+class SyntheticConfig:
+    """Shape of a synthetic BAM and BED file."""
+    reads: int = 100_000
+    contigs: int = 4
+    contig_length: int = 10_000_000
+    read_length: int = 150
+    # Reads are placed next to their mate but flagged unmapped
+    unmapped_fraction: float = 0.05
+    # Mapped reads carrying an NM tag
+    nm_fraction: float = 0.95
+    duplicate_fraction: float = 0.1
+    secondary_fraction: float = 0.02
+    gc_fraction: float = 0.45
+    fragment_mean: int = 300
+    intervals: int = 10_000
+    interval_length: int = 200
+    seed: int = 0
+
+    def as_dict(self):
+        return asdict(self)
+
+
+def contig_names(config):
+    return [f"chr{i + 1}" for i in range(config.contigs)]
+
+
+def write_bam(path, config):
+    """
+    Write a coordinate-sorted, indexed BAM file of random reads.
+
+    Reads are spread evenly over the contigs with random starts, a full-length
+    match CIGAR, random bases with the configured GC fraction, random
+    qualities and mapping qualities and, for most reads, an NM tag.
+
+    Returns:
+        str: ``path``, next to which the ``.bai`` index is written.
+    """
+    rng = np.random.default_rng(config.seed)
+    names = contig_names(config)
+    header = {"HD": {"VN": "1.6", "SO": "coordinate"},
+              "SQ": [{"SN": name, "LN": config.contig_length} for name in names]}
+    length = config.read_length
+    at = (1 - config.gc_fraction) / 2
+    gc = config.gc_fraction / 2
+    # Pools of bases and qualities that reads are sliced from
+    pool_size = max(1 << 20, 4 * length)
+    base_pool = _BASES[rng.choice(4, size=pool_size, p=[at, gc, gc, at])].tobytes().decode("ascii")
+    quality_pool = rng.integers(2, 42, size=pool_size, dtype=np.uint8)
+
+    per_contig = np.bincount(np.arange(config.reads) % config.contigs, minlength=config.contigs)
+    with pysam.AlignmentFile(path, "wb", header=header) as bam:
+        read_index = 0
+        for contig, count in enumerate(per_contig):
+            starts = np.sort(rng.integers(0, config.contig_length - length, size=count))
+            unmapped = rng.random(count) < config.unmapped_fraction
+            has_nm = rng.random(count) < config.nm_fraction
+            nm = rng.poisson(1.5, size=count)
+            duplicate = rng.random(count) < config.duplicate_fraction
+            secondary = rng.random(count) < config.secondary_fraction
+            reverse = rng.random(count) < 0.5
+            mapq = rng.integers(0, 61, size=count)
+            fragment = rng.normal(config.fragment_mean, 50, size=count)
+            fragment = np.maximum(length, fragment).astype(int)
+            offsets = rng.integers(0, pool_size - length, size=count)
+            for i in range(count):
+                read = pysam.AlignedSegment(bam.header)
+                read.query_name = f"read{read_index}"
+                read_index += 1
+                offset = offsets[i]
+                read.query_sequence = base_pool[offset:offset + length]
+                read.query_qualities = quality_pool[offset:offset + length]
+                read.reference_id = contig
+                read.reference_start = int(starts[i])
+                if unmapped[i]:
+                    read.flag = 0x1 | 0x4
+                else:
+                    read.flag = (0x1 | 0x2 | (0x10 if reverse[i] else 0x20)
+                                 | (0x400 if duplicate[i] else 0) | (0x100 if secondary[i] else 0))
+                    read.mapping_quality = int(mapq[i])
+                    read.cigartuples = [(0, length)]
+                    read.template_length = int(fragment[i]) * (-1 if reverse[i] else 1)
+                    if has_nm[i]:
+                        read.set_tag("NM", int(nm[i]))
+                bam.write(read)
+    pysam.index(path)
+    return path
+
+
+def write_bed(path, config):
+    """Write ``config.intervals`` random BED intervals over the synthetic contigs."""
+    rng = np.random.default_rng(config.seed + 1)
+    names = contig_names(config)
+    contigs = np.sort(rng.integers(0, config.contigs, size=config.intervals))
+    starts = rng.integers(0, config.contig_length - config.interval_length, size=config.intervals)
+    order = np.lexsort((starts, contigs))
+    with open(path, "w", encoding="utf-8") as f:
+        for i in order:
+            start = int(starts[i])
+            f.write(f"{names[contigs[i]]}\t{start}\t{start + config.interval_length}\n")
+    return path
+
+
+def make_dataset(directory, config):
+    """
+    Write ``synthetic.bam`` (indexed) and ``synthetic.bed`` into ``directory``.
+
+    Returns:
+        tuple[str, str]: The BAM and BED paths.
+    """
+    os.makedirs(directory, exist_ok=True)
+    bam_path = write_bam(os.path.join(directory, "synthetic.bam"), config)
+    bed_path = write_bed(os.path.join(directory, "synthetic.bed"), config)
+    return bam_path, bed_path
@@ -1,30 +1,323 @@
 # __main__.py
 
+import cProfile
+import os
 from read_stats.cli import parse_args
-from read_stats.stats import compute_stats
-from read_stats.file_reader import read_bam, read_bed
-from read_stats.check_overlap import check_overlap
-from read_stats.report import write_tsv, write_html
-from read_stats.logging_config import setup_logger
+from read_stats.profiling import StageProfiler
+from read_stats.logging_config import get_logger, configure_logging
 
-logger = setup_logger(__name__)
+# The pipeline modules (and pandas, pyranges, pysam) are imported by the
+# functions that run them, so --help and argument errors return quickly
+logger = get_logger(__name__)
 
 def main():
     args = parse_args()
-    bam = read_bam(args.bam)
-    bed = read_bed(args.bed) if args.bed else None
-    output_path = args.output
-    
-    stats = []
-    for read in bam.fetch():
-        read_stats = compute_stats(read)
-        if not read_stats:
-            continue
-        stats.append(read_stats)
-    output_df = check_overlap(stats, bed)
-
-    write_html(output_df, output_path + '/output.html') #input this path
-    write_tsv(output_df, output_path + '/output.tsv') #input this path
+    configure_logging()
+    if args.samples or len(args.bam or []) > 1:
+        run_cohort(args)
+        return
+    profiler = StageProfiler(enabled=args.profile or args.cprofile)
+    if not args.cprofile:
+        run(args, profiler)
+    else:
+        # Function-level profile of the whole run, hot loop included
+        cprofile = cProfile.Profile()
+        cprofile.enable()
+        try:
+            run(args, profiler)
+        finally:
+            cprofile.disable()
+            cprofile.dump_stats(os.path.join(args.output, "profile.prof"))
+    if profiler.enabled:
+        profiler.write_json(os.path.join(args.output, "profile.json"))
+
+def run(args, profiler):
+    if not args.bam:
+        raise ValueError("An input BAM file is required (--bam or --samples)")
+    with profiler.stage("setup"):
+        scan = Scan(args, profiler)
+    if scan.cached is None and scan.checkpoint is None and scan.stream and args.workers > 1:
+        summary = write_summarized_shards(scan)
+    else:
+        batches = scan_batches(scan)
+        if scan.stream:
+            summary = write_stream_outputs(batches, scan.intervals, scan.writer, args.output,
+                                           scan.metrics, profiler, scan.pipeline)
+        else:
+            summary = write_outputs(batches, scan)
+    from read_stats.stats import log_read_counts
+
+    log_read_counts(summary, scan.bam.references)
+
+
+class Scan:
+    """
+    Inputs and settings of a single-sample run: the opened BAM file, BED
+    index, filters, per-read writer, stats cache and checkpoint.
+    """
+
+    def __init__(self, args, profiler):
+        from read_stats.stats import (
+            DEFAULT_BATCH_SIZE, ReadFilter, budget_batch_size, parse_metrics, parse_flags
+        )
+        from read_stats.file_reader import read_bam, read_bed, resolve_io_threads
+        from read_stats.check_overlap import IntervalIndex
+        from read_stats.report import stats_writer
+        from read_stats.pipeline import Pipeline
+
+        if args.regions_only and not args.bed:
+            raise ValueError("--regions-only requires a BED file (--bed)")
+        if args.resume and not args.checkpoint_dir:
+            raise ValueError("--resume requires a checkpoint directory (--checkpoint-dir)")
+        self.args = args
+        self.profiler = profiler
+        self.bam_path = args.bam[0]
+        self.reference = _reference(args, self.bam_path)
+        # Each worker process opens its own BAM file; the parent only scans serially
+        self.io_threads = resolve_io_threads(args.io_threads, args.workers)
+        self.bam = read_bam(self.bam_path, self.io_threads if args.workers <= 1 else 0,
+                            self.reference)
+        self.bed = read_bed(args.bed) if args.bed else None
+        # Indexed once; reads are looked up in batches
+        self.intervals = IntervalIndex(self.bed) if self.bed is not None else None
+        self.regions = self.intervals.merged if args.regions_only else None
+        self.metrics = parse_metrics(args.metrics)
+        self.read_filter = ReadFilter(parse_flags(args.require_flags),
+                                      parse_flags(args.exclude_flags), args.min_mapq)
+
+        # Concurrent stages connected by bounded queues; they always stream the outputs
+        self.pipeline = Pipeline() if args.pipeline else None
+        # A memory budget streams the outputs from stats batches that fit in it
+        self.stream = args.stream or bool(args.max_memory) or self.pipeline is not None
+        self.batch_size = (budget_batch_size(args.max_memory, self.metrics) if args.max_memory
+                           else DEFAULT_BATCH_SIZE)
+
+        compression = None if args.compression == "none" else args.compression
+        self.writer = stats_writer(args.output, args.format, compression, self.bam.references)
+        self.cache = self.cache_key = self.cached = self.checkpoint = None
+        self._open_stores()
+
+    def _open_stores(self):
+        from read_stats.cache import StatsCache, stats_key
+        from read_stats.checkpoint import Checkpoint, CHECKPOINT_SHARDS
+        from read_stats.parallel import plan_shards, SHARDS_PER_WORKER
+
+        args = self.args
+        # Per-read stats only depend on the BAM and these settings, not on the BED
+        # overlap, so a warm cache skips the BAM scan
+        settings = {
+            "metrics": self.metrics,
+            "regions": self.regions,
+            "unmapped_names": args.unmapped_names,
+            "read_filter": [self.read_filter.require_flags, self.read_filter.exclude_flags,
+                            self.read_filter.min_mapq],
+            "per_fragment": args.per_fragment,
+            "reference": self.reference.md5s if self.reference is not None else None,
+        }
+        if args.cache_dir:
+            self.cache = StatsCache(args.cache_dir, args.cache_size)
+            self.cache_key = self.cache.key(self.bam_path, self.bam, **settings)
+            self.cached = self.cache.load(self.cache_key)
+
+        # Finished shards are persisted, so an interrupted scan can be resumed
+        if self.cached is None and args.checkpoint_dir:
+            self.checkpoint = Checkpoint(args.checkpoint_dir,
+                                         stats_key(self.bam_path, self.bam, **settings))
+            n_shards = max(args.workers * SHARDS_PER_WORKER, CHECKPOINT_SHARDS)
+            self.checkpoint.start(lambda: plan_shards(self.bam_path, args.workers, self.regions,
+                                                      n_shards, self.reference,
+                                                      whole_contigs=args.per_fragment),
+                                  resume=args.resume)
+
+    @property
+    def scan_options(self):
+        # Keyword arguments shared by the scans of the BAM file
+        return {"batch_size": self.batch_size, "unmapped_names": self.args.unmapped_names,
+                "metrics": self.metrics,
+                "read_filter": self.read_filter, "reference": self.reference,
+                "per_fragment": self.args.per_fragment}
+
+    def stage(self, name, iterable, reads=len):
+        """A concurrent pipeline stage, or a profiled step of the sequential run."""
+        if self.pipeline is not None:
+            return self.pipeline.stage(name, iterable)
+        return self.profiler.iterate(name, iterable, reads=reads)
+
+
+def _reference(args, bam_path):
+    # CRAM files are decoded from the local reference cache, never from a server,
+    # and reads without NM or MD tags are compared against it
+    from read_stats.reference import Reference, is_cram
+
+    if not (is_cram(bam_path) or args.reference):
+        return None
+    reference = Reference(args.reference, args.ref_cache)
+    if args.reference:
+        reference.cache_fasta()
+    if is_cram(bam_path):
+        reference = reference.for_file(bam_path)
+    return reference
+
+def scan_batches(scan):
+    # Per-read stats batches of the cache, checkpointed shards, workers or serial scan
+    from read_stats.stats import compute_stats_batches
+    from read_stats.file_reader import fetch_all, fetch_bed_regions
+    from read_stats.parallel import scan_parallel, scan_checkpointed
+
+    args, bam = scan.args, scan.bam
+    if scan.cached is not None:
+        return scan.cached
+    if scan.checkpoint is not None:
+        batches = scan.stage("workers", scan_checkpointed(
+            scan.bam_path, args.workers, scan.checkpoint, bam.references,
+            io_threads=scan.io_threads, **scan.scan_options))
+    elif args.workers > 1:
+        batches = scan.stage("workers", scan_parallel(
+            scan.bam_path, args.workers, regions=scan.regions, io_threads=scan.io_threads,
+            **scan.scan_options))
+    else:
+        reads = fetch_bed_regions(bam, scan.regions) if scan.regions is not None else fetch_all(bam)
+        if scan.pipeline is not None:
+            reads = scan.pipeline.decode(reads)
+        else:
+            reads = scan.profiler.iterate("bam_read", reads, reads=None)
+        batches = scan.stage("stats", compute_stats_batches(reads, bam.references,
+                                                            **scan.scan_options))
+    if scan.cache is not None:
+        batches = scan.stage("cache_write", scan.cache.store(scan.cache_key, batches,
+                                                             bam.references, scan.metrics))
+    return batches
+
+def write_summarized_shards(scan):
+    # Streamed outputs of workers that tag overlaps and summarize their own shards
+    from read_stats.parallel import summarize_parallel
+
+    shards = scan.stage("workers", summarize_parallel(
+        scan.bam_path, scan.args.workers, regions=scan.regions, intervals=scan.intervals,
+        io_threads=scan.io_threads, **scan.scan_options),
+        reads=lambda shard: len(shard[0]))
+    if scan.cache is not None:
+        shards = scan.stage("cache_write", _store_shards(
+            shards, scan.cache.writer(scan.cache_key, scan.bam.references, scan.metrics)),
+            reads=None)
+    results = scan.stage("overlap", ((_with_overlap(batch, overlaps), summary)
+                                     for batch, overlaps, summary in shards),
+                         reads=lambda result: len(result[0]))
+    return write_streaming(results, scan.writer, scan.args.output, scan.metrics, scan.profiler,
+                           scan.pipeline)
+
+def write_outputs(batches, scan):
+    # Overlaps, per-read output and HTML report of the whole table in memory
+    from read_stats.stats import StatsBatch
+    from read_stats.check_overlap import OverlapSweep, check_overlap
+    from read_stats.report import write_html
+
+    profiler = scan.profiler
+    stats = StatsBatch.concat(batches, scan.bam.references, scan.metrics)
+    with profiler.stage("overlap"):
+        # The table of a scan is coordinate-sorted
+        sweep = OverlapSweep(scan.intervals) if scan.intervals is not None else None
+        output_df = check_overlap(stats.to_frame(), scan.bed, sweep)
+    profiler.add_reads("overlap", len(output_df))
+
+    with profiler.stage("output"), scan.writer:
+        scan.writer.write(output_df)
+    profiler.add_reads("output", len(output_df))
+    with profiler.stage("html"):
+        write_html(output_df, scan.args.output + '/output.html', stats.filtered,
+                   profile=profiler.report() if profiler.enabled else None)
+    profiler.add_reads("html", len(output_df))
+    return stats
+
+def run_cohort(args):
+    # Batch mode: several samples, each written to its own folder, plus a cohort report
+    from read_stats.stats import ReadFilter, parse_metrics, parse_flags
+    from read_stats.file_reader import read_bed, resolve_io_threads
+    from read_stats.check_overlap import IntervalIndex
+    from read_stats.batch import make_samples, process_samples
+    from read_stats.report import write_cohort_report
+    from read_stats.reference import Reference
+
+    unsupported = [flag for flag, value in (
+        ("--cache-dir", args.cache_dir), ("--checkpoint-dir", args.checkpoint_dir),
+        ("--resume", args.resume), ("--profile", args.profile), ("--cprofile", args.cprofile))
+        if value]
+    if unsupported:
+        raise ValueError(f"{', '.join(unsupported)} cannot be used with several samples")
+    if args.regions_only and not args.bed:
+        raise ValueError("--regions-only requires a BED file (--bed)")
+    samples = make_samples(args.bam, args.samples)
+    metrics = parse_metrics(args.metrics)
+    read_filter = ReadFilter(parse_flags(args.require_flags), parse_flags(args.exclude_flags),
+                             args.min_mapq)
+    # The BED file is parsed and indexed once for the whole cohort
+    intervals = IntervalIndex(read_bed(args.bed)) if args.bed else None
+    # Reference sequences are cached once; each CRAM sample is decoded from the cache
+    reference = Reference(args.reference, args.ref_cache)
+    if args.reference:
+        reference.cache_fasta()
+    logger.info("Processing %s samples with %s workers.", len(samples), args.workers)
+
+    os.makedirs(args.output, exist_ok=True)
+    results = list(process_samples(
+        samples, args.output, args.workers, intervals, regions_only=args.regions_only,
+        fmt=args.format, compression=None if args.compression == "none" else args.compression,
+        unmapped_names=args.unmapped_names, metrics=metrics, read_filter=read_filter,
+        io_threads=resolve_io_threads(args.io_threads, min(args.workers, len(samples))),
+        reference=reference, per_fragment=args.per_fragment))
+    write_cohort_report(results, args.output, metrics)
+
+def _with_overlap(batch, overlaps):
+    # The overlap columns a worker computed for its shard
+    df = batch.to_frame()
+    for column in overlaps:
+        df[column] = overlaps[column].to_numpy()
+    return df
+
+def _store_shards(shards, cache_writer):
+    # Write the stats of each worker shard to the cache as they are merged
+    with cache_writer:
+        for batch, overlaps, summary in shards:
+            cache_writer.write(batch)
+            yield batch, overlaps, summary
+
+def write_stream_outputs(batches, intervals, writer, output_path, metrics, profiler,
+                         pipeline=None):
+    # Overlaps, per-read output and summary of batches in coordinate order
+    from read_stats.check_overlap import OverlapSweep
+    from read_stats.summary import summarize_batch
+
+    # One sweep over the whole coordinate-sorted stream carries its cursors across batches
+    sweep = OverlapSweep(intervals) if intervals is not None else None
+    results = (summarize_batch(batch, sweep) for batch in batches)
+    if pipeline is not None:
+        results = pipeline.stage("overlap", results)
+    else:
+        results = profiler.iterate("overlap", results, reads=lambda result: len(result[0]))
+    return write_streaming(results, writer, output_path, metrics, profiler, pipeline)
+
+def write_streaming(results, writer, output_path, metrics, profiler, pipeline=None):
+    from read_stats.report import write_dashboard_html
+    from read_stats.summary import StatsSummary
+
+    summary = StatsSummary(metrics)
+    try:
+        with writer:
+            for batch_df, batch_summary in results:
+                with profiler.stage("output"):
+                    summary.merge(batch_summary)
+                    writer.write(batch_df)
+                profiler.add_reads("output", len(batch_df))
+    finally:
+        if pipeline is not None:
+            # The writer is the pipeline's last stage
+            pipeline.close()
+            profiler.pipeline = pipeline.log_report()
+    with profiler.stage("html"):
+        write_dashboard_html(summary, output_path + '/output.html',
+                             profile=profiler.report() if profiler.enabled else None)
+    profiler.add_reads("html", summary.total_reads)
+    return summary
 
 if __name__ == "__main__":
     try:
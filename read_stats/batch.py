@@ -0,0 +1,144 @@
+import os
+from read_stats.file_reader import read_bam, fetch_all, fetch_bed_regions
+from read_stats.reference import is_cram
+from read_stats.stats import DEFAULT_BATCH_SIZE, DEFAULT_METRICS, compute_stats_batches, log_read_counts
+from read_stats.parallel import worker_pool
+from read_stats.report import stats_writer, write_dashboard_html
+from read_stats.summary import StatsSummary, summarize_batch
+from read_stats.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+SAMPLE_SHEET_HEADER = ("sample", "bam")
+
+
+def sample_name(bam_path):
+    """Sample name of a BAM file: its file name without the extension."""
+    name = os.path.basename(bam_path)
+    for suffix in (".bam", ".cram", ".sam"):
+        if name.endswith(suffix):
+            return name[:-len(suffix)]
+    return name
+
+
+def read_sample_sheet(path):
+    """
+    Read the samples of a cohort from a sample sheet.
+
+    Each line holds a sample name and a BAM path separated by a tab, or only
+    a BAM path, which names the sample after the file. A ``sample<TAB>bam``
+    header, blank lines and ``#`` comments are skipped. Relative BAM paths
+    are relative to the sheet.
+
+    Returns:
+        list[tuple[str, str]]: (sample, BAM path) pairs in sheet order.
+    """
+    base = os.path.dirname(os.path.abspath(path))
+    samples = []
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip() or line.lstrip().startswith("#"):
+                continue
+            fields = [field.strip() for field in line.rstrip("\n").split("\t")]
+            if tuple(field.lower() for field in fields) == SAMPLE_SHEET_HEADER:
+                continue
+            if len(fields) == 1:
+                name, bam_path = sample_name(fields[0]), fields[0]
+            elif len(fields) == 2:
+                name, bam_path = fields
+            else:
+                raise ValueError(f"{path}:{line_number}: expected a sample name and a BAM path")
+            samples.append((name, os.path.join(base, bam_path)))
+    return samples
+
+
+def make_samples(bam_paths=None, sample_sheet=None):
+    """
+    Samples of ``--bam`` paths followed by those of a sample sheet.
+
+    Raises:
+        ValueError: Without any sample, or if two samples have the same name
+            or a name that is not a valid directory name.
+    """
+    samples = [(sample_name(path), path) for path in bam_paths or []]
+    if sample_sheet:
+        samples += read_sample_sheet(sample_sheet)
+    if not samples:
+        raise ValueError("No BAM file given (--bam or --samples)")
+    seen = set()
+    for name, _ in samples:
+        if name in ("", ".", "..") or os.sep in name:
+            raise ValueError(f"Invalid sample name: {name!r}")
+        if name in seen:
+            raise ValueError(f"Duplicate sample name: {name}")
+        seen.add(name)
+    return samples
+
+
+def process_sample(name, bam_path, output_dir, intervals=None, regions_only=False, fmt="tsv",
+                   compression="default", batch_size=DEFAULT_BATCH_SIZE, unmapped_names=0,
+                   metrics=DEFAULT_METRICS, read_filter=None, io_threads=0, reference=None,
+                   per_fragment=False):
+    """
+    Scan one sample and write its per-read stats and HTML report to
+    ``output_dir/name``, streaming batches as with ``--stream``.
+
+    Args:
+        intervals (IntervalIndex): BED intervals, or None without a BED file.
+        regions_only (bool): Only scan the reads overlapping ``intervals``.
+        io_threads (int): BGZF decompression threads of the BAM file.
+        reference (Reference): Reference cache for decoding CRAM files and
+            counting the mismatches of reads without NM and MD tags.
+        per_fragment (bool): One row per fragment instead of per read.
+
+    Returns:
+        StatsSummary: The sample's summary, for the cohort report.
+    """
+    sample_dir = os.path.join(output_dir, name)
+    if reference is not None and is_cram(bam_path):
+        reference = reference.for_file(bam_path)
+    bam = read_bam(bam_path, io_threads, reference)
+    try:
+        reads = fetch_bed_regions(bam, intervals.merged) if regions_only else fetch_all(bam)
+        summary = StatsSummary(metrics)
+        with stats_writer(sample_dir, fmt, compression, bam.references) as writer:
+            for batch in compute_stats_batches(reads, bam.references, batch_size, unmapped_names,
+                                               metrics, read_filter, per_fragment, reference):
+                df, batch_summary = summarize_batch(batch, intervals)
+                writer.write(df)
+                summary.merge(batch_summary)
+        logger.info("Sample %s: %s reads from %s.", name, summary.total_reads, bam_path)
+        log_read_counts(summary, bam.references)
+    finally:
+        bam.close()
+    write_dashboard_html(summary, os.path.join(sample_dir, "output.html"))
+    return summary
+
+
+def _process_sample(task):
+    name, bam_path, output_dir, intervals, options = task
+    return process_sample(name, bam_path, output_dir, intervals, **options)
+
+
+def process_samples(samples, output_dir, workers=1, intervals=None, **options):
+    """
+    Process the samples of a cohort, ``workers`` samples at a time.
+
+    The BED ``intervals`` (an ``IntervalIndex``) are built once by the caller
+    and sent to the workers with each sample, instead of being parsed again.
+
+    Args:
+        samples (list[tuple[str, str]]): (sample, BAM path) pairs.
+        **options: ``process_sample`` options.
+
+    Yields:
+        tuple[str, StatsSummary]: Each sample's name and summary, in order.
+    """
+    if workers <= 1 or len(samples) == 1:
+        for name, bam_path in samples:
+            yield name, process_sample(name, bam_path, output_dir, intervals, **options)
+        return
+    tasks = [(name, bam_path, output_dir, intervals, options) for name, bam_path in samples]
+    with worker_pool(min(workers, len(samples))) as executor:
+        for (name, _), summary in zip(samples, executor.map(_process_sample, tasks)):
+            yield name, summary
@@ -0,0 +1,273 @@
+import hashlib
+import json
+import os
+from collections import Counter
+import numpy as np
+from read_stats.stats import StatsBatch, UnmappedReads
+from read_stats.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Bump when the cached columns or their meaning change, to invalidate old entries
+CACHE_VERSION = 1
+
+DEFAULT_CACHE_SIZE = 10 * 1024 ** 3
+
+# StatsBatch attribute of each cached column; columns of metrics that were
+# not computed are left out of the entry
+_COLUMNS = {
+    "ReadID": "read_ids",
+    "FragmentLength": "fragment_length",
+    "AvgBaseQuality": "avg_base_quality",
+    "GCContent": "gc_content",
+    "NumMismatches": "num_mismatches",
+    "Chromosome": "contig",
+    "Start": "start",
+    "End": "end",
+}
+
+
+def bam_identity(bam_path, bam):
+    """Size, modification time and header checksum of a BAM file."""
+    st = os.stat(bam_path)
+    header = hashlib.sha256(str(bam.header).encode("utf-8")).hexdigest()
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "header_sha256": header}
+
+
+def stats_key(bam_path, bam, **settings):
+    """
+    Key of the per-read stats of a BAM file under the given settings.
+
+    Args:
+        bam_path (str): Path of the BAM file.
+        bam (pysam.AlignmentFile): The opened BAM file, for its header.
+        **settings: JSON-serializable settings that change the stats, e.g.
+            the metric set, read filter and scanned regions.
+
+    Returns:
+        str: Hex digest of the BAM identity and the settings.
+    """
+    identity = {"version": CACHE_VERSION, "bam": bam_identity(bam_path, bam),
+                "settings": settings}
+    text = json.dumps(identity, sort_keys=True, default=_jsonable)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class StatsCache:
+    """
+    On-disk cache of per-read stats, so repeated runs on the same BAM only
+    redo the overlap computation and the reports.
+
+    Each entry is an uncompressed Arrow IPC file, memory-mapped when loaded,
+    plus a JSON file with the contigs and the unmapped and filtered read
+    counts. Entries are evicted least recently used first once the cache
+    holds more than ``max_bytes``.
+    """
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_CACHE_SIZE):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, bam_path, bam, **settings):
+        """Cache key of a BAM file and every setting that changes its stats (see ``stats_key``)."""
+        return stats_key(bam_path, bam, **settings)
+
+    def paths(self, key):
+        """Data and metadata file paths of the entry ``key``."""
+        base = os.path.join(self.cache_dir, key)
+        return base + ".arrow", base + ".json"
+
+    def __contains__(self, key):
+        return os.path.exists(self.paths(key)[1])
+
+    def load(self, key):
+        """
+        Return the cached stats of ``key`` as a list of StatsBatch, or None.
+
+        Numeric columns are zero-copy views of the memory-mapped Arrow file.
+        The unmapped and filtered read counts are carried by a final empty
+        batch.
+        """
+        import pyarrow as pa
+
+        data_path, meta_path = self.paths(key)
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            reader = pa.ipc.open_file(pa.memory_map(data_path))
+            batches = [_from_record_batch(reader.get_batch(i), meta)
+                       for i in range(reader.num_record_batches)]
+        except FileNotFoundError:
+            logger.info("No cached stats for key %s.", key)
+            return None
+        except (OSError, ValueError, KeyError, pa.ArrowException) as e:
+            logger.warning("Ignoring unreadable cache entry %s: %s", key, e)
+            return None
+        # Mark the entry as recently used
+        os.utime(meta_path)
+        counts = StatsBatch.empty(meta["contigs"], meta["metrics"])
+        counts.unmapped = _unmapped_from_json(meta["unmapped"])
+        counts.filtered = Counter(meta["filtered"])
+        logger.info("Loaded %s cached reads for key %s.", meta["rows"], key)
+        return batches + [counts]
+
+    def writer(self, key, contigs, metrics):
+        """Open a ``CacheWriter`` that adds the entry ``key`` when closed without error."""
+        return CacheWriter(self, key, contigs, metrics)
+
+    def store(self, key, batches, contigs, metrics):
+        """Yield ``batches`` while writing them to the cache entry ``key``."""
+        with self.writer(key, contigs, metrics) as cache_writer:
+            for batch in batches:
+                cache_writer.write(batch)
+                yield batch
+
+    def entries(self):
+        """(last use, size in bytes, key) of every complete entry, oldest first."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".json"):
+                continue
+            key = name[:-len(".json")]
+            data_path, meta_path = self.paths(key)
+            try:
+                size = os.path.getsize(data_path) + os.path.getsize(meta_path)
+                entries.append((os.path.getmtime(meta_path), size, key))
+            except FileNotFoundError:
+                continue
+        return sorted(entries)
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in ``max_bytes``."""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, key in entries:
+            if total <= self.max_bytes:
+                break
+            self.remove(key)
+            total -= size
+            logger.info("Evicted cache entry %s (%s bytes).", key, size)
+
+    def remove(self, key):
+        # The JSON file goes first, so a half-removed entry is never loaded
+        for path in reversed(self.paths(key)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+class CacheWriter:
+    """
+    Write StatsBatches to a new cache entry, one record batch each.
+
+    The entry is written to temporary files and only moved into place when
+    the writer is closed without an error, so a failed or interrupted run
+    never leaves a partial entry behind.
+    """
+
+    def __init__(self, cache, key, contigs, metrics):
+        self.cache = cache
+        self.key = key
+        self.contigs = list(contigs)
+        self.metrics = list(metrics)
+        self.rows = 0
+        self.unmapped = UnmappedReads()
+        self.filtered = Counter()
+        data_path, meta_path = cache.paths(key)
+        self._tmp_paths = (f"{data_path}.{os.getpid()}.tmp", f"{meta_path}.{os.getpid()}.tmp")
+        self._writer = None
+
+    def write(self, batch):
+        import pyarrow as pa
+
+        record_batch = _to_record_batch(batch)
+        if self._writer is None:
+            self._writer = pa.ipc.new_file(self._tmp_paths[0], record_batch.schema)
+        self._writer.write_batch(record_batch)
+        self.rows += len(batch)
+        self.unmapped.merge(batch.unmapped)
+        self.filtered.update(batch.filtered)
+
+    def commit(self):
+        if self._writer is None:
+            # No batches at all: still cache an empty entry
+            self.write(StatsBatch.empty(self.contigs, self.metrics))
+        self._writer.close()
+        meta = {
+            "version": CACHE_VERSION,
+            "rows": self.rows,
+            "contigs": self.contigs,
+            "metrics": self.metrics,
+            "unmapped": _unmapped_to_json(self.unmapped),
+            "filtered": dict(self.filtered),
+        }
+        with open(self._tmp_paths[1], "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        data_path, meta_path = self.cache.paths(self.key)
+        os.replace(self._tmp_paths[0], data_path)
+        os.replace(self._tmp_paths[1], meta_path)
+        logger.info("Cached %s reads under key %s.", self.rows, self.key)
+        self.cache.evict()
+
+    def abort(self):
+        if self._writer is not None:
+            self._writer.close()
+        for path in self._tmp_paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+
+
+def _to_record_batch(batch):
+    import pyarrow as pa
+
+    columns = {name: getattr(batch, attr) for name, attr in _COLUMNS.items()
+               if getattr(batch, attr) is not None}
+    return pa.record_batch([pa.array(values) for values in columns.values()],
+                           names=list(columns))
+
+
+def _from_record_batch(record_batch, meta):
+    columns = {}
+    for name, attr in _COLUMNS.items():
+        if name not in record_batch.schema.names:
+            columns[attr] = None
+        elif name == "ReadID":
+            read_ids = record_batch.column(name).to_numpy(zero_copy_only=False)
+            columns[attr] = np.array(read_ids, dtype="S") if len(read_ids) else np.empty(0, "S1")
+        else:
+            columns[attr] = record_batch.column(name).to_numpy()
+    return StatsBatch(meta["contigs"], **columns)
+
+
+def _unmapped_to_json(unmapped):
+    return {"max_names": unmapped.max_names, "names": unmapped.names,
+            "counts": [[reference_id, flag, count]
+                       for (reference_id, flag), count in unmapped.counts.items()]}
+
+
+def _unmapped_from_json(data):
+    unmapped = UnmappedReads(data["max_names"])
+    unmapped.names = list(data["names"])
+    for reference_id, flag, count in data["counts"]:
+        unmapped.counts[(reference_id, flag)] = count
+    return unmapped
+
+
+def _jsonable(value):
+    # Settings may hold numpy arrays (merged BED intervals) or tuples
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.integer):
+        return int(value)
+    raise TypeError(f"Cannot use {type(value).__name__} in a cache key")
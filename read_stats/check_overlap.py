@@ -1,20 +1,248 @@
-import pandas as pd
-import pyranges as pr
-from read_stats.logging_config import setup_logger
+import numpy as np
+from read_stats.logging_config import get_logger
 
-logger = setup_logger(__name__)
+logger = get_logger(__name__)
+
+# Columns added by the overlap pass; OverlapBases and RegionID need an IntervalIndex
+OVERLAP_COLUMNS = ["Overlap", "OverlapBases", "RegionID"]
+
+def check_overlap(stats, bed_regions, index=None):
+    """
+    Add an Overlap column (1 if the read overlaps a BED region, else 0), the
+    number of read bases covered by BED regions (OverlapBases) and the ID of
+    the first region the read overlaps (RegionID).
+
+    Reads may come in any order; they are looked up in an ``IntervalIndex``
+    of the BED regions, built here unless a prebuilt ``index`` (or an
+    ``OverlapSweep`` over one, for coordinate-sorted reads) is passed.
+    """
+    import pandas as pd
 
-def check_overlap(stats, bed_regions):
     df = pd.DataFrame(stats)
     df["Overlap"] = 0
     if bed_regions is None or bed_regions.empty:
         logger.info("No BED file specified. Skipping overlap computation.")
         return df
-    # Convert stats DataFrame to PyRanges
-    reads = pr.PyRanges(df)
-    overlapping = reads.overlap(bed_regions)
-
-    # Mark overlaps
-    if not overlapping.empty:
-        df.loc[overlapping.index, "Overlap"] = 1
-    return df
\ No newline at end of file
+    if index is None:
+        index = IntervalIndex(bed_regions)
+    return index.annotate(df)
+
+def _merge_sorted(starts, reach):
+    # Merged intervals of intervals sorted by start, given their running maximum end;
+    # a new merged interval begins where a start is past every earlier end
+    first = np.ones(len(starts), dtype=bool)
+    first[1:] = starts[1:] > reach[:-1]
+    group_ends = np.append(np.flatnonzero(first)[1:] - 1, len(starts) - 1)
+    return starts[first], reach[group_ends]
+
+
+class IntervalIndex:
+    """
+    Array-backed index of BED intervals, queried with batches of reads.
+
+    For each contig, the intervals are kept sorted by start along with their
+    ends, their running maximum end and their IDs. The first interval a read
+    overlaps is then the first one whose running maximum end is past the
+    read start, if it starts before the read end: one binary search per read,
+    whatever the number or nesting of intervals. The merged intervals and
+    their cumulative lengths give the bases of a read covered by the BED in
+    two more searches.
+
+    Regions are identified by the BED name, or by ``contig:start-end`` for
+    BED files without names.
+    """
+
+    def __init__(self, bed_regions):
+        import pandas as pd
+
+        bed = getattr(bed_regions, "df", bed_regions)
+        self.contigs = {}
+        self.merged = {}
+        self._groups = {}
+        # Grouping by the (categorical) column is much faster than by its strings
+        for contig, regions in bed.groupby("Chromosome", sort=False, observed=True):
+            contig = str(contig)
+            order = np.argsort(regions["Start"].to_numpy(), kind="stable")
+            starts = regions["Start"].to_numpy(dtype=np.int64)[order]
+            ends = regions["End"].to_numpy(dtype=np.int64)[order]
+            names = None
+            if "Name" in regions:
+                names = regions["Name"].to_numpy(dtype=object)[order]
+                unnamed = np.flatnonzero(pd.isna(names))
+                names[unnamed] = _coordinates(contig, starts[unnamed], ends[unnamed])
+            max_ends = np.maximum.accumulate(ends)
+            self.contigs[contig] = (starts, ends, max_ends, names)
+            self.merged[contig] = _merge_sorted(starts, max_ends)
+            # Merged interval of each interval
+            self._groups[contig] = np.searchsorted(self.merged[contig][0], starts,
+                                                   side="right") - 1
+        # Bases covered by the merged intervals before each one
+        self._covered = {contig: np.concatenate(([0], np.cumsum(ends - starts)[:-1]))
+                         for contig, (starts, ends) in self.merged.items()}
+        logger.info("Indexed %s BED intervals on %s contigs.", len(bed), len(self.contigs))
+
+    def query(self, chromosomes, starts, ends, cursors=None):
+        """
+        Look up reads in the index.
+
+        Args:
+            cursors (dict): Search state of a coordinate-sorted read stream,
+                by contig, moved forward by each batch (see ``OverlapSweep``).
+
+        Returns:
+            tuple[np.ndarray, np.ndarray, np.ndarray]: For each read, the
+            number of its bases covered by BED intervals and the ID of the
+            first interval it overlaps (None without overlap), and whether it
+            overlaps any interval.
+        """
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.asarray(ends, dtype=np.int64)
+        bases = np.zeros(len(starts), dtype=np.int64)
+        region_ids = np.full(len(starts), None, dtype=object)
+        hits = np.zeros(len(starts), dtype=bool)
+        for contig, rows in _contig_rows(chromosomes):
+            if contig not in self.contigs:
+                continue
+            bed_starts, _, max_ends, names = self.contigs[contig]
+            read_starts, read_ends = starts[rows], ends[rows]
+            cursor = cursors.get(contig, (0, 0)) if cursors is not None else None
+            sweep = cursor is not None and _sorted_from(read_starts, cursor[1])
+            if sweep:
+                # Only the intervals past the previous batch can be hit
+                first = cursor[0] + _search(max_ends[cursor[0]:], read_starts)
+                if len(first):
+                    cursors[contig] = (int(first[-1]), int(read_starts[-1]))
+            else:
+                first = _search(max_ends, read_starts)
+            hit = first < len(bed_starts)
+            hit[hit] = bed_starts[first[hit]] < read_ends[hit]
+            hits[rows] = hit
+            # Only the reads that hit an interval get a region and covered bases
+            hit_rows = np.flatnonzero(hit)
+            hit_rows = rows.start + hit_rows if isinstance(rows, slice) else rows[hit_rows]
+            first = first[hit]
+            region_ids[hit_rows] = self._region_ids(contig, first, names, sweep)
+            bases[hit_rows] = self._covered_bases(contig, first, read_starts[hit],
+                                                  read_ends[hit])
+        return bases, region_ids, hits
+
+    def annotate(self, df, cursors=None):
+        """Set the ``OVERLAP_COLUMNS`` of a DataFrame of reads, in place."""
+        bases, region_ids, hits = self.query(df["Chromosome"], df["Start"], df["End"], cursors)
+        df["Overlap"] = hits.astype(np.int64)
+        df["OverlapBases"] = bases
+        df["RegionID"] = region_ids
+        return df
+
+    def tag(self, chromosomes, starts, ends):
+        """Return a boolean array, True where the read overlaps a BED interval."""
+        return self.query(chromosomes, starts, ends)[2]
+
+    def _covered_bases(self, contig, first, read_starts, read_ends):
+        # Bases of reads covered by the merged intervals, given the first interval each
+        # read overlaps: those of its merged interval, plus the later merged intervals
+        # for the few reads reaching past it
+        merged_starts, merged_ends = self.merged[contig]
+        group = self._groups[contig][first]
+        covered = (np.minimum(read_ends, merged_ends[group])
+                   - np.maximum(read_starts, merged_starts[group]))
+        beyond = group + 1 < len(merged_starts)
+        beyond[beyond] = merged_starts[group[beyond] + 1] < read_ends[beyond]
+        if beyond.any():
+            covered[beyond] = (self._covered_before(contig, read_ends[beyond])
+                               - self._covered_before(contig, read_starts[beyond]))
+        return covered
+
+    def _covered_before(self, contig, positions):
+        # Bases of the merged intervals before each position
+        merged_starts, merged_ends = self.merged[contig]
+        interval = _search(merged_starts, positions) - 1
+        inside = np.maximum(interval, 0)
+        covered = self._covered[contig][inside] + (np.minimum(positions, merged_ends[inside])
+                                                   - merged_starts[inside])
+        return np.where(interval >= 0, covered, 0)
+
+    def _region_ids(self, contig, first, names, sorted_first=False):
+        # IDs of the first intervals hit by reads
+        if names is not None:
+            return names[first]
+        if len(first) == 0:
+            return np.empty(0, dtype=object)
+        # Coordinates are only formatted once per distinct interval hit
+        if sorted_first:
+            # Sorted reads hit the intervals in runs
+            new = np.ones(len(first), dtype=bool)
+            new[1:] = first[1:] != first[:-1]
+            intervals, inverse = first[new], np.cumsum(new) - 1
+        else:
+            intervals, inverse = np.unique(first, return_inverse=True)
+        bed_starts, bed_ends = self.contigs[contig][:2]
+        return _coordinates(contig, bed_starts[intervals], bed_ends[intervals])[inverse]
+
+
+class OverlapSweep:
+    """
+    Look up a coordinate-sorted read stream in an ``IntervalIndex`` in one
+    forward pass.
+
+    A cursor per contig only moves forward, so each batch is only searched
+    against the intervals past the previous one, and the intervals hit are
+    found in runs instead of by sorting. Batches, or contigs of a batch, that
+    are not sorted past the cursor are looked up like ``IntervalIndex.query``.
+    """
+
+    def __init__(self, index):
+        self.index = index
+        self.merged = index.merged
+        self._cursors = {}
+
+    def query(self, chromosomes, starts, ends):
+        """Look up the next reads of the stream (see ``IntervalIndex.query``)."""
+        return self.index.query(chromosomes, starts, ends, self._cursors)
+
+    def annotate(self, df):
+        """Set the ``OVERLAP_COLUMNS`` of the next reads of the stream, in place."""
+        return self.index.annotate(df, self._cursors)
+
+
+def _sorted_from(starts, previous):
+    # True if the starts are sorted and none is before ``previous``
+    return len(starts) == 0 or (starts[0] >= previous and bool(np.all(starts[1:] >= starts[:-1])))
+
+
+def _search(values, keys):
+    # np.searchsorted(values, keys, side="right"), searching only between the
+    # results of the smallest and largest key: a small, cached part of
+    # ``values`` for a batch of coordinate-sorted reads
+    if len(keys) == 0:
+        return np.zeros(0, dtype=np.intp)
+    lo = np.searchsorted(values, keys.min(), side="right")
+    hi = np.searchsorted(values, keys.max(), side="right")
+    return lo + np.searchsorted(values[lo:hi], keys, side="right")
+
+
+def _coordinates(contig, starts, ends):
+    # contig:start-end IDs of BED intervals without a name
+    ids = np.empty(len(starts), dtype=object)
+    ids[:] = [f"{contig}:{start}-{end}" for start, end in zip(starts.tolist(), ends.tolist())]
+    return ids
+
+
+def _contig_rows(chromosomes):
+    # (contig, rows) of each contig: slices of a contig-grouped column, else index arrays.
+    # The strings of a pandas column are compared in place, not converted to objects
+    if hasattr(chromosomes, "array"):
+        chromosomes = chromosomes.array
+    else:
+        chromosomes = np.asarray(chromosomes, dtype=object)
+    if len(chromosomes) == 0:
+        return
+    change = np.asarray(chromosomes[1:] != chromosomes[:-1], dtype=bool)
+    bounds = np.concatenate(([0], np.flatnonzero(change) + 1, [len(chromosomes)]))
+    contigs = [str(contig) for contig in chromosomes[bounds[:-1]]]
+    if len(set(contigs)) == len(contigs):
+        for contig, lo, hi in zip(contigs, bounds[:-1], bounds[1:]):
+            yield contig, slice(lo, hi)
+        return
+    for contig in dict.fromkeys(contigs):
+        yield contig, np.flatnonzero(np.asarray(chromosomes == contig, dtype=bool))
@@ -0,0 +1,107 @@
+import json
+import math
+import os
+import numpy as np
+from read_stats.cache import StatsCache
+from read_stats.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+MANIFEST = "manifest.json"
+
+# Minimum number of shards of a checkpointed scan, so an interrupted run
+# loses at most a small part of the work
+CHECKPOINT_SHARDS = 64
+
+
+class Checkpoint:
+    """
+    Finished shards of a scan, persisted so an interrupted run can resume.
+
+    Each shard's stats are stored like a ``StatsCache`` entry (an Arrow IPC
+    chunk file and its JSON counts) under ``directory``. The manifest records
+    the run key and the shard plan, so a resumed run scans the same shards
+    even with a different number of workers.
+    """
+
+    def __init__(self, directory, run_key):
+        self.directory = directory
+        self.run_key = run_key
+        # Chunks are never evicted
+        self.chunks = StatsCache(directory, max_bytes=math.inf)
+        self.shards = None
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.directory, MANIFEST)
+
+    def start(self, plan, resume=False):
+        """
+        Return the shard plan of the run, starting a new checkpoint unless
+        ``resume`` finds one of the same run.
+
+        Args:
+            plan (Callable[[], list]): Returns a new shard plan.
+            resume (bool): Reuse the shards finished by a previous run.
+
+        Returns:
+            list[tuple]: (contig, starts, ends, after) shards.
+        """
+        manifest = self._read_manifest() if resume else None
+        if manifest is not None and manifest["key"] != self.run_key:
+            logger.warning("Checkpoint in %s is from another BAM or settings; starting over.",
+                           self.directory)
+            manifest = None
+        if manifest is None:
+            self.clear()
+            self.shards = plan()
+            self._write_manifest()
+        else:
+            self.shards = [(contig, tuple(starts), tuple(ends), after)
+                           for contig, starts, ends, after in manifest["shards"]]
+            logger.info("Resuming from %s: %s of %s shards done.", self.directory,
+                        sum(self.done(i) for i in range(len(self.shards))), len(self.shards))
+        return self.shards
+
+    def _chunk_key(self, index):
+        return f"shard-{index:05d}"
+
+    def done(self, index):
+        return self._chunk_key(index) in self.chunks
+
+    def load(self, index):
+        """The stats of a finished shard as a list of StatsBatch, or None."""
+        return self.chunks.load(self._chunk_key(index))
+
+    def remove(self, index):
+        """Drop the chunk of a shard, so it counts as not finished."""
+        self.chunks.remove(self._chunk_key(index))
+
+    def writer(self, index, contigs, metrics):
+        """Open a writer whose entry marks the shard finished once closed."""
+        return self.chunks.writer(self._chunk_key(index), contigs, metrics)
+
+    def clear(self):
+        if os.path.exists(self.manifest_path):
+            os.remove(self.manifest_path)
+        for _, _, key in self.chunks.entries():
+            self.chunks.remove(key)
+
+    def _read_manifest(self):
+        try:
+            with open(self.manifest_path, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            logger.info("No checkpoint to resume in %s.", self.directory)
+            return None
+
+    def _write_manifest(self):
+        manifest = {
+            "key": self.run_key,
+            "shards": [[contig, np.asarray(starts).tolist(), np.asarray(ends).tolist(), int(after)]
+                       for contig, starts, ends, after in self.shards],
+        }
+        tmp_path = f"{self.manifest_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self.manifest_path)
@@ -1,15 +1,108 @@
 import argparse
-from read_stats.logging_config import setup_logger
+import re
+from read_stats.reference import DEFAULT_REF_CACHE
+from read_stats.logging_config import get_logger
 
-logger = setup_logger(__name__)
+logger = get_logger(__name__)
 # logging.basicConfig(level=logging.INFO)
 
+_SIZE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+
+def parse_size(value):
+    """Parse a byte size with an optional K, M, G or T suffix, e.g. ``10G``."""
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([KMGT]?)i?B?\s*", value, re.IGNORECASE)
+    if not match:
+        raise argparse.ArgumentTypeError(f"invalid size: {value!r}")
+    number, unit = match.groups()
+    return int(float(number) * _SIZE_UNITS[unit.upper()])
+
+def parse_threads(value):
+    """Parse a thread count, or ``auto``."""
+    if value == "auto":
+        return value
+    try:
+        threads = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid thread count: {value!r}") from None
+    if threads < 0:
+        raise argparse.ArgumentTypeError(f"invalid thread count: {value!r}")
+    return threads
+
 def parse_args():
     logger.debug("Parsing command line arguments.")
     parser = argparse.ArgumentParser(description="Compute read statistics from a BAM file.")
-    parser.add_argument("--bam", help="Input BAM file", required=True)
+    parser.add_argument("--bam", action="append",
+                        help="Input BAM or CRAM file; repeat to process several samples in one run")
+    parser.add_argument("--samples",
+                        help="Sample sheet with a tab-separated sample name and BAM path per line")
     parser.add_argument("--bed", help="BED file with regions of interest")
+    parser.add_argument("--reference",
+                        help="Reference FASTA for CRAM input and for counting the mismatches of "
+                             "reads without NM or MD tags; its sequences are cached in "
+                             "--ref-cache, so later runs can omit it for CRAM")
+    parser.add_argument("--ref-cache", default=DEFAULT_REF_CACHE,
+                        help="REF_CACHE-style directory of reference sequences by MD5, used to "
+                             f"decode CRAM files offline (default: {DEFAULT_REF_CACHE})")
     parser.add_argument("--output", help="Output folder for TSV and HTML file", required=True)
+    parser.add_argument("--workers", "--threads", type=int, default=1,
+                        help="Number of worker processes scanning BAM shards in parallel, or "
+                             "processing samples in parallel with several samples")
+    parser.add_argument("--io-threads", type=parse_threads, default="auto",
+                        help="BGZF decompression threads per open BAM file, or 'auto' to share "
+                             "the available cores between the workers (default: auto)")
+    parser.add_argument("--stream", action="store_true",
+                        help="Write the TSV chunk by chunk and build the HTML summary from "
+                             "aggregates, keeping memory bounded")
+    # The pipeline queues hold several batches per stage, so they cannot keep a memory budget
+    memory = parser.add_mutually_exclusive_group()
+    memory.add_argument("--max-memory", type=parse_size,
+                        help="Memory budget of the per-read stats table, e.g. 2G; the outputs "
+                             "are streamed like --stream from stats batches that fit in it")
+    memory.add_argument("--pipeline", action="store_true",
+                        help="Run BAM decoding, stats, overlap tagging and output writing as "
+                             "concurrent stages connected by bounded queues (streams the "
+                             "outputs like --stream) and log each stage's occupancy")
+    parser.add_argument("--format", choices=["tsv", "parquet", "arrow"], default="tsv",
+                        help="Per-read stats output format (default: tsv)")
+    parser.add_argument("--compression", default="default",
+                        help="Parquet/Arrow compression codec, e.g. zstd, lz4, snappy or none "
+                             "(default: zstd for parquet, none for arrow)")
+    parser.add_argument("--unmapped-names", type=int, default=0,
+                        help="Number of unmapped read names to write to the log (default: 0)")
+    parser.add_argument("--regions-only", action="store_true",
+                        help="Only scan reads overlapping the BED regions, using the BAM index")
+    parser.add_argument("--metrics", default=None,
+                        help="Comma-separated metrics to compute: fragment_length, base_quality, "
+                             "gc_content, mismatches (default: all); read fields of other "
+                             "metrics are not decoded")
+    parser.add_argument("--require-flags", default="0",
+                        help="Only keep reads with all of these SAM flags, as an integer or "
+                             "comma-separated names, e.g. PAIRED,PROPER_PAIR (like samtools -f)")
+    parser.add_argument("--exclude-flags", default="0",
+                        help="Skip reads with any of these SAM flags, e.g. "
+                             "SECONDARY,SUPPLEMENTARY,DUP,QCFAIL or 0xF00 (like samtools -F)")
+    parser.add_argument("--min-mapq", type=int, default=0,
+                        help="Skip reads with a mapping quality below this value (like samtools -q)")
+    parser.add_argument("--per-fragment", action="store_true",
+                        help="Pair mates and report one row per fragment instead of per read; "
+                             "secondary and supplementary alignments are skipped")
+    parser.add_argument("--cache-dir",
+                        help="Directory caching per-read stats between runs on the same BAM, "
+                             "so only the overlap and reports are recomputed")
+    parser.add_argument("--cache-size", type=parse_size, default="10G",
+                        help="Maximum size of the stats cache, e.g. 500M or 10G; least recently "
+                             "used entries are evicted (default: 10G)")
+    parser.add_argument("--checkpoint-dir",
+                        help="Directory where each finished shard of the scan is saved, so an "
+                             "interrupted run can be resumed with --resume")
+    parser.add_argument("--resume", action="store_true",
+                        help="Skip the shards already finished in --checkpoint-dir by a previous "
+                             "run with the same BAM and settings")
+    parser.add_argument("--profile", action="store_true",
+                        help="Record wall/CPU time, reads/sec and peak memory of each stage in "
+                             "profile.json and the HTML report")
+    parser.add_argument("--cprofile", action="store_true",
+                        help="Like --profile, and also dump a cProfile of the run to profile.prof")
     args = parser.parse_args()
     logger.debug("Arguments parsed: %s", args)
     return args
\ No newline at end of file
@@ -1,18 +1,99 @@
+import os
 import pysam as pys
-import pyranges as pr
-from read_stats.logging_config import setup_logger
+from read_stats.reference import is_cram
+from read_stats.logging_config import get_logger
 
-logger = setup_logger(__name__)
+logger = get_logger(__name__)
 
+# Upper bound of the automatic decompression threads per BAM file: the Python
+# stats loop cannot consume reads faster than a few inflating threads supply
+AUTO_IO_THREADS_MAX = 4
 
-def read_bam(bam_path):
+# Region of the unmapped reads without a position, stored after every contig
+UNPLACED = "*"
+
+
+def resolve_io_threads(setting="auto", workers=1):
+    """
+    Number of BGZF decompression threads per opened BAM file.
+
+    Args:
+        setting (str | int): A number of threads, or "auto" to give each of
+            the ``workers`` processes scanning BAM files an equal share of the
+            available cores, minus the core running its stats loop.
+        workers (int): Number of processes that each scan a BAM file at once.
+
+    Returns:
+        int: Threads to pass to ``read_bam``; 0 inflates on the reading thread.
+    """
+    if setting != "auto":
+        return int(setting)
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+    threads = min(AUTO_IO_THREADS_MAX, (cores or 1) // max(1, workers) - 1)
+    # htslib only starts a thread pool for two or more threads
+    return threads if threads >= 2 else 0
+
+def read_bam(bam_path, threads=0, reference=None):
+    """
+    Open a BAM or CRAM file, decompressing it on ``threads`` background
+    threads so decompression overlaps the stats loop (0 or 1: no threads).
+
+    CRAM files are decoded with ``reference`` (a ``Reference`` set up with
+    ``for_file``), which is required so htslib never downloads sequences.
+    """
     logger.debug("Attempting to read BAM file from: %s", bam_path)
-    bam_file = pys.AlignmentFile(bam_path, "rb")
+    options = {"threads": threads} if threads > 1 else {}
+    if is_cram(bam_path):
+        if reference is None:
+            raise ValueError(f"{bam_path} is a CRAM file; a reference is required (--reference)")
+        reference.activate()
+        if reference.use_fasta:
+            options["reference_filename"] = reference.fasta
+        bam_file = pys.AlignmentFile(bam_path, "rc", **options)
+    else:
+        bam_file = pys.AlignmentFile(bam_path, "rb", **options)
     logger.info("Successfully opened BAM file: %s", bam_path)
     return bam_file
 
 def read_bed(bed_path):
+    # pyranges (and pandas) take most of a second to import, so they are only
+    # loaded once a BED file is read
+    import pyranges as pr
+
     logger.debug("Attempting to read BED file from: %s", bed_path)
     bed_file = pr.read_bed(bed_path)
     logger.info("Successfully opened BED file: %s", bed_path)
-    return bed_file
\ No newline at end of file
+    return bed_file
+
+def fetch_all(bam):
+    """
+    Yield every read of an indexed BAM file: the reads of each contig in
+    header order, then the unplaced unmapped reads, which ``bam.fetch()``
+    leaves out.
+    """
+    yield from bam.fetch()
+    yield from bam.fetch(UNPLACED)
+
+def fetch_regions(bam, contig, starts, ends, after=0):
+    """
+    Yield the reads overlapping sorted, non-overlapping regions of one contig.
+
+    A read spanning several regions is only yielded for the first one, and
+    reads starting before ``after`` are skipped, so reads come out once each
+    and in coordinate order.
+    """
+    for start, end in zip(starts, ends):
+        for read in bam.fetch(contig, int(start), int(end)):
+            if read.reference_start >= after:
+                yield read
+        after = max(after, int(end))
+
+def fetch_bed_regions(bam, merged_intervals):
+    """Yield the reads overlapping merged BED intervals, using the BAM index."""
+    missing = set(merged_intervals).difference(bam.references)
+    if missing:
+        logger.warning("BED contigs not in BAM header: %s", ", ".join(sorted(missing)))
+    for contig in bam.references:
+        if contig in merged_intervals:
+            starts, ends = merged_intervals[contig]
+            yield from fetch_regions(bam, contig, starts, ends)
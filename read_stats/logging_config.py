@@ -1,7 +1,20 @@
+import atexit
 import logging
 import os
 
-def setup_logger(name, log_dir="log", log_file='bamreadstats', level=logging.INFO):
+# Background listeners of asynchronous loggers, by logger name
+_listeners = {}
+
+# setup_logger options of the loggers declared with get_logger, by logger name
+_declared = {}
+
+# Module state: "configured" holds the options passed to configure_logging, or
+# None until logging is configured; "finalizer_pid" is the process that
+# registered the multiprocessing finalizer of the listeners
+_state = {"configured": None, "finalizer_pid": None}
+
+def setup_logger(name, log_dir="log", log_file='bamreadstats', level=logging.INFO,
+                 asynchronous=False):
     """
     Set up and return a logger that writes to a specific log file inside log_dir.
 
@@ -10,6 +23,9 @@ def setup_logger(name, log_dir="log", log_file='bamreadstats', level=logging.INF
         log_dir (str): Directory where log files are stored.
         log_file (str): Log file name; if None, uses '{name}.log'.
         level (int): Logging level.
+        asynchronous (bool): If True, records are put on a queue by a
+            QueueHandler and written to the file by a background listener
+            thread, so logging calls never block on file I/O.
 
     Returns:
         logging.Logger: Configured logger instance.
@@ -26,6 +42,8 @@ def setup_logger(name, log_dir="log", log_file='bamreadstats', level=logging.INF
     # Remove existing handlers for this logger to prevent duplicates
     if logger.hasHandlers():
         logger.handlers.clear()
+    if name in _listeners:
+        _stop_listener(name)
 
     file_handler = logging.FileHandler(log_path)
     file_handler.setLevel(level)
@@ -33,9 +51,76 @@ def setup_logger(name, log_dir="log", log_file='bamreadstats', level=logging.INF
     formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
     file_handler.setFormatter(formatter)
 
-    logger.addHandler(file_handler)
+    if asynchronous:
+        # Imported here: only needed by asynchronous loggers
+        from logging.handlers import QueueHandler, QueueListener
+        import queue
+
+        _register_finalizer()
+        log_queue = queue.SimpleQueue()
+        listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+        listener.start()
+        _listeners[name] = listener
+        queue_handler = QueueHandler(log_queue)
+        queue_handler.setLevel(level)
+        logger.addHandler(queue_handler)
+    else:
+        logger.addHandler(file_handler)
 
     # Important: Disable propagation to avoid printing logs to the root logger (and console)
     logger.propagate = False
 
     return logger
+
+def get_logger(name, **options):
+    """
+    Declare and return the logger ``name`` without creating its handlers.
+
+    Modules call this at import time, so importing them neither creates the
+    log directory nor opens files. The handlers are added by
+    ``configure_logging``; loggers declared after it ran are set up at once.
+
+    Args:
+        name (str): Logger name (usually __name__ from the module).
+        **options: ``setup_logger`` options of this logger, e.g. ``log_file``
+            or ``asynchronous``.
+
+    Returns:
+        logging.Logger: The logger instance.
+    """
+    _declared[name] = options
+    configured = _state["configured"]
+    if configured is not None:
+        return setup_logger(name, **{**configured, **options})
+    return logging.getLogger(name)
+
+def configure_logging(log_dir="log", level=logging.INFO):
+    """Set up every logger declared with ``get_logger``; called once by the CLI."""
+    configured = _state["configured"] = {"log_dir": log_dir, "level": level}
+    for name, options in _declared.items():
+        setup_logger(name, **{**configured, **options})
+
+def logging_options():
+    """Options of ``configure_logging``, to configure worker processes alike (or None)."""
+    return _state["configured"]
+
+def _stop_listener(name):
+    listener = _listeners.pop(name)
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
+
+def _stop_listeners():
+    # Flush queued records before the interpreter or a worker process exits
+    for name in list(_listeners):
+        _stop_listener(name)
+
+def _register_finalizer():
+    # Worker processes exit without running atexit handlers
+    import multiprocessing.util
+
+    if _state["finalizer_pid"] != os.getpid():
+        multiprocessing.util.Finalize(None, _stop_listeners, exitpriority=0)
+        _state["finalizer_pid"] = os.getpid()
+
+atexit.register(_stop_listeners)
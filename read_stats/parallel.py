@@ -0,0 +1,268 @@
+import math
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from read_stats.file_reader import read_bam, fetch_regions, UNPLACED
+from read_stats.stats import DEFAULT_BATCH_SIZE, DEFAULT_METRICS, StatsBatch, compute_stats_batches
+from read_stats.check_overlap import OVERLAP_COLUMNS
+from read_stats.summary import summarize_batch
+from read_stats.logging_config import get_logger, configure_logging, logging_options
+
+logger = get_logger(__name__)
+
+# Shards per worker, so a slow shard does not leave the other workers idle
+SHARDS_PER_WORKER = 4
+
+
+def make_shards(bam, n_shards, whole_contigs=False):
+    """
+    Split the reference into genomic shards with roughly equal read counts.
+
+    Read counts per contig come from the BAM index, unmapped reads placed on
+    the contig included; contigs with no reads are skipped and busy contigs
+    are cut into equal-length pieces.
+    CRAM indexes have no counts, so CRAM contigs are split by length. A last
+    ``UNPLACED`` shard holds the unmapped reads without a position, which are
+    only counted, as in a serial ``fetch_all`` scan.
+
+    Args:
+        bam (pysam.AlignmentFile): Indexed BAM file.
+        n_shards (int): Target number of shards.
+        whole_contigs (bool): One shard per contig, so no pair of mates is
+            split between shards.
+
+    Returns:
+        list[tuple[str, int, int]]: (contig, start, end) shards in header order.
+    """
+    cram = bam.format == "CRAM"
+    if cram:
+        # CRAM indexes hold no read counts: contigs are weighted by length
+        counts = dict(zip(bam.references, bam.lengths))
+    else:
+        counts = {s.contig: s.total for s in bam.get_index_statistics()}
+    unplaced = [(UNPLACED, 0, 0)] if cram or bam.nocoordinate else []
+    total = sum(counts.values())
+    if total == 0:
+        return unplaced
+    target = max(1, math.ceil(total / n_shards))
+
+    shards = []
+    for contig, length in zip(bam.references, bam.lengths):
+        count = counts.get(contig, 0)
+        if count == 0:
+            continue
+        pieces = 1 if whole_contigs else min(length, max(1, round(count / target)))
+        step = math.ceil(length / pieces)
+        for start in range(0, length, step):
+            shards.append((contig, start, min(start + step, length)))
+    logger.debug("Split %s placed reads into %s shards.", total, len(shards))
+    return shards + unplaced
+
+
+def make_region_shards(bam, merged_intervals, n_shards, whole_contigs=False):
+    """
+    Split merged BED intervals into shards covering similar numbers of bases.
+
+    Args:
+        bam (pysam.AlignmentFile): Indexed BAM file.
+        merged_intervals (dict): Merged (starts, ends) arrays per contig.
+        n_shards (int): Target number of shards.
+        whole_contigs (bool): One shard per contig, as in ``make_shards``.
+
+    Returns:
+        list[tuple]: (contig, starts, ends, after) shards in header order, where
+        ``after`` is the end of the previous interval on the contig.
+    """
+    regions = [(contig, merged_intervals[contig]) for contig in bam.references
+               if contig in merged_intervals]
+    total = sum(int((ends - starts).sum()) for _, (starts, ends) in regions)
+    target = max(1, math.ceil(total / n_shards))
+
+    shards = []
+    for contig, (starts, ends) in regions:
+        first, covered = 0, 0
+        for i in range(len(starts)):
+            covered += int(ends[i] - starts[i])
+            if (covered >= target and not whole_contigs) or i == len(starts) - 1:
+                after = int(ends[first - 1]) if first else 0
+                shards.append((contig, starts[first:i + 1], ends[first:i + 1], after))
+                first, covered = i + 1, 0
+    return shards
+
+
+def scan_shard(bam_path, shard, batch_size=DEFAULT_BATCH_SIZE, unmapped_names=0,
+               metrics=DEFAULT_METRICS, read_filter=None, io_threads=0, reference=None,
+               per_fragment=False):
+    """
+    Compute stats for the reads that start inside one shard.
+
+    A shard is (contig, starts, ends, after). Reads starting before ``after``
+    belong to the previous shard, so every read is counted exactly once.
+    The ``UNPLACED`` shard yields the unmapped reads without a position.
+    ``io_threads`` and the CRAM ``reference`` are passed to ``read_bam``,
+    which also serves reads without NM tag; ``per_fragment`` shards must be
+    whole contigs.
+    """
+    contig, starts, ends, after = shard
+    bam = read_bam(bam_path, io_threads, reference)
+    try:
+        if contig == UNPLACED:
+            reads = bam.fetch(UNPLACED)
+        else:
+            reads = fetch_regions(bam, contig, starts, ends, after)
+        return StatsBatch.concat(compute_stats_batches(reads, bam.references, batch_size,
+                                                       unmapped_names, metrics, read_filter,
+                                                       per_fragment, reference),
+                                 bam.references, metrics)
+    finally:
+        bam.close()
+
+
+def summarize_shard(bam_path, shard, batch_size=DEFAULT_BATCH_SIZE, unmapped_names=0,
+                    intervals=None, metrics=DEFAULT_METRICS, read_filter=None, io_threads=0,
+                    reference=None, per_fragment=False):
+    """
+    Scan one shard, tag overlaps with the BED ``intervals`` (an
+    ``IntervalIndex``) and summarize it, all in the worker.
+
+    Returns:
+        tuple[StatsBatch, pd.DataFrame, StatsSummary]: The shard's stats, its
+        overlap columns and its summary, to be merged by the caller.
+    """
+    batch = scan_shard(bam_path, shard, batch_size, unmapped_names, metrics, read_filter,
+                       io_threads, reference, per_fragment)
+    df, summary = summarize_batch(batch, intervals)
+    return batch, df[[c for c in OVERLAP_COLUMNS if c in df.columns]], summary
+
+
+def worker_context():
+    # fork() is unsafe once pysam or pyarrow have started threads in the parent
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+def worker_pool(workers):
+    # Workers import the modules afresh, so they set up logging like the parent
+    return ProcessPoolExecutor(max_workers=workers, mp_context=worker_context(),
+                               initializer=_init_worker, initargs=(logging_options(),))
+
+
+def _init_worker(options):
+    if options is not None:
+        configure_logging(**options)
+
+
+def _scan_shard(task):
+    return scan_shard(*task)
+
+
+def _summarize_shard(task):
+    return summarize_shard(*task)
+
+
+def scan_parallel(bam_path, workers, batch_size=DEFAULT_BATCH_SIZE, regions=None,
+                  unmapped_names=0, metrics=DEFAULT_METRICS, read_filter=None, io_threads=0,
+                  reference=None, per_fragment=False):
+    """
+    Scan a BAM file with one process per worker, one shard at a time.
+
+    With ``regions`` (merged BED intervals) only reads overlapping them are
+    scanned, as with ``fetch_bed_regions``. With ``per_fragment`` each shard
+    is a whole contig, so mates are always paired within one worker.
+
+    Yields:
+        StatsBatch: One batch per shard, in reference order, so the merged
+        result is identical to a serial ``fetch_all`` scan.
+    """
+    tasks = [(bam_path, shard, batch_size, unmapped_names, metrics, read_filter, io_threads,
+              reference, per_fragment)
+             for shard in plan_shards(bam_path, workers, regions, reference=reference,
+                                      whole_contigs=per_fragment)]
+    with worker_pool(workers) as executor:
+        yield from executor.map(_scan_shard, tasks)
+
+
+def summarize_parallel(bam_path, workers, batch_size=DEFAULT_BATCH_SIZE, regions=None,
+                       unmapped_names=0, intervals=None, metrics=DEFAULT_METRICS,
+                       read_filter=None, io_threads=0, reference=None, per_fragment=False):
+    """
+    Like ``scan_parallel``, but workers also tag overlaps against the BED
+    ``intervals`` (an ``IntervalIndex``) and summarize their shard.
+
+    Yields:
+        tuple[StatsBatch, pd.DataFrame, StatsSummary]: One result per shard, in
+        reference order.
+    """
+    tasks = [(bam_path, shard, batch_size, unmapped_names, intervals, metrics, read_filter,
+              io_threads, reference, per_fragment)
+             for shard in plan_shards(bam_path, workers, regions, reference=reference,
+                                      whole_contigs=per_fragment)]
+    with worker_pool(workers) as executor:
+        yield from executor.map(_summarize_shard, tasks)
+
+
+def plan_shards(bam_path, workers, regions=None, n_shards=None, reference=None,
+                whole_contigs=False):
+    """
+    Shards for ``workers`` processes, over the whole BAM or only ``regions``;
+    ``n_shards`` overrides the target number of shards.
+    """
+    n_shards = n_shards or workers * SHARDS_PER_WORKER
+    bam = read_bam(bam_path, reference=reference)
+    try:
+        if regions is None:
+            shards = [(contig, (start,), (end,), start)
+                      for contig, start, end in make_shards(bam, n_shards, whole_contigs)]
+        else:
+            shards = make_region_shards(bam, regions, n_shards, whole_contigs)
+    finally:
+        bam.close()
+    logger.info("Scanning %s shards with %s workers.", len(shards), workers)
+    return shards
+
+
+def scan_checkpointed(bam_path, workers, checkpoint, contigs, batch_size=DEFAULT_BATCH_SIZE,
+                      unmapped_names=0, metrics=DEFAULT_METRICS, read_filter=None,
+                      io_threads=0, reference=None, per_fragment=False):
+    """
+    Scan the shards of a started ``Checkpoint``, skipping the finished ones.
+
+    Every shard is persisted as soon as it is scanned, in the order workers
+    finish them, so an interrupted run only loses the shards in progress.
+    Shards whose chunk cannot be read back are scanned again.
+
+    Yields:
+        StatsBatch: The batches of each shard, in shard (reference) order.
+    """
+    shards = checkpoint.shards
+    pending = [i for i in range(len(shards)) if not checkpoint.done(i)]
+    logger.info("Scanning %s of %s checkpointed shards.", len(pending), len(shards))
+
+    def scan(shard):
+        return scan_shard(bam_path, shard, batch_size, unmapped_names, metrics, read_filter,
+                          io_threads, reference, per_fragment)
+
+    def save(index, batch):
+        with checkpoint.writer(index, contigs, metrics) as chunk_writer:
+            chunk_writer.write(batch)
+
+    if workers > 1 and pending:
+        with worker_pool(workers) as executor:
+            futures = {executor.submit(scan_shard, bam_path, shards[i], batch_size, unmapped_names,
+                                       metrics, read_filter, io_threads, reference,
+                                       per_fragment): i
+                       for i in pending}
+            for future in as_completed(futures):
+                save(futures[future], future.result())
+
+    # Shards are read back from their memory-mapped chunks in reference order
+    for index, shard in enumerate(shards):
+        if not checkpoint.done(index):
+            save(index, scan(shard))
+        batches = checkpoint.load(index)
+        if batches is None:
+            logger.warning("Checkpointed shard %s is unreadable; scanning it again.", index)
+            checkpoint.remove(index)
+            batch = scan(shard)
+            save(index, batch)
+            batches = [batch]
+        yield from batches
@@ -0,0 +1,190 @@
+import queue
+import threading
+import time
+from itertools import chain, islice
+from read_stats.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Items buffered between two stages; a full queue blocks the upstream stage
+DEFAULT_QUEUE_SIZE = 4
+
+# Reads handed from the decode stage to the stats stage at once
+DECODE_CHUNK = 4096
+
+_DONE = object()
+
+
+class _Failure:
+    def __init__(self, metrics):
+        self.metrics = metrics
+
+
+class StageMetrics:
+    """Items, work time and time blocked on the neighbouring queues of one stage."""
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        # Time spent producing items, including waiting for the upstream stage
+        self.run_seconds = 0.0
+        # Time blocked on a full output queue, i.e. waiting for the downstream stage
+        self.output_wait_seconds = 0.0
+        # Time the downstream stage spent waiting for this stage's items
+        self.handoff_wait_seconds = 0.0
+        # Exception that ended the stage, raised again by the downstream stage
+        self.error = None
+
+
+class Pipeline:
+    """
+    Pipeline stages running concurrently, connected by bounded queues.
+
+    Each ``stage`` runs a lazy iterable, usually consuming the previous
+    stage, on its own thread and hands its items over through a queue of
+    ``queue_size`` items, so a slow stage holds back the faster ones
+    (backpressure) instead of letting them buffer without bound. The last
+    stage, the ``sink``, is the calling thread consuming the last queue.
+    Threads overlap where pysam (BGZF decompression, record parsing), NumPy
+    and file writes release the GIL.
+
+    Occupancy, the share of the run a stage spends working rather than
+    waiting on its queues, shows the bottleneck: the busiest stage.
+    """
+
+    def __init__(self, sink="output", queue_size=DEFAULT_QUEUE_SIZE):
+        self.sink = sink
+        self.queue_size = queue_size
+        self.stages = []
+        self._threads = []
+        self._stop = threading.Event()
+        self._start = None
+        self._end = None
+
+    def stage(self, name, iterable):
+        """
+        Run ``iterable`` as stage ``name`` on a new thread.
+
+        Returns:
+            Iterator: The stage's items, in order, for the next stage.
+        """
+        if self._start is None:
+            self._start = time.perf_counter()
+        metrics = StageMetrics(name)
+        self.stages.append(metrics)
+        items = queue.Queue(self.queue_size)
+        thread = threading.Thread(target=self._produce, args=(iterable, items, metrics),
+                                  name=f"read_stats-{name}", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+        return self._consume(items, metrics)
+
+    def decode(self, reads, chunk=DECODE_CHUNK):
+        """Run BAM iteration as the ``decode`` stage, handing over reads in chunks."""
+        reads = iter(reads)
+        # The stage starts now, ahead of the stages consuming its reads
+        chunks = self.stage("decode", iter(lambda: list(islice(reads, chunk)), []))
+        return chain.from_iterable(chunks)
+
+    def _produce(self, iterable, items, metrics):
+        try:
+            iterator = iter(iterable)
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    metrics.run_seconds += time.perf_counter() - start
+                    break
+                produced = time.perf_counter()
+                metrics.run_seconds += produced - start
+                metrics.items += 1
+                if not self._put(items, item):
+                    return
+                metrics.output_wait_seconds += time.perf_counter() - produced
+            self._put(items, _DONE)
+        except BaseException as error:  # pylint: disable=broad-exception-caught
+            # Any error, exits included, is raised unchanged by the consuming stage
+            metrics.error = error
+            self._put(items, _Failure(metrics))
+
+    def _put(self, items, item):
+        # Block while the queue is full, unless the pipeline is being shut down
+        while not self._stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _consume(self, items, metrics):
+        while True:
+            start = time.perf_counter()
+            try:
+                item = items.get(timeout=0.1)
+            except queue.Empty:
+                metrics.handoff_wait_seconds += time.perf_counter() - start
+                if self._stop.is_set():
+                    return
+                continue
+            metrics.handoff_wait_seconds += time.perf_counter() - start
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                raise item.metrics.error
+            yield item
+
+    def close(self):
+        """Stop the stages and wait for their threads."""
+        self._end = time.perf_counter()
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def report(self):
+        """
+        Occupancy of every stage, as a JSON-serializable dict.
+
+        A stage's busy time excludes the time it waited for the previous
+        stage's items and for room in its output queue.
+        """
+        end = self._end if self._end is not None else time.perf_counter()
+        wall = end - self._start if self._start is not None else 0.0
+        stages = {}
+        input_wait = 0.0
+        for metrics in self.stages:
+            busy = max(0.0, metrics.run_seconds - input_wait)
+            stages[metrics.name] = self._stage_report(metrics.items, busy, input_wait,
+                                                      metrics.output_wait_seconds, wall)
+            input_wait = metrics.handoff_wait_seconds
+        items = self.stages[-1].items if self.stages else 0
+        stages[self.sink] = self._stage_report(items, max(0.0, wall - input_wait), input_wait,
+                                               0.0, wall)
+        bottleneck = max(stages, key=lambda name: stages[name]["busy_seconds"]) if stages else None
+        return {"wall_seconds": wall, "queue_size": self.queue_size, "bottleneck": bottleneck,
+                "stages": stages}
+
+    @staticmethod
+    def _stage_report(items, busy, input_wait, output_wait, wall):
+        return {"items": items, "busy_seconds": busy, "input_wait_seconds": input_wait,
+                "output_wait_seconds": output_wait,
+                "occupancy": busy / wall if wall > 0 else None}
+
+    def log_report(self):
+        report = self.report()
+        for name, stage in report["stages"].items():
+            occupancy = stage["occupancy"]
+            logger.info("Pipeline stage %s: %s items, busy %.2fs (%s), waited %.2fs for input "
+                        "and %.2fs for output.", name, stage["items"], stage["busy_seconds"],
+                        f"{occupancy:.0%}" if occupancy is not None else "-",
+                        stage["input_wait_seconds"], stage["output_wait_seconds"])
+        if report["bottleneck"] is not None:
+            logger.info("Pipeline bottleneck: %s.", report["bottleneck"])
+        return report
@@ -0,0 +1,128 @@
+import json
+import os
+import resource
+import sys
+import time
+from contextlib import contextmanager
+from read_stats.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    rss = resource.getrusage(who).ru_maxrss
+    return rss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+class StageProfiler:
+    """
+    Wall and CPU time, reads and peak memory of each pipeline stage.
+
+    Stages nest: time is charged to the innermost running stage only, so the
+    stages of a lazy pipeline (BAM reading inside stats inside the TSV
+    writer's loop) add up to the total run time. Generator stages are timed
+    with ``iterate``. A disabled profiler adds no overhead to the hot loops.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.stages = {}
+        self._stack = []
+        self._mark = None
+        self._start = None
+        # Stage occupancy of a concurrent ``Pipeline``, set once it has run
+        self.pipeline = None
+
+    def _record(self, name):
+        if name not in self.stages:
+            self.stages[name] = {"wall_seconds": 0.0, "cpu_seconds": 0.0, "reads": 0,
+                                 "peak_rss_mb": 0.0}
+        return self.stages[name]
+
+    def _charge(self):
+        # Charge the time since the last switch to the running stage
+        wall, cpu = time.perf_counter(), time.process_time()
+        if self._stack:
+            record = self.stages[self._stack[-1]]
+            record["wall_seconds"] += wall - self._mark[0]
+            record["cpu_seconds"] += cpu - self._mark[1]
+        self._mark = (wall, cpu)
+
+    def _enter(self, name):
+        self._record(name)
+        self._charge()
+        if self._start is None:
+            self._start = self._mark
+        self._stack.append(name)
+
+    def _exit(self):
+        self._charge()
+        name = self._stack.pop()
+        self.stages[name]["peak_rss_mb"] = peak_rss_mb()
+
+    @contextmanager
+    def stage(self, name):
+        """Time the enclosed block as stage ``name``."""
+        if not self.enabled:
+            yield
+            return
+        self._enter(name)
+        try:
+            yield
+        finally:
+            self._exit()
+
+    def iterate(self, name, iterable, reads=len):
+        """
+        Yield from ``iterable``, timing each step as stage ``name``.
+
+        Args:
+            name (str): Stage name.
+            iterable (Iterable): A lazy pipeline step, e.g. a batch generator.
+            reads (Callable): Number of reads in an item, or None to count
+                one read per item.
+        """
+        if not self.enabled:
+            yield from iterable
+            return
+        iterator = iter(iterable)
+        record = self._record(name)
+        while True:
+            self._enter(name)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self._exit()
+            record["reads"] += 1 if reads is None else reads(item)
+            yield item
+
+    def add_reads(self, name, count):
+        if self.enabled:
+            self._record(name)["reads"] += count
+
+    def report(self):
+        """Metrics of every stage and of the whole run, as a JSON-serializable dict."""
+        stages = {}
+        for name, record in self.stages.items():
+            wall = record["wall_seconds"]
+            stages[name] = dict(record, reads_per_sec=record["reads"] / wall if wall > 0 else None)
+        total_wall = sum(r["wall_seconds"] for r in self.stages.values())
+        total_cpu = sum(r["cpu_seconds"] for r in self.stages.values())
+        report = {
+            "stages": stages,
+            "total": {"wall_seconds": total_wall, "cpu_seconds": total_cpu,
+                      "peak_rss_mb": peak_rss_mb(),
+                      "peak_rss_children_mb": peak_rss_mb(resource.RUSAGE_CHILDREN)},
+        }
+        if self.pipeline is not None:
+            report["pipeline"] = self.pipeline
+        return report
+
+    def write_json(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.report(), f, indent=2)
+        logger.info("Wrote profile metrics to %s.", path)
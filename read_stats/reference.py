@@ -0,0 +1,185 @@
+import copy
+import hashlib
+import json
+import os
+from read_stats.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# htslib REF_PATH/REF_CACHE layout: the MD5 split into two directory levels
+CACHE_PATTERN = "%2s/%2s/%s"
+
+DEFAULT_REF_CACHE = os.path.join("~", ".cache", "read_stats", "ref")
+
+# Reference bases read at once by ReferenceWindows
+REFERENCE_WINDOW = 1 << 20
+
+
+def is_cram(path):
+    """True if the file at ``path`` starts with the CRAM magic number."""
+    try:
+        with open(path, "rb") as f:
+            return f.read(4) == b"CRAM"
+    except OSError:
+        return False
+
+
+class Reference:
+    """
+    Reference sequences for decoding CRAM files offline.
+
+    The sequences of ``fasta`` are stored once in a REF_CACHE-style
+    directory, one file per sequence named after its MD5, which is the
+    ``M5`` tag of a CRAM header. htslib then reads each sequence straight from
+    the cache by MD5, so repeated runs and worker processes neither parse
+    the FASTA nor re-normalize its sequences, and the cached files are shared
+    through the page cache. REF_PATH points at the cache only, so htslib
+    never falls back to the EBI reference server.
+
+    Instances are picklable and passed to the workers that open CRAM files
+    or compare reads against the reference.
+    """
+
+    def __init__(self, fasta=None, cache_dir=DEFAULT_REF_CACHE, use_fasta=None):
+        self.fasta = fasta
+        self.cache_dir = os.path.abspath(os.path.expanduser(cache_dir))
+        # Whether htslib also gets the FASTA, for sequences missing from the cache
+        self.use_fasta = fasta is not None if use_fasta is None else use_fasta
+        # MD5 of the known sequences by name, from the FASTA file or CRAM header
+        self.md5s = {}
+
+    def path(self, md5):
+        return os.path.join(self.cache_dir, md5[:2], md5[2:4], md5[4:])
+
+    def __contains__(self, md5):
+        return md5 is not None and os.path.exists(self.path(md5))
+
+    def activate(self):
+        """Point htslib's REF_PATH and REF_CACHE at the cache, and only there."""
+        pattern = os.path.join(self.cache_dir, CACHE_PATTERN)
+        os.environ["REF_PATH"] = pattern
+        os.environ["REF_CACHE"] = pattern
+
+    def _manifest_path(self):
+        # MD5s of a FASTA file, keyed by its path, size and modification time
+        st = os.stat(self.fasta)
+        identity = f"{os.path.abspath(self.fasta)}\t{st.st_size}\t{st.st_mtime_ns}"
+        key = hashlib.sha256(identity.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, "fasta", f"{key}.json")
+
+    def cache_fasta(self):
+        """
+        Store every sequence of the FASTA file in the cache.
+
+        The MD5s of the FASTA are recorded, so a later run with the same
+        unchanged file neither reads nor hashes it again.
+
+        Returns:
+            dict[str, str]: MD5 of each sequence, by name.
+        """
+        import pysam
+
+        manifest_path = self._manifest_path()
+        try:
+            with open(manifest_path, encoding="utf-8") as f:
+                md5s = json.load(f)
+            if all(md5 in self for md5 in md5s.values()):
+                logger.info("Reference %s already cached in %s.", self.fasta, self.cache_dir)
+                self.md5s.update(md5s)
+                return md5s
+        except FileNotFoundError:
+            pass
+
+        md5s = {}
+        with pysam.FastaFile(self.fasta) as fasta:
+            for name in fasta.references:
+                # M5 is the MD5 of the upper-case sequence without line breaks
+                sequence = fasta.fetch(name).upper().encode("ascii")
+                md5 = hashlib.md5(sequence).hexdigest()
+                if md5 not in self:
+                    _write_atomic(self.path(md5), sequence)
+                md5s[name] = md5
+        _write_atomic(manifest_path, json.dumps(md5s).encode("utf-8"))
+        self.md5s.update(md5s)
+        logger.info("Cached %s reference sequences of %s in %s.", len(md5s), self.fasta,
+                    self.cache_dir)
+        return md5s
+
+    def for_file(self, cram_path):
+        """
+        This reference, set up to decode ``cram_path``: from the cache alone
+        if it holds the sequence of every ``M5`` tag of the CRAM header, else
+        also from the FASTA file.
+
+        Raises:
+            ValueError: If sequences are missing from the cache and there is
+                no FASTA file to read them from.
+        """
+        import pysam
+
+        self.activate()
+        with pysam.AlignmentFile(cram_path, "rc") as cram:
+            sequences = cram.header.to_dict().get("SQ", [])
+        missing = [sq["SN"] for sq in sequences if sq.get("M5") not in self]
+        if missing and self.fasta is None:
+            raise ValueError(f"Reference sequences of {cram_path} are not in {self.cache_dir}: "
+                             f"{', '.join(missing[:5])}; pass the FASTA file with --reference")
+        if missing:
+            logger.warning("%s reference sequences of %s have no cached M5; decoding them from %s.",
+                           len(missing), cram_path, self.fasta)
+        reference = copy.copy(self)
+        reference.use_fasta = bool(missing)
+        reference.md5s = dict(self.md5s)
+        reference.md5s.update((sq["SN"], sq["M5"]) for sq in sequences if "M5" in sq)
+        return reference
+
+
+class ReferenceWindows:
+    """
+    Reference bases for a coordinate-sorted scan, read from the cache.
+
+    The bases of the current contig are kept in one window of
+    ``window`` bases that only moves forward with the reads, so each part of
+    the reference is read from its cached sequence file once per scan.
+    """
+
+    def __init__(self, reference, window=REFERENCE_WINDOW):
+        self.reference = reference
+        self.window = window
+        self._contig = None
+        self._start = 0
+        self._bases = None
+
+    def fetch(self, contig, start, end):
+        """
+        Upper-case bases of ``contig`` from ``start`` to ``end``.
+
+        Returns:
+            bytes: The bases, or None if the sequence of ``contig`` is not
+            cached or ends before ``end``.
+        """
+        offset = start - self._start
+        if contig != self._contig or offset < 0 or (self._bases is not None
+                                                    and end - self._start > len(self._bases)):
+            self._load(contig, start, max(end - start, self.window))
+            offset = 0
+        if self._bases is None or end - start > len(self._bases) - offset:
+            return None
+        return self._bases[offset:offset + end - start]
+
+    def _load(self, contig, start, length):
+        self._contig, self._start, self._bases = contig, start, None
+        md5 = self.reference.md5s.get(contig)
+        if md5 is None or md5 not in self.reference:
+            return
+        with open(self.reference.path(md5), "rb") as f:
+            f.seek(start)
+            self._bases = f.read(length)
+
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
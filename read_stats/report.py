@@ -1,29 +1,401 @@
+from html import escape
 import json
 import os
-import pandas as pd
-from read_stats.logging_config import setup_logger
+import numpy as np
+from read_stats.summary import (
+    StatsSummary, frame_metrics, FRAGMENT_LABELS, GC_LABELS, MISMATCH_LABELS, QUALITY_BIN_EDGES,
+    GC_BIN_EDGES
+)
+from read_stats.stats import METRICS
+from read_stats.logging_config import get_logger
 
-logger = setup_logger(__name__)
+logger = get_logger(__name__)
+
+TSV_COLUMNS = ["ReadID", "FragmentLength", "AvgBaseQuality", "GCContent", "NumMismatches",
+               "Overlap", "OverlapBases", "RegionID"]
+
+def _tsv_frame(df):
+    # Floats are written with two decimals and missing values as empty fields;
+    # columns of metrics that were not computed are left out
+    out = df[[c for c in TSV_COLUMNS if c in df.columns]].copy()
+    for column in ("AvgBaseQuality", "GCContent"):
+        if column in out:
+            out[column] = out[column].astype("float64")
+    if "NumMismatches" in out:
+        out["NumMismatches"] = out["NumMismatches"].astype("float64").astype("Int64")
+    return out
+
+def _to_tsv(df, handle, header):
+    _tsv_frame(df).to_csv(handle, sep="\t", index=False, header=header,
+                          float_format="%.2f", na_rep="", lineterminator="\n")
+
+def _ensure_dir(output_path):
+    if not os.path.exists(os.path.dirname(output_path)):
+        os.makedirs(os.path.dirname(output_path))
 
 def write_tsv(df, output_path):
     if df.empty:
         logger.warning("No stats to write to TSV.")
         return
-    # Use safe formatting for None values
-    df["AvgBaseQuality"] = df["AvgBaseQuality"].map(lambda x: f"{x:.2f}" if pd.notnull(x) else "")
-    df["GCContent"] = df["GCContent"].map(lambda x: f"{x:.2f}" if pd.notnull(x) else "")
-    df["NumMismatches"] = df["NumMismatches"].map(lambda x: int(x) if pd.notnull(x) else "")
-    if not os.path.exists(os.path.dirname(output_path)):
-        os.makedirs(os.path.dirname(output_path))
-    df.to_csv(output_path, sep="\t", index=False,
-            columns=["ReadID", "FragmentLength", "AvgBaseQuality", "GCContent", "NumMismatches", "Overlap"])
+    _ensure_dir(output_path)
+    with open(output_path, "w", encoding="utf-8", newline="") as f:
+        _to_tsv(df, f, header=True)
+
+
+class TsvWriter:
+    """
+    Write per-read stats to a TSV file chunk by chunk.
+
+    Produces the same file as ``write_tsv`` on the concatenated chunks: the
+    header is written with the first non-empty chunk, and nothing is written
+    when every chunk is empty.
+    """
+
+    def __init__(self, output_path, buffer_size=1 << 20):
+        self.output_path = output_path
+        self.buffer_size = buffer_size
+        self.rows = 0
+        self._file = None
+
+    def write(self, df):
+        if df.empty:
+            return
+        if self._file is None:
+            _ensure_dir(self.output_path)
+            self._file = open(self.output_path, "w", encoding="utf-8", newline="",
+                              buffering=self.buffer_size)
+        _to_tsv(df, self._file, header=self.rows == 0)
+        self.rows += len(df)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        elif self.rows == 0:
+            logger.warning("No stats to write to TSV.")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+COLUMNAR_COLUMNS = TSV_COLUMNS + ["Chromosome", "Start", "End"]
+
+# Default compression per columnar format; Arrow files stay uncompressed so
+# they can be memory-mapped without decoding
+DEFAULT_COMPRESSION = {"parquet": "zstd", "arrow": None}
+
+
+class ColumnarWriter:
+    """
+    Write per-read stats to a Parquet or Arrow IPC file, one row group or
+    record batch per chunk.
+
+    Columns keep their types: int32 lengths and positions, float32 quality
+    and GC, nullable int32 mismatches, bool overlap and a dictionary-encoded
+    contig whose dictionary is ``contigs`` (the BAM header order). Columns of
+    metrics that were not computed are left out.
+    """
+
+    def __init__(self, output_path, fmt="parquet", compression="default", contigs=None):
+        if fmt not in DEFAULT_COMPRESSION:
+            raise ValueError(f"Unsupported columnar format: {fmt}")
+        self.output_path = output_path
+        self.fmt = fmt
+        self.compression = DEFAULT_COMPRESSION[fmt] if compression == "default" else compression
+        self.contigs = list(contigs) if contigs is not None else None
+        self.rows = 0
+        self._writer = None
+
+    def _table(self, df):
+        import pandas as pd
+        import pyarrow as pa
 
-def write_html(stats, output_path):
-    # Drop missing values just for plotting purposes
-    stats_clean = stats[["AvgBaseQuality", "GCContent", "NumMismatches", "Overlap"]]
+        if self.contigs is None:
+            self.contigs = sorted(df["Chromosome"].astype(str).unique())
+        chromosome = pd.Categorical(df["Chromosome"].astype(str), categories=self.contigs)
+        if (chromosome.codes < 0).any():
+            raise ValueError("Read contig missing from the contig dictionary.")
+        columns = {
+            "ReadID": pa.array(df["ReadID"].astype(str).to_numpy(dtype=object), type=pa.string()),
+        }
+        if "FragmentLength" in df:
+            columns["FragmentLength"] = pa.array(df["FragmentLength"].to_numpy(dtype=np.int32))
+        for column in ("AvgBaseQuality", "GCContent"):
+            if column in df:
+                columns[column] = pa.array(df[column].to_numpy(dtype=np.float32, na_value=np.nan),
+                                           from_pandas=True)
+        if "NumMismatches" in df:
+            nm = df["NumMismatches"].to_numpy(dtype=np.float64, na_value=np.nan)
+            nm_missing = np.isnan(nm)
+            columns["NumMismatches"] = pa.array(np.where(nm_missing, 0, nm).astype(np.int32),
+                                                mask=nm_missing)
+        columns["Overlap"] = pa.array(df["Overlap"].to_numpy(dtype=bool))
+        if "OverlapBases" in df:
+            columns["OverlapBases"] = pa.array(df["OverlapBases"].to_numpy(dtype=np.int32))
+            columns["RegionID"] = pa.array(df["RegionID"].to_numpy(dtype=object), type=pa.string(),
+                                           from_pandas=True)
+        columns["Chromosome"] = pa.DictionaryArray.from_arrays(
+            pa.array(chromosome.codes.astype(np.int32)), pa.array(self.contigs, type=pa.string()))
+        columns["Start"] = pa.array(df["Start"].to_numpy(dtype=np.int32))
+        columns["End"] = pa.array(df["End"].to_numpy(dtype=np.int32))
+        return pa.table(columns)
 
-    # Convert selected columns to a JSON dict for Plotly
-    data_json = stats_clean.to_dict(orient="list")
+    def write(self, df):
+        if df.empty:
+            return
+        table = self._table(df)
+        if self._writer is None:
+            _ensure_dir(self.output_path)
+            self._writer = self._open(table.schema)
+        self._writer.write_table(table)
+        self.rows += len(df)
+
+    def _open(self, schema):
+        if self.fmt == "parquet":
+            import pyarrow.parquet as pq
+            return pq.ParquetWriter(self.output_path, schema,
+                                    compression=self.compression or "none")
+        import pyarrow as pa
+        options = pa.ipc.IpcWriteOptions(compression=self.compression)
+        return pa.ipc.new_file(self.output_path, schema, options=options)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        elif self.rows == 0:
+            logger.warning("No stats to write to %s.", self.fmt)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def stats_writer(output_dir, fmt="tsv", compression="default", contigs=None):
+    """Open the per-read stats writer for ``output_dir/output.<fmt>``."""
+    if fmt == "tsv":
+        return TsvWriter(os.path.join(output_dir, "output.tsv"))
+    return ColumnarWriter(os.path.join(output_dir, f"output.{fmt}"), fmt, compression, contigs)
+
+def write_columnar(df, output_path, fmt="parquet", compression="default", contigs=None):
+    with ColumnarWriter(output_path, fmt, compression, contigs) as writer:
+        writer.write(df)
+
+def write_html(stats, output_path, filtered=None, profile=None):
+    summary = StatsSummary(frame_metrics(stats))
+    summary.update(stats)
+    if filtered:
+        summary.filtered.update(filtered)
+    write_dashboard_html(summary, output_path, profile)
+
+def _bar_data(edges, counts):
+    # Bar centres and counts of a histogram, for Plotly
+    centres = (edges[:-1] + edges[1:]) / 2
+    return {"x": np.round(centres, 6).tolist(), "y": counts.tolist()}
+
+# Plotly chart of each metric on the HTML dashboard: (metric, div id, script);
+# the overlap pie chart is always shown
+_DASHBOARD_CHARTS = [
+    ("fragment_length", "fragmentLength", """
+            // FragmentLength Bar Chart
+            Plotly.newPlot('fragmentLength', [{
+                x: data.FragmentLength.x,
+                y: data.FragmentLength.y,
+                type: 'bar',
+                marker: { color: 'steelblue' }
+            }], {
+                title: 'Fragment Length Distribution',
+                xaxis: { title: 'FragmentLength (bp)', type: 'category' },
+                yaxis: { title: 'Count' }
+            });
+"""),
+    ("base_quality", "avgBaseQuality", """
+            // AvgBaseQuality Histogram
+            Plotly.newPlot('avgBaseQuality', [{
+                x: data.AvgBaseQuality.x,
+                y: data.AvgBaseQuality.y,
+                type: 'bar',
+                marker: { color: 'teal' }
+            }], {
+                title: 'Average Base Quality Distribution',
+                bargap: 0,
+                xaxis: { title: 'AvgBaseQuality' },
+                yaxis: { title: 'Count' }
+            });
+"""),
+    ("gc_content", "gcContent", """
+            // GCContent Histogram
+            Plotly.newPlot('gcContent', [{
+                x: data.GCContent.x,
+                y: data.GCContent.y,
+                type: 'bar',
+                marker: { color: 'purple' }
+            }], {
+                title: 'GC Content Distribution',
+                bargap: 0,
+                xaxis: { title: 'GCContent (%)' },
+                yaxis: { title: 'Count' }
+            });
+"""),
+    ("mismatches", "numMismatches", """
+            // NumMismatches Bar Chart
+            Plotly.newPlot('numMismatches', [{
+                x: data.NumMismatches.x,
+                y: data.NumMismatches.y,
+                type: 'bar',
+                marker: { color: 'orange' }
+            }], {
+                title: 'Number of Mismatches',
+                xaxis: { title: 'NumMismatches' },
+                yaxis: { title: 'Count' }
+            });
+"""),
+]
+
+_OVERLAP_CHART = """
+            // Overlap Pie Chart
+            Plotly.newPlot('overlapChart', [{
+                labels: ['No Overlap', 'Overlap'],
+                values: data.Overlap,
+                type: 'pie'
+            }], {
+                title: 'Overlap Summary'
+            });
+"""
+
+def _filtered_table(summary):
+    # Reads removed by the flag/MAPQ filters, by reason; empty without filters
+    if not summary.filtered:
+        return ""
+    rows = "".join(f"<tr><td>{escape(reason)}</td><td>{count}</td></tr>\n"
+                   for reason, count in sorted(summary.filtered.items()))
+    return f"""
+    <h2>Filtered Reads</h2>
+    <table border="1" cellpadding="4" cellspacing="0">
+        <tr>
+            <th>Reason</th>
+            <th>Read Count</th>
+        </tr>
+        {rows}
+    </table>"""
+
+def _profile_table(profile):
+    # Stage metrics of a StageProfiler report; empty without --profile
+    if not profile:
+        return ""
+    rows = ""
+    for stage, r in profile["stages"].items():
+        rate = f"{r['reads_per_sec']:,.0f}" if r["reads_per_sec"] else ""
+        rows += (f"<tr><td>{escape(stage)}</td><td>{r['wall_seconds']:.3f}</td>"
+                 f"<td>{r['cpu_seconds']:.3f}</td><td>{r['reads']}</td><td>{rate}</td>"
+                 f"<td>{r['peak_rss_mb']:.0f}</td></tr>\n")
+    total = profile["total"]
+    rows += (f"<tr><td><strong>Total</strong></td><td>{total['wall_seconds']:.3f}</td>"
+             f"<td>{total['cpu_seconds']:.3f}</td><td></td><td></td>"
+             f"<td>{total['peak_rss_mb']:.0f}</td></tr>")
+    return f"""
+    <h2>Profile</h2>
+    <table border="1" cellpadding="4" cellspacing="0">
+        <tr>
+            <th>Stage</th>
+            <th>Wall (s)</th>
+            <th>CPU (s)</th>
+            <th>Reads</th>
+            <th>Reads/s</th>
+            <th>Peak RSS (MB)</th>
+        </tr>
+        {rows}
+    </table>"""
+
+def cohort_rows(results):
+    """
+    Headline numbers of each sample of a cohort.
+
+    Args:
+        results (list[tuple[str, StatsSummary]]): Sample names and summaries.
+
+    Returns:
+        list[dict]: One row per sample; metric columns only for the metrics
+        that were computed.
+    """
+    rows = []
+    for name, summary in results:
+        total = summary.total_reads
+        row = {"Sample": name, "TotalReads": total, "OverlapReads": summary.overlap_count,
+               "OverlapFraction": summary.overlap_count / total if total else 0.0}
+        if "fragment_length" in summary.metrics:
+            row["MedianFragmentLength"] = summary.fragment_lengths.median()
+        if "base_quality" in summary.metrics:
+            row["MeanBaseQuality"] = summary.avg_base_quality
+        if "gc_content" in summary.metrics:
+            row["MedianGCContent"] = summary.gc_fractions.median()
+        if "mismatches" in summary.metrics:
+            row["MeanMismatches"] = summary.mismatches.mean()
+        row["UnmappedReads"] = summary.unmapped.total
+        row["FilteredReads"] = sum(summary.filtered.values())
+        rows.append(row)
+    return rows
+
+def write_cohort_tsv(results, output_path):
+    import pandas as pd
+
+    _ensure_dir(output_path)
+    pd.DataFrame(cohort_rows(results)).to_csv(output_path, sep="\t", index=False,
+                                              float_format="%.4f", na_rep="",
+                                              lineterminator="\n")
+
+def _samples_table(results):
+    # Per-sample headline numbers of a cohort report; empty for a single sample
+    if not results:
+        return ""
+    rows = cohort_rows(results)
+    header = "".join(f"<th>{column}</th>" for column in rows[0])
+    body = ""
+    for row in rows:
+        cells = "".join(f"<td>{value:.2f}</td>" if isinstance(value, float)
+                        else f"<td>{escape(str(value))}</td>" for value in row.values())
+        body += f"<tr>{cells}</tr>\n"
+    return f"""
+    <h2>Samples</h2>
+    <table border="1" cellpadding="4" cellspacing="0">
+        <tr>{header}</tr>
+        {body}
+    </table>"""
+
+def write_cohort_report(results, output_dir, metrics):
+    """
+    Write ``cohort.tsv`` with one row per sample and ``cohort.html``, the
+    dashboard of all samples' reads together with a per-sample table.
+    """
+    cohort = StatsSummary(metrics)
+    for _, summary in results:
+        cohort.merge(summary)
+    write_cohort_tsv(results, os.path.join(output_dir, "cohort.tsv"))
+    write_dashboard_html(cohort, os.path.join(output_dir, "cohort.html"), samples=results)
+    logger.info("Wrote the cohort report of %s samples to %s.", len(results), output_dir)
+
+def write_dashboard_html(summary, output_path, profile=None, samples=None):
+    # Only binned counts are embedded, so the page size does not depend on the read count
+    mismatch_values, mismatch_counts = summary.mismatches.value_counts()
+    data_json = {
+        "FragmentLength": {"x": FRAGMENT_LABELS, "y": summary.fragment_counts.tolist()},
+        "AvgBaseQuality": _bar_data(QUALITY_BIN_EDGES, summary.quality_histogram),
+        "GCContent": _bar_data(GC_BIN_EDGES, summary.gc_histogram),
+        "NumMismatches": {"x": mismatch_values.tolist(), "y": mismatch_counts.tolist()},
+    }
+    data_json = {METRICS[metric]: data_json[METRICS[metric]] for metric in summary.metrics}
+    data_json["Overlap"] = [int(summary.total_reads - summary.overlap_count),
+                            int(summary.overlap_count)]
+
+    charts = [(div_id, script) for metric, div_id, script in _DASHBOARD_CHARTS
+              if metric in summary.metrics] + [("overlapChart", _OVERLAP_CHART)]
+    divs = "\n".join(f'        <div class="chart-container" id="{div_id}"></div>'
+                      for div_id, _ in charts)
+    scripts = "".join(script for _, script in charts)
 
     # HTML + Plotly Dashboard Template
     html = f"""
@@ -55,148 +427,49 @@ def write_html(stats, output_path):
     <body>
         <h1>Read Statistics Summary</h1>
 
-        <div class="chart-container" id="avgBaseQuality"></div>
-        <div class="chart-container" id="gcContent"></div>
-        <div class="chart-container" id="numMismatches"></div>
-        <div class="chart-container" id="overlapChart"></div>
+{_samples_table(samples)}{divs}{_filtered_table(summary)}{_profile_table(profile)}
 
         <script>
             const data = {json.dumps(data_json)};
-
-            // AvgBaseQuality Histogram
-            Plotly.newPlot('avgBaseQuality', [{{
-                x: data.AvgBaseQuality,
-                type: 'histogram',
-                marker: {{ color: 'teal' }}
-            }}], {{
-                title: 'Average Base Quality Distribution',
-                xaxis: {{ title: 'AvgBaseQuality' }},
-                yaxis: {{ title: 'Count' }}
-            }});
-
-            // GCContent Histogram
-            Plotly.newPlot('gcContent', [{{
-                x: data.GCContent,
-                type: 'histogram',
-                marker: {{ color: 'purple' }}
-            }}], {{
-                title: 'GC Content Distribution',
-                xaxis: {{ title: 'GCContent (%)' }},
-                yaxis: {{ title: 'Count' }}
-            }});
-
-            // NumMismatches Bar Chart
-            const mismatchCounts = {{
-                x: Array.from(new Set(data.NumMismatches)).sort((a,b)=>a-b),
-                y: []
-            }};
-            mismatchCounts.x.forEach(val => {{
-                mismatchCounts.y.push(data.NumMismatches.filter(x => x === val).length);
-            }});
-
-            Plotly.newPlot('numMismatches', [{{
-                x: mismatchCounts.x,
-                y: mismatchCounts.y,
-                type: 'bar',
-                marker: {{ color: 'orange' }}
-            }}], {{
-                title: 'Number of Mismatches',
-                xaxis: {{ title: 'NumMismatches' }},
-                yaxis: {{ title: 'Count' }}
-            }});
-
-            // Overlap Pie Chart
-            const overlapCounts = {{
-                labels: ['No Overlap', 'Overlap'],
-                values: [data.Overlap.filter(x => x == 0).length, data.Overlap.filter(x => x == 1).length]
-            }};
-
-            Plotly.newPlot('overlapChart', [{{
-                labels: overlapCounts.labels,
-                values: overlapCounts.values,
-                type: 'pie'
-            }}], {{
-                title: 'Overlap Summary'
-            }});
-        </script>
+{scripts}        </script>
     </body>
     </html>
     """
 
+    _ensure_dir(output_path)
     with open(output_path, "w", encoding="utf-8") as f:
         f.write(html)
 
-def write_simple_html(stats, output_path):        
-    overlap_count = stats["Overlap"].sum()
-    avg_base_quality = stats["AvgBaseQuality"].mean()
-
-
-    # Define bins and labels for fragment length
-    bins = [0, 50] + [i for i in range(100, 655, 50)]
-    fragment_labels = ["<50", "50-100"] + [f"{i}-{i+50}" for i in range(100, 650, 50)] + [">650"]
-
-    # Assign bins
-    cut_bins = bins + [float("inf")]
-    stats["FragLenBin"] = pd.cut(
-        stats["FragmentLength"],
-        bins=cut_bins,
-        labels=fragment_labels,
-        right=True,
-        include_lowest=True
-    )
-
-    bin_counts = stats["FragLenBin"].value_counts().reindex(fragment_labels, fill_value=0)
-    total_reads = len(stats)
-    fragment_table_rows = ""
-    for label in fragment_labels:
-        count = bin_counts[label]
-        percent = (count / total_reads * 100) if total_reads > 0 else 0
-        fragment_table_rows += f"<tr><td>{label}</td><td>{count}</td><td>{percent:.2f}</td></tr>\n"
-
-    # GC content distribution table
-    gc_bins = [0, 0.25, 0.5, 0.75, 1.0]
-    gc_labels = ["0-0.25", "0.25-0.5", "0.5-0.75", "0.75-1.0"]
-    stats["GCBin"] = pd.cut(
-        stats["GCContent"],
-        bins=gc_bins,
-        labels=gc_labels,
-        right=True,
-        include_lowest=True
-    )
-    gc_bin_counts = stats["GCBin"].value_counts().reindex(gc_labels, fill_value=0)
-    gc_table_rows = ""
-    for label in gc_labels:
-        bin_mask = stats["GCBin"] == label
-        count = gc_bin_counts[label]
-        percent = (count / total_reads * 100) if total_reads > 0 else 0
-        avg_base_qual = stats.loc[bin_mask, "AvgBaseQuality"].mean()
-        avg_base_qual_str = f"{avg_base_qual:.2f}" if count > 0 else "N/A"
-        gc_table_rows += f"<tr><td>{label}</td><td>{count}</td><td>{percent:.2f}</td><td>{avg_base_qual_str}</td></tr>\n"
-
-    # Mismatch statistics table
-    mismatch_bins = list(range(0, 11)) + [float("inf")]
-    mismatch_labels = [str(i) for i in range(0, 10)] + [">10"]
-    stats["MismatchBin"] = pd.cut(
-        stats["NumMismatches"],
-        bins=mismatch_bins,
-        labels=mismatch_labels,
-        right=True,
-        include_lowest=True
-    )
-    mismatch_bin_counts = stats["MismatchBin"].value_counts().reindex(mismatch_labels, fill_value=0)
-    mismatch_table_rows = ""
-    for label in mismatch_labels:
-        count = mismatch_bin_counts[label]
-        percent = (count / total_reads * 100) if total_reads > 0 else 0
-        mismatch_table_rows += f"<tr><td>{label}</td><td>{count}</td><td>{percent:.2f}</td></tr>\n"
+def write_simple_html(stats, output_path):
+    summary = StatsSummary(frame_metrics(stats))
+    summary.update(stats)
+    write_summary_html(summary, output_path)
 
-    html = f"""<html><head><title>Read Stats</title></head><body>
-    <h1>Read Statistics Summary</h1>
-    <ul>
-        <li><strong>Total Mapped Reads:</strong> {total_reads}</li>
-        <li><strong>Overlapping Reads:</strong> {overlap_count}</li>
-        <li><strong>Average Base Quality:</strong> {avg_base_quality:.2f}</li>
-    </ul>
+def write_summary_html(summary, output_path):
+    overlap_count = summary.overlap_count
+    total_reads = summary.total_reads
+    metrics = summary.metrics
+
+    # Headline numbers and tables of the metrics that were computed
+    summary_items = ""
+    sections = ""
+    if "base_quality" in metrics:
+        summary_items += f"""
+        <li><strong>Average Base Quality:</strong> {summary.avg_base_quality:.2f}</li>
+        <li><strong>Median Base Quality:</strong> {summary.qualities.median():.2f}</li>"""
+    if "fragment_length" in metrics:
+        fragment_lengths = summary.fragment_lengths
+        median_range = (f"{fragment_lengths.median():.0f} ({fragment_lengths.quantile(0.05):.0f}-"
+                        f"{fragment_lengths.quantile(0.95):.0f})")
+        summary_items += f"""
+        <li><strong>Median Fragment Length (5th-95th percentile):</strong> {median_range}</li>"""
+
+        fragment_table_rows = ""
+        for label, count in zip(FRAGMENT_LABELS, summary.fragment_counts):
+            percent = (count / total_reads * 100) if total_reads > 0 else 0
+            fragment_table_rows += (f"<tr><td>{label}</td><td>{count}</td>"
+                                    f"<td>{percent:.2f}</td></tr>\n")
+        sections += f"""
     <h2>Fragment Length Distribution</h2>
     <table border="1" cellpadding="4" cellspacing="0">
         <tr>
@@ -205,7 +478,21 @@ def write_simple_html(stats, output_path):
             <th>% of Total</th>
         </tr>
         {fragment_table_rows}
-    </table>
+    </table>"""
+    if "gc_content" in metrics:
+        summary_items += f"""
+        <li><strong>Median GC Content:</strong> {summary.gc_fractions.median():.3f}</li>"""
+
+        # GC content distribution table
+        gc_table_rows = ""
+        gc_avg_base_quality = summary.gc_avg_base_quality()
+        for label, count, avg_base_qual in zip(GC_LABELS, summary.gc_counts, gc_avg_base_quality):
+            percent = (count / total_reads * 100) if total_reads > 0 else 0
+            has_quality = count > 0 and "base_quality" in metrics
+            avg_base_qual_str = f"{avg_base_qual:.2f}" if has_quality else "N/A"
+            gc_table_rows += (f"<tr><td>{label}</td><td>{count}</td><td>{percent:.2f}</td>"
+                              f"<td>{avg_base_qual_str}</td></tr>\n")
+        sections += f"""
     <h2>GC Content Distribution</h2>
     <table border="1" cellpadding="4" cellspacing="0">
         <tr>
@@ -215,7 +502,15 @@ def write_simple_html(stats, output_path):
             <th>Avg Base Quality</th>
         </tr>
         {gc_table_rows}
-    </table>
+    </table>"""
+    if "mismatches" in metrics:
+        # Mismatch statistics table
+        mismatch_table_rows = ""
+        for label, count in zip(MISMATCH_LABELS, summary.mismatch_counts):
+            percent = (count / total_reads * 100) if total_reads > 0 else 0
+            mismatch_table_rows += (f"<tr><td>{label}</td><td>{count}</td>"
+                                    f"<td>{percent:.2f}</td></tr>\n")
+        sections += f"""
     <h2>Mismatch Statistics</h2>
     <table border="1" cellpadding="4" cellspacing="0">
         <tr>
@@ -224,11 +519,17 @@ def write_simple_html(stats, output_path):
             <th>% of Total</th>
         </tr>
         {mismatch_table_rows}
-    </table>
+    </table>"""
+
+    html = f"""<html><head><title>Read Stats</title></head><body>
+    <h1>Read Statistics Summary</h1>
+    <ul>
+        <li><strong>Total Mapped Reads:</strong> {total_reads}</li>
+        <li><strong>Overlapping Reads:</strong> {overlap_count}</li>{summary_items}
+    </ul>{sections}{_filtered_table(summary)}
     </body></html>"""
 
-    if not os.path.exists(os.path.dirname(output_path)):
-        os.makedirs(os.path.dirname(output_path))
+    _ensure_dir(output_path)
     with open(output_path, "w", encoding="utf-8") as f:
         f.write(html)
 
@@ -1,35 +1,722 @@
-from Bio.SeqUtils import gc_fraction
-from read_stats.logging_config import setup_logger
+import heapq
+from array import array
+from collections import Counter, deque
+import numpy as np
+from read_stats.reference import ReferenceWindows
+from read_stats.logging_config import get_logger
 
 # logging.basicConfig(filename='log/unmapped_reads.log', level=logging.INFO)
-logger = setup_logger(__name__, log_file="unmapped_reads")
+logger = get_logger(__name__, log_file="unmapped_reads", asynchronous=True)
 
-def compute_stats(read):
+DEFAULT_BATCH_SIZE = 65536
+
+STATS_COLUMNS = ["ReadID", "FragmentLength", "AvgBaseQuality", "GCContent",
+                 "NumMismatches", "Chromosome", "Start", "End"]
+
+# Registry of the per-read metrics selectable with --metrics: the stats column
+# each one fills. Only the AlignedSegment fields of requested metrics are
+# decoded (template length, qualities, sequence or the NM tag); ReadID and the
+# position columns are always kept for the overlap computation.
+METRICS = {
+    "fragment_length": "FragmentLength",
+    "base_quality": "AvgBaseQuality",
+    "gc_content": "GCContent",
+    "mismatches": "NumMismatches",
+}
+DEFAULT_METRICS = tuple(METRICS)
+
+# Sentinel stored in the NumMismatches column when the read has no NM tag
+MISSING_NM = -1
+
+# Longest read name allowed by the SAM specification
+MAX_READ_NAME = 254
+
+# Bytes per read of each metric column of a StatsBatch
+_METRIC_BYTES = {"fragment_length": 4, "base_quality": 8, "gc_content": 8, "mismatches": 4}
+
+# MD tag characters that are not mismatched or deleted reference bases
+_MD_NUMBERS = str.maketrans("", "", "0123456789^")
+
+# CIGAR operations aligning read bases to reference bases: M, = and X
+_ALIGNED_OPS = (0, 7, 8)
+
+# Mates starting further apart than this are not paired by --per-fragment: the
+# mate buffer holds every read between the two mates of a pair
+MAX_MATE_DISTANCE = 100_000
+
+# SAM flag names accepted by --require-flags/--exclude-flags, as in samtools
+FLAG_NAMES = {
+    "PAIRED": 0x1,
+    "PROPER_PAIR": 0x2,
+    "UNMAP": 0x4,
+    "MUNMAP": 0x8,
+    "REVERSE": 0x10,
+    "MREVERSE": 0x20,
+    "READ1": 0x40,
+    "READ2": 0x80,
+    "SECONDARY": 0x100,
+    "QCFAIL": 0x200,
+    "DUP": 0x400,
+    "SUPPLEMENTARY": 0x800,
+}
+
+# Lookup tables matching Bio.SeqUtils.gc_fraction(seq, ambiguous="remove"):
+# G, C and S count as GC, and only GCS plus ATWU count towards the length.
+_GC_LUT = np.zeros(256, dtype=np.uint8)
+_GC_LUT[list(b"CGScgs")] = 1
+_LENGTH_LUT = _GC_LUT.copy()
+_LENGTH_LUT[list(b"ATWUatwu")] = 1
+
+
+def parse_metrics(names):
+    """
+    Validate metric names against ``METRICS``.
+
+    Args:
+        names (str | Iterable[str] | None): Comma-separated string or list of
+            metric names; None selects every metric.
+
+    Returns:
+        tuple[str, ...]: The requested metrics in registry order.
+    """
+    if names is None:
+        return DEFAULT_METRICS
+    if isinstance(names, str):
+        names = [name.strip() for name in names.split(",") if name.strip()]
+    unknown = sorted(set(names) - set(METRICS))
+    if unknown:
+        raise ValueError(f"Unknown metrics: {', '.join(unknown)} "
+                         f"(choose from {', '.join(METRICS)})")
+    if not names:
+        raise ValueError("At least one metric is required")
+    return tuple(name for name in METRICS if name in names)
+
+def stats_columns(metrics=DEFAULT_METRICS):
+    """Stats columns produced for ``metrics``, in ``STATS_COLUMNS`` order."""
+    selected = {METRICS[name] for name in metrics}
+    return [c for c in STATS_COLUMNS if c in selected or c not in METRICS.values()]
+
+def compute_stats(read, metrics=DEFAULT_METRICS):
     if read.is_unmapped:
-        logger.info("Unmapped read: %s", read.query_name)
+        logger.debug("Unmapped read: %s", read.query_name)
         return
 
     try:
-        frag_length = abs(read.template_length)
-        base_qualities = read.query_qualities or []
-        avg_base_quality = compute_avg_quality(base_qualities)
-        read_seq = read.query_sequence
-        gc_content = gc_fraction(read_seq) if read_seq else 0
-        num_mismatches = read.get_tag("NM") if read.has_tag("NM") else None
-        
-        return {
-            "ReadID": read.query_name,
-            "FragmentLength": frag_length,
-            "AvgBaseQuality": avg_base_quality,
-            "GCContent": gc_content,
-            "NumMismatches": num_mismatches,
-            "Chromosome": read.reference_name,
-            "Start": read.reference_start,
-            "End": read.reference_end
-        }
+        stats = {"ReadID": read.query_name}
+        if "fragment_length" in metrics:
+            stats["FragmentLength"] = abs(read.template_length)
+        if "base_quality" in metrics:
+            stats["AvgBaseQuality"] = compute_avg_quality(read.query_qualities or [])
+        if "gc_content" in metrics:
+            read_seq = read.query_sequence
+            stats["GCContent"] = gc_fraction(read_seq) if read_seq else 0
+        if "mismatches" in metrics:
+            stats["NumMismatches"] = (read.get_tag("NM") if read.has_tag("NM")
+                                      else md_edit_distance(read))
+        stats["Chromosome"] = read.reference_name
+        stats["Start"] = read.reference_start
+        stats["End"] = read.reference_end
+        return stats
     except Exception as e:
         logger.error("Error processing read %s: %s", read.query_name, e)
         raise
 
 def compute_avg_quality(read_base_qualities):
     return sum(read_base_qualities) / len(read_base_qualities) if read_base_qualities else 0
+
+def gc_fraction(seq):
+    """Same result as ``Bio.SeqUtils.gc_fraction(seq)``, ambiguous bases removed."""
+    gc = sum(seq.count(x) for x in "CGScgs")
+    length = gc + sum(seq.count(x) for x in "ATWUatwu")
+    return gc / length if length else 0
+
+def md_edit_distance(read):
+    """
+    Edit distance of a read, as in its NM tag, from its MD tag: the
+    mismatched and deleted reference bases of MD plus the inserted bases of
+    the CIGAR. None if the read has no MD tag either.
+    """
+    if not read.has_tag("MD"):
+        return None
+    inserted = read.get_cigar_stats()[0][1]
+    return len(read.get_tag("MD").translate(_MD_NUMBERS)) + inserted
+
+def _segment_sums(values, lengths):
+    # Sum consecutive segments of values; empty segments sum to 0
+    totals = np.zeros(len(values) + 1, dtype=np.int64)
+    np.cumsum(values, dtype=np.int64, out=totals[1:])
+    ends = np.cumsum(lengths)
+    return totals[ends] - totals[ends - lengths]
+
+def batch_avg_quality(qualities, lengths):
+    """
+    Mean base quality of many reads at once.
+
+    Args:
+        qualities (np.ndarray): Concatenated base qualities of all reads (uint8).
+        lengths (np.ndarray): Number of qualities of each read.
+
+    Returns:
+        np.ndarray: Per-read mean quality, 0 for reads without qualities.
+    """
+    sums = _segment_sums(qualities, lengths)
+    return np.divide(sums, lengths, out=np.zeros(len(lengths)), where=lengths > 0)
+
+def batch_gc_fraction(sequences, lengths):
+    """
+    GC fraction of many reads at once, identical to ``gc_fraction`` per read.
+
+    Args:
+        sequences (np.ndarray): Concatenated ASCII bases of all reads (uint8).
+        lengths (np.ndarray): Number of bases of each read.
+
+    Returns:
+        np.ndarray: Per-read GC fraction, 0 for reads without counted bases.
+    """
+    gc = _segment_sums(_GC_LUT[sequences], lengths)
+    counted = _segment_sums(_LENGTH_LUT[sequences], lengths)
+    return np.divide(gc, counted, out=np.zeros(len(lengths)), where=counted > 0)
+
+
+def batch_mismatches(query, reference, lengths):
+    """
+    Mismatches of many reads' aligned bases at once, counted as by
+    ``samtools calmd``: bases that differ, or are both N; ``=`` bases match.
+
+    Args:
+        query (np.ndarray): Concatenated upper-case read bases of the aligned
+            blocks of all reads (uint8).
+        reference (np.ndarray): The reference bases they are aligned to.
+        lengths (np.ndarray): Number of compared bases of each read.
+
+    Returns:
+        np.ndarray: Per-read number of mismatched bases.
+    """
+    mismatched = (((query != reference) & (query != ord("=")))
+                  | ((query == reference) & (query == ord("N"))))
+    return _segment_sums(mismatched, lengths)
+
+
+class UnmappedReads:
+    """
+    Counts of unmapped reads per (reference_id, flag), with the names of the
+    first ``max_names`` of them.
+    """
+
+    def __init__(self, max_names=0):
+        self.max_names = max_names
+        self.counts = Counter()
+        self.names = []
+
+    def add(self, read):
+        self.counts[(read.reference_id, read.flag)] += 1
+        if len(self.names) < self.max_names:
+            self.names.append(read.query_name)
+
+    @property
+    def total(self):
+        return sum(self.counts.values())
+
+    def merge(self, other):
+        self.counts.update(other.counts)
+        self.max_names = max(self.max_names, other.max_names)
+        self.names = (self.names + other.names)[:self.max_names]
+        return self
+
+def parse_flags(value):
+    """
+    Parse a samtools-style flag value: comma-separated integers (decimal,
+    0x hex or 0 octal) or names from ``FLAG_NAMES``, e.g. ``SECONDARY,DUP``.
+    """
+    if value is None:
+        return 0
+    if isinstance(value, int):
+        return value
+    flags = 0
+    for item in value.split(","):
+        item = item.strip()
+        if item[:1].isdigit():
+            # Same bases as strtol(item, NULL, 0): 0x for hex, a leading 0 for octal
+            if len(item) > 1 and item[0] == "0" and item[1].isdigit():
+                flags |= int(item, 8)
+            else:
+                flags |= int(item, 0)
+        elif item.upper() in FLAG_NAMES:
+            flags |= FLAG_NAMES[item.upper()]
+        else:
+            raise ValueError(f"Unknown SAM flag: {item} (choose from {', '.join(FLAG_NAMES)})")
+    return flags
+
+
+class ReadFilter:
+    """
+    samtools-style read filter on the flag and MAPQ fields.
+
+    A read is kept if it has every flag of ``require_flags``, none of
+    ``exclude_flags`` and a mapping quality of at least ``min_mapq``. Only
+    ``read.flag`` and ``read.mapping_quality`` are read, so filtered reads
+    never pay for sequence or quality decoding.
+    """
+
+    def __init__(self, require_flags=0, exclude_flags=0, min_mapq=0):
+        self.require_flags = require_flags
+        self.exclude_flags = exclude_flags
+        self.min_mapq = min_mapq
+
+    @property
+    def active(self):
+        return bool(self.require_flags or self.exclude_flags or self.min_mapq)
+
+    def reason(self, read):
+        """Why the read is filtered out, or None if it is kept."""
+        flag = read.flag
+        excluded = flag & self.exclude_flags
+        if excluded:
+            # Reads with several excluded flags are counted under the lowest one
+            return next(name for name, bit in FLAG_NAMES.items() if excluded & bit)
+        if flag & self.require_flags != self.require_flags:
+            return "missing required flags"
+        if read.mapping_quality < self.min_mapq:
+            return f"MAPQ < {self.min_mapq}"
+        return None
+
+def fragment_filter(read_filter=None):
+    """
+    ``read_filter`` for ``--per-fragment`` scans, also excluding secondary and
+    supplementary alignments, which are extra alignments of a fragment's reads.
+    """
+    if read_filter is None:
+        read_filter = ReadFilter()
+    extra = FLAG_NAMES["SECONDARY"] | FLAG_NAMES["SUPPLEMENTARY"]
+    return ReadFilter(read_filter.require_flags, read_filter.exclude_flags | extra,
+                      read_filter.min_mapq)
+
+def _mate_ahead(read, max_distance):
+    # True if the read's mate starts at or after it on the same contig
+    return (read.is_paired and not read.mate_is_unmapped
+            and read.next_reference_id == read.reference_id
+            and 0 <= read.next_reference_start - read.reference_start <= max_distance)
+
+def pair_mates(reads, max_distance=MAX_MATE_DISTANCE):
+    """
+    Pair the mates of a coordinate-sorted stream of mapped primary reads.
+
+    A read whose mate starts later on the same contig waits in a buffer until
+    the mate arrives. Once the stream has passed the mate's start without
+    finding it (the mate was filtered out or not scanned), the read is evicted
+    and reported alone, so the buffer only holds fragments in progress: the
+    reads between the two mates of a pair, at most ``max_distance`` bases.
+
+    Yields:
+        tuple: (read, mate) per fragment, in order of the fragment start,
+        where ``mate`` is None for reads whose mate is not in the stream.
+    """
+    pending = {}     # Read name -> fragment waiting for its mate
+    expected = []    # Heap of (mate start, arrival, fragment) of the waiting fragments
+    fragments = deque()  # [read, mate, done] in order of the first read
+    contig = None
+    for arrival, read in enumerate(reads):
+        position = read.reference_start
+        if read.reference_id != contig:
+            contig = read.reference_id
+            for fragment in pending.values():
+                fragment[2] = True
+            pending.clear()
+            expected.clear()
+        while expected and expected[0][0] < position:
+            fragment = heapq.heappop(expected)[2]
+            if not fragment[2]:
+                fragment[2] = True
+                del pending[fragment[0].query_name]
+
+        fragment = pending.pop(read.query_name, None)
+        if fragment is not None and fragment[0].next_reference_start == position:
+            fragment[1] = read
+            fragment[2] = True
+        else:
+            if fragment is not None:
+                # Not its mate: the name is shared by unrelated reads
+                fragment[2] = True
+            waiting = _mate_ahead(read, max_distance)
+            fragment = [read, None, not waiting]
+            if waiting:
+                pending[read.query_name] = fragment
+                heapq.heappush(expected, (read.next_reference_start, arrival, fragment))
+            fragments.append(fragment)
+        while fragments and fragments[0][2]:
+            first, mate, _ = fragments.popleft()
+            yield first, mate
+    for first, mate, _ in fragments:
+        yield first, mate
+
+def log_filtered_reads(filtered):
+    """Log the number of reads removed by the read filter, by reason."""
+    logger.info("Filtered reads: %s", sum(filtered.values()))
+    for reason, count in sorted(filtered.items()):
+        logger.info("Filtered reads (%s): %s", reason, count)
+
+def log_unmapped_reads(unmapped, contigs):
+    """Log the unmapped read counts by contig and flag, and the sampled names."""
+    logger.info("Unmapped reads: %s", unmapped.total)
+    for (reference_id, flag), count in sorted(unmapped.counts.items()):
+        contig = contigs[reference_id] if reference_id >= 0 else "*"
+        logger.info("Unmapped reads on %s with flag %s: %s", contig, flag, count)
+    for name in unmapped.names:
+        logger.info("Unmapped read: %s", name)
+
+def log_read_counts(result, contigs):
+    """Log the unmapped and filtered read counts of a StatsBatch or StatsSummary."""
+    log_unmapped_reads(result.unmapped, contigs)
+    if result.filtered:
+        log_filtered_reads(result.filtered)
+
+
+class StatsBatch:
+    """
+    Per-read statistics for a chunk of reads, stored as typed column arrays.
+
+    Contigs are stored as int32 codes into ``contigs`` (the BAM header order)
+    and read names as a fixed-width bytes array, so a batch costs a few bytes
+    per read per column instead of a dict per read. Columns of metrics that
+    were not requested are None.
+    """
+
+    def __init__(self, contigs, read_ids, fragment_length, avg_base_quality,
+                 gc_content, num_mismatches, contig, start, end, unmapped=None, filtered=None):
+        self.contigs = tuple(contigs)
+        # Unmapped reads skipped while this batch was filled, and the reads
+        # removed by the read filter, counted by reason
+        self.unmapped = unmapped if unmapped is not None else UnmappedReads()
+        self.filtered = filtered if filtered is not None else Counter()
+        self.read_ids = read_ids
+        self.fragment_length = fragment_length
+        self.avg_base_quality = avg_base_quality
+        self.gc_content = gc_content
+        self.num_mismatches = num_mismatches
+        self.contig = contig
+        self.start = start
+        self.end = end
+
+    def __len__(self):
+        return len(self.read_ids)
+
+    @property
+    def nbytes(self):
+        """Bytes held by the column arrays."""
+        columns = (self.read_ids, self.fragment_length, self.avg_base_quality, self.gc_content,
+                   self.num_mismatches, self.contig, self.start, self.end)
+        return sum(column.nbytes for column in columns if column is not None)
+
+    @property
+    def metrics(self):
+        columns = {"fragment_length": self.fragment_length, "base_quality": self.avg_base_quality,
+                   "gc_content": self.gc_content, "mismatches": self.num_mismatches}
+        return tuple(name for name in METRICS if columns[name] is not None)
+
+    @classmethod
+    def empty(cls, contigs, metrics=DEFAULT_METRICS):
+        def column(metric, dtype):
+            return np.empty(0, dtype=dtype) if metric in metrics else None
+        return cls(contigs, np.empty(0, dtype="S1"), column("fragment_length", np.int32),
+                   column("base_quality", np.float64), column("gc_content", np.float64),
+                   column("mismatches", np.int32), np.empty(0, dtype=np.int32),
+                   np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32))
+
+    @classmethod
+    def concat(cls, batches, contigs=None, metrics=DEFAULT_METRICS):
+        batches = list(batches)
+        if not batches:
+            return cls.empty(contigs or (), metrics)
+        if len(batches) == 1:
+            return batches[0]
+        unmapped = UnmappedReads()
+        filtered = Counter()
+        for b in batches:
+            unmapped.merge(b.unmapped)
+            filtered.update(b.filtered)
+
+        def column(name):
+            if getattr(batches[0], name) is None:
+                return None
+            return np.concatenate([getattr(b, name) for b in batches])
+
+        return cls(
+            batches[0].contigs,
+            column("read_ids"),
+            column("fragment_length"),
+            column("avg_base_quality"),
+            column("gc_content"),
+            column("num_mismatches"),
+            column("contig"),
+            column("start"),
+            column("end"),
+            unmapped,
+            filtered,
+        )
+
+    def to_frame(self):
+        """
+        Build the same DataFrame that ``pd.DataFrame`` produces from the
+        per-read dicts of ``compute_stats``.
+        """
+        data = {"ReadID": self.read_ids.astype(str)}
+        if self.fragment_length is not None:
+            data["FragmentLength"] = self.fragment_length.astype(np.int64)
+        if self.avg_base_quality is not None:
+            data["AvgBaseQuality"] = self.avg_base_quality
+        if self.gc_content is not None:
+            data["GCContent"] = self.gc_content
+        if self.num_mismatches is not None:
+            missing_nm = self.num_mismatches == MISSING_NM
+            if missing_nm.any():
+                data["NumMismatches"] = np.where(missing_nm, np.nan, self.num_mismatches)
+            else:
+                data["NumMismatches"] = self.num_mismatches.astype(np.int64)
+        data["Chromosome"] = np.asarray(self.contigs, dtype=object)[self.contig]
+        data["Start"] = self.start.astype(np.int64)
+        data["End"] = self.end.astype(np.int64)
+        import pandas as pd
+
+        return pd.DataFrame(data, columns=stats_columns(self.metrics))
+
+
+def budget_batch_size(max_bytes, metrics=DEFAULT_METRICS):
+    """
+    Number of reads per batch whose StatsBatch columns fit in ``max_bytes``
+    whatever the read names, at most ``DEFAULT_BATCH_SIZE`` and at least one.
+    """
+    # Read name, contig, start and end, plus the requested metrics
+    row_bytes = MAX_READ_NAME + 3 * 4 + sum(_METRIC_BYTES[metric] for metric in metrics)
+    return max(1, min(DEFAULT_BATCH_SIZE, max_bytes // row_bytes))
+
+
+def compute_stats_batches(reads, contigs, batch_size=DEFAULT_BATCH_SIZE, unmapped_names=0,
+                          metrics=DEFAULT_METRICS, read_filter=None, per_fragment=False,
+                          reference=None):
+    """
+    Compute per-read statistics for an iterable of reads in fixed-size chunks.
+
+    Unmapped reads are skipped and only counted in ``StatsBatch.unmapped``;
+    reads removed by ``read_filter`` are counted by reason in
+    ``StatsBatch.filtered``. Reads without an NM tag get the edit distance
+    of their MD tag, else of their alignment against ``reference``.
+
+    Args:
+        reads (Iterable[pysam.AlignedSegment]): Reads, usually ``bam.fetch()``.
+        contigs (Sequence[str]): Reference names from the BAM header.
+        batch_size (int): Number of mapped reads per yielded batch.
+        unmapped_names (int): Number of unmapped read names to keep per batch.
+        metrics (Sequence[str]): Metrics to compute, from ``METRICS``; the
+            read fields of other metrics are never decoded.
+        read_filter (ReadFilter): Flag and MAPQ filter applied before any
+            stats are extracted, or None to keep every mapped read.
+        per_fragment (bool): Pair the mates of coordinate-sorted reads with
+            ``pair_mates`` and compute one row per fragment: qualities, GC
+            and mismatches of both mates together, spanning from the first
+            mate's start to the last mate's end. Secondary and supplementary
+            alignments are filtered out.
+        reference (Reference): Reference whose cached sequences reads
+            without NM and MD tags are compared to, or None.
+
+    Yields:
+        StatsBatch: Column arrays for up to ``batch_size`` mapped reads, or
+        fragments with ``per_fragment``.
+    """
+    if per_fragment:
+        read_filter = fragment_filter(read_filter)
+    if read_filter is not None and not read_filter.active:
+        read_filter = None
+    windows = None
+    if reference is not None and reference.md5s and "mismatches" in metrics:
+        # Loaded chunk by chunk as the sorted scan moves along each contig
+        windows = ReferenceWindows(reference)
+    batch = _BatchBuilder(contigs, batch_size, unmapped_names, metrics, windows)
+
+    def mapped_reads():
+        # Counted in the batch being filled: ``batch`` is rebound as batches fill up
+        for read in reads:
+            if read.is_unmapped:
+                batch.unmapped.add(read)
+                continue
+            if read_filter is not None:
+                reason = read_filter.reason(read)
+                if reason is not None:
+                    batch.filtered[reason] += 1
+                    continue
+            yield read
+
+    items, add = mapped_reads(), _BatchBuilder.add
+    if per_fragment:
+        items, add = pair_mates(items), _BatchBuilder.add_fragment
+    for item in items:
+        try:
+            add(batch, item)
+        except Exception as e:
+            read = item[0] if per_fragment else item
+            logger.error("Error processing read %s: %s", read.query_name, e)
+            raise
+        if batch.full():
+            yield batch.build()
+            batch = _BatchBuilder(contigs, batch_size, unmapped_names, metrics, windows)
+    if batch.size or batch.unmapped.total or batch.filtered:
+        yield batch.build()
+
+
+def _reference_end(read):
+    end = read.reference_end
+    return read.reference_start if end is None else end
+
+
+class _BatchBuilder:
+    def __init__(self, contigs, capacity, unmapped_names=0, metrics=DEFAULT_METRICS,
+                 windows=None):
+        self.contigs = contigs
+        self.unmapped = UnmappedReads(unmapped_names)
+        self.filtered = Counter()
+        self.size = 0
+        self.read_ids = []
+        self.fragment_length = self._column("fragment_length" in metrics, capacity, np.int32)
+        self.quality_length = self._column("base_quality" in metrics, capacity, np.int64)
+        self.sequence_length = self._column("gc_content" in metrics, capacity, np.int64)
+        self.num_mismatches = self._column("mismatches" in metrics, capacity, np.int32)
+        # Aligned bases of reads without NM and MD tags, compared in build()
+        self.windows = windows if self.num_mismatches is not None else None
+        self.compared_length = np.zeros(capacity, dtype=np.int64) if self.windows else None
+        self.compared_query = []
+        self.compared_reference = []
+        self.qualities = array("B")
+        self.sequences = []
+        self.contig = np.empty(capacity, dtype=np.int32)
+        self.start = np.empty(capacity, dtype=np.int32)
+        self.end = np.empty(capacity, dtype=np.int32)
+
+    @staticmethod
+    def _column(requested, capacity, dtype):
+        return np.empty(capacity, dtype=dtype) if requested else None
+
+    def full(self):
+        return self.size == len(self.contig)
+
+    def add(self, read):
+        i = self.size
+        self.read_ids.append(read.query_name)
+        if self.fragment_length is not None:
+            self.fragment_length[i] = abs(read.template_length)
+        if self.quality_length is not None:
+            base_qualities = read.query_qualities
+            if base_qualities:
+                self.qualities.extend(base_qualities)
+                self.quality_length[i] = len(base_qualities)
+            else:
+                self.quality_length[i] = 0
+        if self.sequence_length is not None:
+            read_seq = read.query_sequence or ""
+            self.sequences.append(read_seq)
+            self.sequence_length[i] = len(read_seq)
+        if self.num_mismatches is not None:
+            self.num_mismatches[i] = (read.get_tag("NM") if read.has_tag("NM")
+                                      else self._edit_distance(read, i))
+        self.contig[i] = read.reference_id
+        self.start[i] = read.reference_start
+        self.end[i] = _reference_end(read)
+        self.size = i + 1
+
+    def add_fragment(self, fragment):
+        read, mate = fragment
+        if mate is None:
+            self.add(read)
+            return
+        i = self.size
+        self.read_ids.append(read.query_name)
+        if self.fragment_length is not None:
+            self.fragment_length[i] = abs(read.template_length)
+        if self.quality_length is not None:
+            self.quality_length[i] = 0
+            for base_qualities in (read.query_qualities, mate.query_qualities):
+                if base_qualities:
+                    self.qualities.extend(base_qualities)
+                    self.quality_length[i] += len(base_qualities)
+        if self.sequence_length is not None:
+            read_seq = (read.query_sequence or "") + (mate.query_sequence or "")
+            self.sequences.append(read_seq)
+            self.sequence_length[i] = len(read_seq)
+        if self.num_mismatches is not None:
+            distances = [r.get_tag("NM") if r.has_tag("NM") else self._edit_distance(r, i)
+                         for r in (read, mate)]
+            self.num_mismatches[i] = MISSING_NM if MISSING_NM in distances else sum(distances)
+        self.contig[i] = read.reference_id
+        self.start[i] = read.reference_start
+        self.end[i] = max(_reference_end(read), _reference_end(mate))
+        self.size = i + 1
+
+    def _edit_distance(self, read, i):
+        # NM of a read without NM tag: from its MD tag, else from its alignment
+        distance = md_edit_distance(read)
+        if distance is not None:
+            return distance
+        if self.windows is None:
+            return MISSING_NM
+        query = read.query_sequence
+        bases = self.windows.fetch(self.contigs[read.reference_id], read.reference_start,
+                                   _reference_end(read))
+        if query is None or bases is None:
+            return MISSING_NM
+        # Indels count here; mismatches of the aligned blocks are added in build()
+        distance = qpos = rpos = compared = 0
+        for op, length in read.cigartuples:
+            if op in _ALIGNED_OPS:
+                self.compared_query.append(query[qpos:qpos + length])
+                self.compared_reference.append(bases[rpos:rpos + length])
+                compared += length
+                qpos += length
+                rpos += length
+            elif op == 1:
+                distance += length
+                qpos += length
+            elif op == 2:
+                distance += length
+                rpos += length
+            elif op == 3:
+                rpos += length
+            elif op == 4:
+                qpos += length
+        self.compared_length[i] += compared
+        return distance
+
+    def build(self):
+        n = self.size
+        avg_base_quality = gc_content = None
+        if self.quality_length is not None:
+            qualities = np.frombuffer(self.qualities, dtype=np.uint8)
+            avg_base_quality = batch_avg_quality(qualities, self.quality_length[:n])
+        if self.sequence_length is not None:
+            sequences = np.frombuffer("".join(self.sequences).encode("ascii"), dtype=np.uint8)
+            gc_content = batch_gc_fraction(sequences, self.sequence_length[:n])
+        num_mismatches = self._trim(self.num_mismatches)
+        if self.compared_query:
+            query = "".join(self.compared_query).upper().encode("ascii")
+            mismatches = batch_mismatches(np.frombuffer(query, dtype=np.uint8),
+                                          np.frombuffer(b"".join(self.compared_reference),
+                                                        dtype=np.uint8),
+                                          self.compared_length[:n])
+            known = num_mismatches != MISSING_NM
+            num_mismatches[known] += mismatches[known].astype(np.int32)
+        return StatsBatch(
+            self.contigs,
+            np.array(self.read_ids, dtype="S"),
+            self._trim(self.fragment_length),
+            avg_base_quality,
+            gc_content,
+            num_mismatches,
+            self._trim(self.contig),
+            self._trim(self.start),
+            self._trim(self.end),
+            self.unmapped,
+            self.filtered,
+        )
+
+    def _trim(self, column):
+        # Copy a partially filled column so the unused capacity can be freed
+        if column is None or self.size == len(column):
+            return column
+        return column[:self.size].copy()
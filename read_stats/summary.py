@@ -0,0 +1,254 @@
+from collections import Counter
+import numpy as np
+from read_stats.stats import DEFAULT_METRICS, METRICS, UnmappedReads
+
+# Fragment length bins of the summary report
+FRAGMENT_BINS = [0, 50] + list(range(100, 655, 50)) + [float("inf")]
+FRAGMENT_LABELS = ["<50", "50-100"] + [f"{i}-{i+50}" for i in range(100, 650, 50)] + [">650"]
+
+# GC content bins of the summary report
+GC_BINS = [0, 0.25, 0.5, 0.75, 1.0]
+GC_LABELS = ["0-0.25", "0.25-0.5", "0.5-0.75", "0.75-1.0"]
+
+# Mismatch bins of the summary report
+MISMATCH_BINS = list(range(0, 11)) + [float("inf")]
+MISMATCH_LABELS = [str(i) for i in range(0, 10)] + [">10"]
+
+# Histogram bins of the HTML dashboard: mean base quality in 1-unit bins up to
+# the highest Phred score, GC fraction in 0.01 bins; the last bin is closed
+QUALITY_BIN_EDGES = np.arange(0, 94, dtype=np.float64)
+GC_BIN_EDGES = np.linspace(0, 1, 101)
+
+# Resolution of the quantile sketches; integer columns are counted exactly
+QUALITY_RESOLUTION = 0.01
+GC_RESOLUTION = 0.001
+
+
+def _column(stats, name):
+    return stats[name].to_numpy(dtype=np.float64, na_value=np.nan)
+
+def _bin_index(values, edges):
+    # Same bins as pd.cut(values, edges, right=True, include_lowest=True); -1 if outside
+    edges = np.asarray(edges, dtype=np.float64)
+    index = np.searchsorted(edges, values, side="left") - 1
+    index[values == edges[0]] = 0
+    index[np.isnan(values) | (values < edges[0]) | (values > edges[-1])] = -1
+    return index
+
+def _histogram(values, edges):
+    # Left-closed fixed-width bins; values past the last edge go to the last bin
+    values = values[~np.isnan(values)]
+    index = np.clip(np.searchsorted(edges, values, side="right") - 1, 0, len(edges) - 2)
+    return np.bincount(index, minlength=len(edges) - 1)
+
+def _bin_counts(index, n_bins, weights=None):
+    valid = index >= 0
+    return np.bincount(index[valid], weights=None if weights is None else weights[valid],
+                       minlength=n_bins)
+
+
+class QuantileSketch:
+    """
+    Mergeable counts of non-negative values rounded to ``resolution``.
+
+    With the default resolution of 1, integer values are counted exactly and
+    quantiles match ``np.quantile``. Small values are counted in a dense array
+    and the rare large ones (e.g. chimeric fragment lengths) in a dict.
+    """
+
+    def __init__(self, resolution=1, dense_limit=1 << 16):
+        self.resolution = resolution
+        self.dense_limit = dense_limit
+        self.dense = np.zeros(0, dtype=np.int64)
+        self.sparse = {}
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        keys = np.rint(values / self.resolution).astype(np.int64)
+        small = keys < self.dense_limit
+        self._add_dense(np.bincount(keys[small]))
+        for key, count in zip(*np.unique(keys[~small], return_counts=True)):
+            self.sparse[int(key)] = self.sparse.get(int(key), 0) + int(count)
+
+    def merge(self, other):
+        if other.resolution != self.resolution:
+            raise ValueError("Cannot merge sketches with different resolutions.")
+        self._add_dense(other.dense)
+        for key, count in other.sparse.items():
+            self.sparse[key] = self.sparse.get(key, 0) + count
+
+    def _add_dense(self, counts):
+        if len(counts) > len(self.dense):
+            counts = counts.copy()
+            counts[:len(self.dense)] += self.dense
+            self.dense = counts
+        else:
+            self.dense[:len(counts)] += counts
+
+    def value_counts(self):
+        """Distinct values in increasing order and how often each was seen."""
+        keys = np.flatnonzero(self.dense)
+        counts = self.dense[keys]
+        if self.sparse:
+            sparse_keys = np.array(sorted(self.sparse), dtype=np.int64)
+            keys = np.concatenate([keys, sparse_keys])
+            counts = np.concatenate([counts, [self.sparse[k] for k in sparse_keys]])
+        return keys * self.resolution, counts.astype(np.int64)
+
+    @property
+    def count(self):
+        return int(self.dense.sum()) + sum(self.sparse.values())
+
+    def mean(self):
+        values, counts = self.value_counts()
+        return float(np.dot(values, counts) / counts.sum()) if counts.size else float("nan")
+
+    def quantile(self, q):
+        """Quantile with linear interpolation, like ``np.quantile``."""
+        values, counts = self.value_counts()
+        if counts.size == 0:
+            return float("nan")
+        ends = np.cumsum(counts)
+        rank = q * (ends[-1] - 1)
+        lower = values[np.searchsorted(ends, np.floor(rank), side="right")]
+        upper = values[np.searchsorted(ends, np.ceil(rank), side="right")]
+        return float(lower + (upper - lower) * (rank - np.floor(rank)))
+
+    def median(self):
+        return self.quantile(0.5)
+
+
+class StatsSummary:
+    """
+    Aggregates behind the summary report, updated one chunk of reads at a time.
+
+    Only fixed-size bin counts, sums and quantile sketches are kept, so memory
+    does not depend on the number of reads. Summaries of separate chunks or
+    shards can be combined with ``merge``. Only the columns of ``metrics``
+    are summarized; the aggregates of the other metrics stay empty.
+    """
+
+    def __init__(self, metrics=DEFAULT_METRICS):
+        self.metrics = tuple(metrics)
+        self.total_reads = 0
+        self.overlap_count = 0
+        self.quality_sum = 0.0
+        self.quality_count = 0
+        self.fragment_counts = np.zeros(len(FRAGMENT_LABELS), dtype=np.int64)
+        self.gc_counts = np.zeros(len(GC_LABELS), dtype=np.int64)
+        self.gc_quality_sum = np.zeros(len(GC_LABELS), dtype=np.float64)
+        self.gc_quality_count = np.zeros(len(GC_LABELS), dtype=np.int64)
+        self.mismatch_counts = np.zeros(len(MISMATCH_LABELS), dtype=np.int64)
+        self.quality_histogram = np.zeros(len(QUALITY_BIN_EDGES) - 1, dtype=np.int64)
+        self.gc_histogram = np.zeros(len(GC_BIN_EDGES) - 1, dtype=np.int64)
+        self.fragment_lengths = QuantileSketch()
+        self.mismatches = QuantileSketch()
+        self.qualities = QuantileSketch(QUALITY_RESOLUTION)
+        self.gc_fractions = QuantileSketch(GC_RESOLUTION)
+        self.unmapped = UnmappedReads()
+        self.filtered = Counter()
+
+    def update(self, stats):
+        """
+        Add a chunk of per-read stats.
+
+        Args:
+            stats (pd.DataFrame): Rows with an Overlap column and the stats
+                columns of ``metrics`` (FragmentLength, AvgBaseQuality,
+                GCContent, NumMismatches).
+        """
+        if stats.empty:
+            return
+        self.total_reads += len(stats)
+        self.overlap_count += int(stats["Overlap"].sum())
+
+        if "fragment_length" in self.metrics:
+            fragment_length = _column(stats, METRICS["fragment_length"])
+            fragment_bin = _bin_index(fragment_length, FRAGMENT_BINS)
+            self.fragment_counts += _bin_counts(fragment_bin, len(FRAGMENT_LABELS))
+            self.fragment_lengths.update(fragment_length)
+
+        if "base_quality" in self.metrics:
+            quality = _column(stats, METRICS["base_quality"])
+            has_quality = ~np.isnan(quality)
+            self.quality_sum += float(quality[has_quality].sum())
+            self.quality_count += int(has_quality.sum())
+            self.quality_histogram += _histogram(quality, QUALITY_BIN_EDGES)
+            self.qualities.update(quality)
+
+        if "gc_content" in self.metrics:
+            gc_content = _column(stats, METRICS["gc_content"])
+            gc_bin = _bin_index(gc_content, GC_BINS)
+            self.gc_counts += _bin_counts(gc_bin, len(GC_LABELS))
+            if "base_quality" in self.metrics:
+                quality_bin = np.where(has_quality, gc_bin, -1)
+                self.gc_quality_sum += _bin_counts(quality_bin, len(GC_LABELS),
+                                                   np.where(has_quality, quality, 0.0))
+                self.gc_quality_count += _bin_counts(quality_bin, len(GC_LABELS))
+            self.gc_histogram += _histogram(gc_content, GC_BIN_EDGES)
+            self.gc_fractions.update(gc_content)
+
+        if "mismatches" in self.metrics:
+            mismatches = _column(stats, METRICS["mismatches"])
+            mismatch_bin = _bin_index(mismatches, MISMATCH_BINS)
+            self.mismatch_counts += _bin_counts(mismatch_bin, len(MISMATCH_LABELS))
+            self.mismatches.update(mismatches)
+
+    def merge(self, other):
+        """Add the reads summarized by another StatsSummary, e.g. of a worker shard."""
+        self.total_reads += other.total_reads
+        self.overlap_count += other.overlap_count
+        self.quality_sum += other.quality_sum
+        self.quality_count += other.quality_count
+        for name in ("fragment_counts", "gc_counts", "gc_quality_sum", "gc_quality_count",
+                     "mismatch_counts", "quality_histogram", "gc_histogram"):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        self.fragment_lengths.merge(other.fragment_lengths)
+        self.mismatches.merge(other.mismatches)
+        self.qualities.merge(other.qualities)
+        self.gc_fractions.merge(other.gc_fractions)
+        self.unmapped.merge(other.unmapped)
+        self.filtered.update(other.filtered)
+        return self
+
+    @property
+    def avg_base_quality(self):
+        return self.quality_sum / self.quality_count if self.quality_count else float("nan")
+
+    def gc_avg_base_quality(self):
+        """Mean base quality of the reads in each GC bin (NaN for empty bins)."""
+        counts = self.gc_quality_count
+        return np.divide(self.gc_quality_sum, counts, out=np.full(len(counts), np.nan),
+                         where=counts > 0)
+
+
+def frame_metrics(stats):
+    """Metrics whose stats columns are present in the DataFrame ``stats``."""
+    return tuple(name for name, column in METRICS.items() if column in stats.columns)
+
+
+def summarize_batch(batch, overlaps=None):
+    """
+    Tag a StatsBatch with BED overlaps and summarize it.
+
+    Args:
+        batch (StatsBatch): Per-read stats of a chunk or shard.
+        overlaps (IntervalIndex | OverlapSweep): Indexed BED intervals, or a
+            sweep over them for coordinate-sorted batches; None without a BED
+            file.
+
+    Returns:
+        tuple[pd.DataFrame, StatsSummary]: The rows with the overlap columns
+        and their summary.
+    """
+    df = batch.to_frame()
+    if overlaps is None:
+        df["Overlap"] = 0
+    else:
+        overlaps.annotate(df)
+    summary = StatsSummary(batch.metrics)
+    summary.update(df)
+    summary.unmapped.merge(batch.unmapped)
+    summary.filtered.update(batch.filtered)
+    return df, summary
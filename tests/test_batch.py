@@ -0,0 +1,127 @@
+import os
+import shutil
+import tempfile
+import unittest
+import pandas as pd
+import pysam
+from read_stats.batch import make_samples, process_samples, read_sample_sheet, sample_name
+from read_stats.check_overlap import IntervalIndex
+from read_stats.report import write_cohort_report
+from read_stats.stats import ReadFilter
+
+BAM_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "input.bam")
+
+
+class TestSampleSheet(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write_sheet(self, text):
+        path = os.path.join(self.tmpdir.name, "samples.tsv")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        return path
+
+    def test_read_sample_sheet(self):
+        path = self.write_sheet("sample\tbam\n# tumour first\nT1\tbams/t1.bam\n\n"
+                                "/data/n1.bam\n")
+        self.assertEqual(read_sample_sheet(path), [
+            ("T1", os.path.join(self.tmpdir.name, "bams", "t1.bam")),
+            ("n1", "/data/n1.bam"),
+        ])
+
+    def test_too_many_fields(self):
+        path = self.write_sheet("T1\tt1.bam\textra\n")
+        with self.assertRaisesRegex(ValueError, "samples.tsv:1"):
+            read_sample_sheet(path)
+
+    def test_make_samples(self):
+        path = self.write_sheet("T1\tt1.bam\n")
+        samples = make_samples(["a/N1.bam"], path)
+        self.assertEqual([name for name, _ in samples], ["N1", "T1"])
+        self.assertEqual(sample_name("x/y.sorted.cram"), "y.sorted")
+
+    def test_make_samples_errors(self):
+        with self.assertRaisesRegex(ValueError, "No BAM file"):
+            make_samples([], None)
+        with self.assertRaisesRegex(ValueError, "Duplicate sample name: s"):
+            make_samples(["a/s.bam", "b/s.bam"])
+        with self.assertRaisesRegex(ValueError, "Invalid sample name"):
+            make_samples(None, self.write_sheet("..\tt1.bam\n"))
+
+
+class TestProcessSamples(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.samples = []
+        for name in ("s1", "s2"):
+            path = os.path.join(self.tmpdir.name, f"{name}.bam")
+            shutil.copy(BAM_PATH, path)
+            pysam.index(path)
+            self.samples.append((name, path))
+        # The reads of input.bam lie on contig 1, between 10 and 17 kb
+        self.intervals = IntervalIndex(pd.DataFrame(
+            {"Chromosome": ["1", "1"], "Start": [10000, 15000], "End": [12000, 15500]}))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def run_samples(self, output, workers, **options):
+        output_dir = os.path.join(self.tmpdir.name, output)
+        return output_dir, list(process_samples(self.samples, output_dir, workers,
+                                                self.intervals, **options))
+
+    def read_tsv(self, output_dir, name):
+        with open(os.path.join(output_dir, name, "output.tsv"), encoding="utf-8") as f:
+            return f.read()
+
+    def test_workers_match_serial(self):
+        serial_dir, serial = self.run_samples("serial", 1)
+        parallel_dir, parallel = self.run_samples("parallel", 2)
+        self.assertEqual([name for name, _ in parallel], ["s1", "s2"])
+        for (_, expected), (name, summary) in zip(serial, parallel):
+            self.assertEqual(summary.total_reads, expected.total_reads)
+            self.assertEqual(summary.overlap_count, expected.overlap_count)
+            self.assertEqual(self.read_tsv(parallel_dir, name), self.read_tsv(serial_dir, name))
+            self.assertTrue(os.path.exists(os.path.join(parallel_dir, name, "output.html")))
+        self.assertEqual(serial[0][1].total_reads, 736)
+        self.assertGreater(serial[0][1].overlap_count, 0)
+        self.assertLess(serial[0][1].overlap_count, 736)
+
+    def test_regions_only(self):
+        _, everything = self.run_samples("all", 1)
+        _, regions = self.run_samples("regions", 1, regions_only=True)
+        self.assertEqual(regions[0][1].total_reads, regions[0][1].overlap_count)
+        self.assertEqual(regions[0][1].overlap_count, everything[0][1].overlap_count)
+
+    def test_read_counts_are_logged(self):
+        with self.assertLogs("read_stats.stats", level="INFO") as logs:
+            _, results = self.run_samples("filtered", 1, read_filter=ReadFilter(min_mapq=30))
+        filtered = sum(results[0][1].filtered.values())
+        self.assertGreater(filtered, 0)
+        self.assertEqual(logs.output.count(f"INFO:read_stats.stats:Filtered reads: {filtered}"),
+                         len(self.samples))
+        self.assertEqual(logs.output.count("INFO:read_stats.stats:Unmapped reads: 63"),
+                         len(self.samples))
+
+    def test_cohort_report(self):
+        output_dir, results = self.run_samples("cohort", 1, metrics=("fragment_length",))
+        write_cohort_report(results, output_dir, ("fragment_length",))
+        cohort = pd.read_csv(os.path.join(output_dir, "cohort.tsv"), sep="\t")
+        self.assertEqual(list(cohort["Sample"]), ["s1", "s2"])
+        self.assertEqual(list(cohort.columns), ["Sample", "TotalReads", "OverlapReads",
+                                                "OverlapFraction", "MedianFragmentLength",
+                                                "UnmappedReads", "FilteredReads"])
+        self.assertEqual(list(cohort["UnmappedReads"]), [63, 63])
+        with open(os.path.join(output_dir, "cohort.html"), encoding="utf-8") as f:
+            html = f.read()
+        self.assertIn("<h2>Samples</h2>", html)
+        self.assertIn('"Overlap": [%d, %d]' % (2 * (736 - results[0][1].overlap_count),
+                                               2 * results[0][1].overlap_count), html)
+
+
+if __name__ == "__main__":
+    unittest.main()
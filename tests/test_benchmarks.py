@@ -0,0 +1,53 @@
+import os
+import tempfile
+import unittest
+import pysam
+from benchmarks.bench import STAGES, compare, run_benchmark
+from benchmarks.synthetic import SyntheticConfig, make_dataset
+
+
+class TestSynthetic(unittest.TestCase):
+    def test_sorted_indexed_bam(self):
+        config = SyntheticConfig(reads=400, contigs=2, contig_length=5000, read_length=50,
+                                 unmapped_fraction=0.25, nm_fraction=0.5, intervals=20)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            bam_path, bed_path = make_dataset(tmpdir, config)
+            self.assertTrue(os.path.exists(bam_path + ".bai"))
+            with pysam.AlignmentFile(bam_path) as bam:
+                reads = list(bam.fetch())
+                self.assertEqual(bam.references, ("chr1", "chr2"))
+            self.assertEqual(len(reads), 400)
+            keys = [(r.reference_id, r.reference_start) for r in reads]
+            self.assertEqual(keys, sorted(keys))
+            unmapped = sum(r.is_unmapped for r in reads)
+            self.assertTrue(50 < unmapped < 150)
+            self.assertTrue(all(r.query_length == 50 for r in reads))
+            self.assertTrue(any(r.has_tag("NM") for r in reads))
+            self.assertTrue(any(not r.is_unmapped and not r.has_tag("NM") for r in reads))
+            with open(bed_path, encoding="utf-8") as f:
+                self.assertEqual(len(f.readlines()), 20)
+
+
+class TestBench(unittest.TestCase):
+    def test_run_benchmark(self):
+        config = SyntheticConfig(reads=300, contig_length=5000, intervals=10)
+        results = run_benchmark(config)
+        self.assertEqual(list(results["stages"]), STAGES)
+        self.assertEqual(results["stages"]["scan"]["reads"], 300)
+        self.assertGreater(results["stages"]["stats"]["peak_rss_mb"], 0)
+        self.assertEqual(results["config"]["reads"], 300)
+
+    def test_compare(self):
+        def results(seconds):
+            return {"version": 1, "config": {"reads": 10},
+                    "stages": {stage: {"seconds": seconds.get(stage, 1.0)} for stage in STAGES}}
+
+        lines, regressions = compare(results({}), results({"stats": 1.5, "tsv": 1.05}))
+        self.assertEqual(len(lines), len(STAGES))
+        self.assertEqual(regressions, ["stats"])
+        with self.assertRaises(ValueError):
+            compare(results({}), {**results({}), "config": {"reads": 20}})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import MagicMock
+import pysam
+from pandas.testing import assert_frame_equal
+from read_stats.cache import StatsCache
+from read_stats.stats import StatsBatch, ReadFilter, compute_stats_batches
+
+BAM_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "input.bam")
+
+
+class TestStatsCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache = StatsCache(os.path.join(self.tmpdir.name, "cache"))
+        self.bam = pysam.AlignmentFile(BAM_PATH)
+        self.contigs = self.bam.references
+
+    def tearDown(self):
+        self.bam.close()
+        self.tmpdir.cleanup()
+
+    def scan(self, **kwargs):
+        return compute_stats_batches(self.bam.fetch(), self.contigs, batch_size=100,
+                                     unmapped_names=3, **kwargs)
+
+    def test_round_trip(self):
+        key = self.cache.key(BAM_PATH, self.bam, metrics=["gc_content"])
+        self.assertIsNone(self.cache.load(key))
+        read_filter = ReadFilter(min_mapq=30)
+        expected = StatsBatch.concat(
+            self.cache.store(key, self.scan(metrics=("gc_content",), read_filter=read_filter),
+                             self.contigs, ("gc_content",)))
+        cached = StatsBatch.concat(self.cache.load(key))
+        assert_frame_equal(cached.to_frame(), expected.to_frame())
+        self.assertEqual(cached.metrics, ("gc_content",))
+        self.assertEqual(cached.unmapped.counts, expected.unmapped.counts)
+        self.assertEqual(cached.unmapped.names, expected.unmapped.names)
+        self.assertEqual(cached.filtered, expected.filtered)
+
+    def test_key_depends_on_bam_and_settings(self):
+        key = self.cache.key(BAM_PATH, self.bam, metrics=["gc_content"])
+        self.assertEqual(key, self.cache.key(BAM_PATH, self.bam, metrics=["gc_content"]))
+        self.assertNotEqual(key, self.cache.key(BAM_PATH, self.bam, metrics=["mismatches"]))
+        other_header = MagicMock()
+        other_header.header = "@SQ\tSN:chr1\tLN:100"
+        self.assertNotEqual(key, self.cache.key(BAM_PATH, other_header, metrics=["gc_content"]))
+
+    def test_failed_scan_leaves_no_entry(self):
+        def failing():
+            yield from self.scan()
+            raise RuntimeError("scan failed")
+
+        key = self.cache.key(BAM_PATH, self.bam)
+        with self.assertRaises(RuntimeError):
+            list(self.cache.store(key, failing(), self.contigs, ("gc_content",)))
+        self.assertIsNone(self.cache.load(key))
+        self.assertEqual(os.listdir(self.cache.cache_dir), [])
+
+    def test_least_recently_used_entries_are_evicted(self):
+        keys = [self.cache.key(BAM_PATH, self.bam, run=i) for i in range(3)]
+        for key in keys[:2]:
+            list(self.cache.store(key, self.scan(), self.contigs, ("gc_content",)))
+        entry_size = self.cache.entries()[0][1]
+        # Use the first entry again, so the second one is the oldest
+        time.sleep(0.01)
+        self.cache.load(keys[0])
+        self.cache.max_bytes = 2 * entry_size
+        list(self.cache.store(keys[2], self.scan(), self.contigs, ("gc_content",)))
+        self.assertEqual({key for _, _, key in self.cache.entries()}, {keys[0], keys[2]})
+
+    def test_unreadable_entry_is_a_miss(self):
+        key = self.cache.key(BAM_PATH, self.bam)
+        list(self.cache.store(key, self.scan(), self.contigs, ("gc_content",)))
+        with open(os.path.join(self.cache.cache_dir, key + ".arrow"), "wb") as f:
+            f.write(b"not arrow")
+        with self.assertLogs("read_stats.cache", level="WARNING"):
+            self.assertIsNone(self.cache.load(key))
+
+
+if __name__ == "__main__":
+    unittest.main()
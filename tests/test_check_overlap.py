@@ -1,9 +1,11 @@
 import unittest
-from unittest.mock import patch, MagicMock
 import pandas as pd
 import pyranges as pr
 from pandas.testing import assert_frame_equal
-from read_stats.check_overlap import check_overlap
+import numpy as np
+from read_stats.check_overlap import (
+    check_overlap, IntervalIndex, OverlapSweep
+)
 
 class TestCheckOverlap(unittest.TestCase):
     def setUp(self):
@@ -38,6 +40,8 @@ class TestCheckOverlap(unittest.TestCase):
         result = check_overlap(self.stats, bed_regions)
         expected = self.df_stats.copy()
         expected["Overlap"] = [0, 1, 0]
+        expected["OverlapBases"] = [0, 10, 0]
+        expected["RegionID"] = [None, "chr1:350-360", None]
         assert_frame_equal(result, expected)
 
     def test_with_no_overlap(self):
@@ -51,7 +55,97 @@ class TestCheckOverlap(unittest.TestCase):
         result = check_overlap(self.stats, bed_regions)
         expected = self.df_stats.copy()
         expected["Overlap"] = 0
+        expected["OverlapBases"] = 0
+        expected["RegionID"] = None
         assert_frame_equal(result, expected)
+    def test_unsorted_reads(self):
+        bed = pd.DataFrame({
+            "Chromosome": ["chr1", "chr2"],
+            "Start": [150, 590],
+            "End": [160, 700]
+        })
+        bed_regions = pr.PyRanges(bed)
+        stats = list(reversed(self.stats))
+        result = check_overlap(stats, bed_regions)
+        self.assertEqual(result["Overlap"].tolist(), [1, 0, 1])
+        self.assertEqual(result["OverlapBases"].tolist(), [10, 0, 10])
+        self.assertEqual([None if pd.isna(x) else x for x in result["RegionID"]],
+                         ["chr2:590-700", None, "chr1:150-160"])
+
+
+class TestIntervalIndex(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        starts = rng.integers(0, 5000, 200)
+        self.bed = pd.DataFrame({
+            "Chromosome": rng.choice(["chr1", "chr2"], 200),
+            "Start": starts,
+            "End": starts + rng.integers(0, 600, 200),
+            "Name": [None if i % 4 == 0 else f"region{i}" for i in range(200)],
+        })
+        reads = rng.integers(0, 6000, 1000)
+        self.reads = pd.DataFrame({
+            "Chromosome": rng.choice(["chr1", "chr2", "chr3"], 1000),
+            "Start": reads,
+            "End": reads + rng.integers(1, 200, 1000),
+        })
+
+    def expected(self, bed):
+        # First overlapping interval by start and bases covered, read by read
+        bed = bed.sort_values("Start", kind="stable")
+        rows = []
+        for chromosome, start, end in self.reads.itertuples(index=False):
+            hits = bed[(bed["Chromosome"] == chromosome) & (bed["Start"] < end)
+                       & (bed["End"] > start)]
+            covered = np.zeros(end - start, dtype=bool)
+            for hit_start, hit_end in zip(hits["Start"], hits["End"]):
+                covered[max(hit_start, start) - start:min(hit_end, end) - start] = True
+            region_id = None
+            if len(hits):
+                hit = hits.iloc[0]
+                region_id = hit.get("Name")
+                if pd.isna(region_id):
+                    region_id = f"{hit['Chromosome']}:{hit['Start']}-{hit['End']}"
+            rows.append((int(len(hits) > 0), int(covered.sum()), region_id))
+        return [list(column) for column in zip(*rows)]
+
+    def test_matches_brute_force(self):
+        for bed in (self.bed, self.bed.drop(columns="Name")):
+            index = IntervalIndex(pr.PyRanges(bed))
+            for reads in (self.reads, self.reads.sort_values(["Chromosome", "Start"])):
+                result = index.annotate(reads.copy()).sort_index()
+                region_ids = [None if pd.isna(x) else x for x in result["RegionID"]]
+                self.assertEqual([result["Overlap"].tolist(), result["OverlapBases"].tolist(),
+                                  region_ids], self.expected(bed))
+
+    def test_sweep_matches_brute_force(self):
+        reads = self.reads.sort_values(["Chromosome", "Start"])
+        # The last batch goes back, so it is looked up without the cursors
+        batches = [reads[:300], reads[300:350], reads[350:900], reads[100:200]]
+        for bed in (self.bed, self.bed.drop(columns="Name")):
+            sweep = OverlapSweep(IntervalIndex(pr.PyRanges(bed)))
+            result = pd.concat([sweep.annotate(batch.copy()) for batch in batches])
+            result = result[~result.index.duplicated(keep="last")].sort_index()
+            region_ids = [None if pd.isna(x) else x for x in result["RegionID"]]
+            expected = [[column[i] for i in result.index] for column in self.expected(bed)]
+            self.assertEqual([result["Overlap"].tolist(), result["OverlapBases"].tolist(),
+                              region_ids], expected)
+
+    def test_merged_intervals(self):
+        bed = pr.PyRanges(pd.DataFrame({
+            "Chromosome": ["chr1", "chr1", "chr1", "chr2", "chr1"],
+            "Start": [500, 100, 150, 10, 200],
+            "End": [600, 200, 180, 20, 210]
+        }))
+        merged = IntervalIndex(bed).merged
+        self.assertEqual(merged["chr1"][0].tolist(), [100, 500])
+        self.assertEqual(merged["chr1"][1].tolist(), [210, 600])
+        self.assertEqual(merged["chr2"][0].tolist(), [10])
+        self.assertEqual(merged["chr2"][1].tolist(), [20])
+
+    def test_empty_batch(self):
+        bases, region_ids, hits = IntervalIndex(self.bed).query([], [], [])
+        self.assertEqual((len(bases), len(region_ids), len(hits)), (0, 0, 0))
 
 if __name__ == "__main__":
     unittest.main()
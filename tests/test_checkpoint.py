@@ -0,0 +1,102 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+import pysam
+from pandas.testing import assert_frame_equal
+from read_stats.checkpoint import Checkpoint
+from read_stats.parallel import plan_shards, scan_checkpointed, scan_shard
+from read_stats.stats import StatsBatch, compute_stats_batches
+
+BAM_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "input.bam")
+
+
+class TestCheckpoint(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.directory = os.path.join(self.tmpdir.name, "checkpoint")
+        with pysam.AlignmentFile(BAM_PATH, "rb") as bam:
+            self.contigs = bam.references
+            self.expected = StatsBatch.concat(compute_stats_batches(bam.fetch(), bam.references,
+                                                                    unmapped_names=2))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def plan(self):
+        return plan_shards(BAM_PATH, 1, n_shards=8)
+
+    def scan(self, checkpoint, workers=1):
+        return StatsBatch.concat(scan_checkpointed(BAM_PATH, workers, checkpoint, self.contigs,
+                                                   unmapped_names=2))
+
+    def test_scan_matches_serial_scan(self):
+        checkpoint = Checkpoint(self.directory, "run")
+        self.assertGreater(len(checkpoint.start(self.plan)), 5)
+        result = self.scan(checkpoint)
+        assert_frame_equal(result.to_frame(), self.expected.to_frame())
+        self.assertEqual(result.unmapped.counts, self.expected.unmapped.counts)
+        self.assertTrue(all(checkpoint.done(i) for i in range(len(checkpoint.shards))))
+
+    def resume(self, run_key):
+        checkpoint = Checkpoint(self.directory, run_key)
+        checkpoint.start(self.plan, resume=True)
+        return checkpoint
+
+    def test_resume_skips_finished_shards(self):
+        checkpoint = Checkpoint(self.directory, "run")
+        shards = checkpoint.start(self.plan)
+        # Interrupt the scan during the first shard's batches
+        scan = scan_checkpointed(BAM_PATH, 1, checkpoint, self.contigs, unmapped_names=2)
+        next(scan)
+        scan.close()
+        self.assertEqual([checkpoint.done(i) for i in range(3)], [True, False, False])
+
+        resumed = Checkpoint(self.directory, "run")
+        with patch("read_stats.parallel.plan_shards") as mock_plan:
+            self.assertEqual(resumed.start(mock_plan, resume=True), shards)
+            mock_plan.assert_not_called()
+        with patch("read_stats.parallel.scan_shard", wraps=scan_shard) as mock_scan:
+            result = self.scan(resumed)
+        self.assertEqual(mock_scan.call_count, len(shards) - 1)
+        assert_frame_equal(result.to_frame(), self.expected.to_frame())
+        self.assertEqual(result.unmapped.counts, self.expected.unmapped.counts)
+
+    def test_resume_with_workers(self):
+        checkpoint = Checkpoint(self.directory, "run")
+        checkpoint.start(self.plan)
+        scan = scan_checkpointed(BAM_PATH, 1, checkpoint, self.contigs, unmapped_names=2)
+        next(scan)
+        scan.close()
+        result = self.scan(self.resume("run"), workers=2)
+        assert_frame_equal(result.to_frame(), self.expected.to_frame())
+
+    def test_resume_rescans_corrupt_shard(self):
+        checkpoint = Checkpoint(self.directory, "run")
+        checkpoint.start(self.plan)
+        self.scan(checkpoint)
+        data_path, _ = checkpoint.chunks.paths(checkpoint._chunk_key(1))
+        with open(data_path, "wb") as f:
+            f.write(b"not an arrow file")
+
+        resumed = self.resume("run")
+        with patch("read_stats.parallel.scan_shard", wraps=scan_shard) as mock_scan, \
+                self.assertLogs("read_stats.parallel", level="WARNING"):
+            result = self.scan(resumed)
+        self.assertEqual(mock_scan.call_count, 1)
+        assert_frame_equal(result.to_frame(), self.expected.to_frame())
+        self.assertEqual(result.unmapped.counts, self.expected.unmapped.counts)
+        # The shard is checkpointed again
+        self.assertIsNotNone(resumed.load(1))
+
+    def test_other_run_starts_over(self):
+        checkpoint = Checkpoint(self.directory, "run")
+        checkpoint.start(self.plan)
+        self.scan(checkpoint)
+        with self.assertLogs("read_stats.checkpoint", level="WARNING"):
+            other = self.resume("other run")
+        self.assertFalse(any(other.done(i) for i in range(len(other.shards))))
+
+
+if __name__ == "__main__":
+    unittest.main()
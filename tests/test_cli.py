@@ -1,8 +1,12 @@
 import unittest
 from unittest.mock import patch
+import os
+import subprocess
 import sys
 import argparse
-from read_stats.cli import parse_args
+import tempfile
+import time
+from read_stats.cli import parse_args, parse_size, parse_threads
 
 class TestCLI(unittest.TestCase):
     @patch('argparse.ArgumentParser.parse_args')
@@ -45,5 +49,60 @@ class TestCLI(unittest.TestCase):
                 parse_args()
         mock_print_usage.assert_called_once()
 
+    @patch('sys.argv', ['read_stats/cli.py', '--output', 'out', '--bam', 'in.bam',
+                        '--pipeline', '--max-memory', '1G'])
+    @patch('argparse.ArgumentParser.print_usage') # Suppress usage message during test
+    def test_pipeline_excludes_max_memory(self, mock_print_usage):
+        with patch('sys.stderr'):
+            with self.assertRaises(SystemExit):
+                parse_args()
+        mock_print_usage.assert_called_once()
+
+    def test_parse_size(self):
+        self.assertEqual(parse_size("1024"), 1024)
+        self.assertEqual(parse_size("500M"), 500 * 1024 ** 2)
+        self.assertEqual(parse_size("1.5g"), 3 * 1024 ** 3 // 2)
+        self.assertEqual(parse_size("2GiB"), 2 * 1024 ** 3)
+        with self.assertRaises(argparse.ArgumentTypeError):
+            parse_size("lots")
+
+    def test_parse_threads(self):
+        self.assertEqual(parse_threads("auto"), "auto")
+        self.assertEqual(parse_threads("4"), 4)
+        for value in ("-1", "many"):
+            with self.assertRaises(argparse.ArgumentTypeError):
+                parse_threads(value)
+
+class TestStartup(unittest.TestCase):
+    """The CLI must start fast: it is run for thousands of small samples and regions."""
+
+    # Seconds for ``python -m read_stats --help``, interpreter startup included
+    STARTUP_BUDGET = 0.5
+
+    HEAVY_MODULES = ["numpy", "pandas", "pyranges", "pysam", "pyarrow", "Bio"]
+
+    def run_python(self, *args, cwd=None):
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env = dict(os.environ, PYTHONPATH=root)
+        return subprocess.run([sys.executable, *args], cwd=cwd, env=env, capture_output=True,
+                              text=True, check=True)
+
+    def test_no_heavy_imports(self):
+        result = self.run_python("-c", "import sys, read_stats.__main__; "
+                                       f"print([m for m in {self.HEAVY_MODULES!r} if m in sys.modules])")
+        self.assertEqual(result.stdout.strip(), "[]")
+
+    def test_help_within_budget(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            times = []
+            for _ in range(3):
+                start = time.perf_counter()
+                result = self.run_python("-m", "read_stats", "--help", cwd=tmpdir)
+                times.append(time.perf_counter() - start)
+            self.assertIn("--bam", result.stdout)
+            # Logging is only set up for an actual run
+            self.assertEqual(os.listdir(tmpdir), [])
+        self.assertLess(min(times), self.STARTUP_BUDGET)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -1,7 +1,9 @@
 # Test cases for io_utils.py
 import unittest
 from unittest.mock import patch, MagicMock
-from read_stats.file_reader import read_bam, read_bed
+from read_stats.file_reader import (
+    read_bam, read_bed, fetch_regions, fetch_bed_regions, resolve_io_threads
+)
 
 # Placeholder for tests
 class TestIOUtils(unittest.TestCase):
@@ -16,6 +18,24 @@ class TestIOUtils(unittest.TestCase):
         mock_alignment_file.assert_called_once_with("dummy.bam", "rb")
         self.assertEqual(bam_file, mock_bam)
 
+    @patch('read_stats.file_reader.pys.AlignmentFile')
+    def test_read_bam_threads(self, mock_alignment_file):
+        read_bam("dummy.bam", threads=4)
+        mock_alignment_file.assert_called_once_with("dummy.bam", "rb", threads=4)
+        # htslib starts no thread pool for a single thread
+        read_bam("dummy.bam", threads=1)
+        mock_alignment_file.assert_called_with("dummy.bam", "rb")
+
+    @patch('read_stats.file_reader.os.sched_getaffinity', return_value=set(range(16)))
+    def test_resolve_io_threads(self, mock_affinity):
+        self.assertEqual(resolve_io_threads(3), 3)
+        mock_affinity.assert_not_called()
+        self.assertEqual(resolve_io_threads("auto"), 4)
+        mock_affinity.assert_called_with(0)
+        self.assertEqual(resolve_io_threads("auto", workers=4), 3)
+        self.assertEqual(resolve_io_threads("auto", workers=8), 0)
+        self.assertEqual(resolve_io_threads("auto", workers=32), 0)
+
     @patch('read_stats.file_reader.pys.AlignmentFile')
     def test_read_bam_file_not_found(self, mock_alignment_file):
         mock_alignment_file.side_effect = FileNotFoundError("File not found")
@@ -32,7 +52,7 @@ class TestIOUtils(unittest.TestCase):
             read_bam("corrupted.bam")
         mock_alignment_file.assert_called_once_with("corrupted.bam", "rb")
 
-    @patch('read_stats.file_reader.pr.read_bed')
+    @patch('pyranges.read_bed')
     def test_read_bed_success(self, mock_read_bed):
         mock_bed = MagicMock()
         mock_read_bed.return_value = mock_bed
@@ -42,7 +62,7 @@ class TestIOUtils(unittest.TestCase):
         mock_read_bed.assert_called_once_with("dummy.bed")
         self.assertEqual(bed_file, mock_bed)
         
-    @patch('read_stats.file_reader.pr.read_bed')
+    @patch('pyranges.read_bed')
     def test_read_bed_file_not_found(self, mock_read_bed):
         mock_read_bed.side_effect = FileNotFoundError("File not found")
         
@@ -50,7 +70,7 @@ class TestIOUtils(unittest.TestCase):
             read_bed("nonexistent.bed")
         mock_read_bed.assert_called_once_with("nonexistent.bed")
         
-    @patch('read_stats.file_reader.pr.read_bed')
+    @patch('pyranges.read_bed')
     def test_read_bed_value_error(self, mock_read_bed):
         mock_read_bed.side_effect = ValueError("Invalid BED format")
         
@@ -58,5 +78,36 @@ class TestIOUtils(unittest.TestCase):
             read_bed("corrupted.bed")
         mock_read_bed.assert_called_once_with("corrupted.bed")
 
+def mock_read(name, start, end):
+    read = MagicMock()
+    read.query_name = name
+    read.reference_start = start
+    read.reference_end = end
+    return read
+
+class TestFetchRegions(unittest.TestCase):
+    def setUp(self):
+        reads = [mock_read("a", 90, 140), mock_read("b", 150, 260), mock_read("c", 230, 240),
+                 mock_read("d", 255, 420), mock_read("e", 500, 550)]
+        self.bam = MagicMock()
+        self.bam.references = ["chr1", "chr2"]
+        self.bam.fetch.side_effect = lambda contig, start, end: [
+            r for r in reads if contig == "chr1" and r.reference_start < end and r.reference_end > start
+        ]
+
+    def test_reads_spanning_regions_are_yielded_once(self):
+        reads = fetch_regions(self.bam, "chr1", [100, 250, 400], [200, 300, 450])
+        self.assertEqual([r.query_name for r in reads], ["a", "b", "d"])
+
+    def test_reads_before_after_are_skipped(self):
+        reads = fetch_regions(self.bam, "chr1", [250], [300], after=255)
+        self.assertEqual([r.query_name for r in reads], ["d"])
+
+    def test_fetch_bed_regions_in_header_order(self):
+        merged = {"chr2": ([0], [10]), "chr1": ([480], [600]), "chrZ": ([0], [10])}
+        reads = list(fetch_bed_regions(self.bam, merged))
+        self.assertEqual([r.query_name for r in reads], ["e"])
+        self.assertEqual([c.args[0] for c in self.bam.fetch.call_args_list], ["chr1", "chr2"])
+
 if __name__ == '__main__':
     unittest.main()
@@ -2,7 +2,10 @@ import unittest
 import logging
 import os
 import shutil
-from read_stats.logging_config import setup_logger
+import logging.handlers
+from unittest.mock import patch
+from read_stats import logging_config
+from read_stats.logging_config import setup_logger, get_logger, configure_logging
 
 # Define a directory for test logs
 TEST_LOG_DIR = "test_logs"
@@ -80,7 +83,7 @@ class TestSetupLogger(unittest.TestCase):
         # Ensure the log file was actually written to
         self.assertTrue(os.path.exists(log_file_path) and os.path.getsize(log_file_path) > 0)
 
-        with open(log_file_path, 'r') as f:
+        with open(log_file_path, 'r', encoding="utf-8") as f:
             log_content = f.read()
         
         # Example: 2023-10-26 10:00:00,123 - test_logger - INFO - This is a test log message.
@@ -109,6 +112,50 @@ class TestSetupLogger(unittest.TestCase):
         """Test that log propagation is disabled."""
         logger = setup_logger("test_logger", log_dir=TEST_LOG_DIR)
         self.assertFalse(logger.propagate)
+    def test_asynchronous_logger(self):
+        """Test that an asynchronous logger queues records for a background file writer."""
+        logger = setup_logger("test_logger", log_dir=TEST_LOG_DIR, asynchronous=True)
+        self.assertEqual(len(logger.handlers), 1)
+        self.assertIsInstance(logger.handlers[0], logging.handlers.QueueHandler)
+
+        logger.info("Queued message.")
+        # Stopping the listeners flushes the queue to the log file
+        logging_config._stop_listeners()
+        with open(os.path.join(TEST_LOG_DIR, f"{DEFAULT_LOG_FILE_BASE}.log"), 'r', encoding="utf-8") as f:
+            self.assertIn("Queued message.", f.read())
+
+    def test_asynchronous_logger_reconfigured(self):
+        """Test that setting up an asynchronous logger again replaces its listener."""
+        setup_logger("test_logger", log_dir=TEST_LOG_DIR, asynchronous=True)
+        first = logging_config._listeners["test_logger"]
+        logger = setup_logger("test_logger", log_dir=TEST_LOG_DIR, asynchronous=True)
+        self.assertIsNot(logging_config._listeners["test_logger"], first)
+        self.assertEqual(len(logger.handlers), 1)
+        logging_config._stop_listeners()
+
+    @patch.dict(logging_config._state, {"configured": None})
+    @patch.object(logging_config, "_declared", {})
+    def test_get_logger_deferred_until_configured(self):
+        """Test that declared loggers get handlers only once logging is configured."""
+        log_dir = os.path.join(TEST_LOG_DIR, "deferred")
+        logger = get_logger("test_logger", log_file="custom_log")
+        self.assertFalse(any(isinstance(h, logging.FileHandler) for h in logger.handlers))
+        self.assertFalse(os.path.exists(log_dir))
+
+        configure_logging(log_dir=log_dir)
+        self.assertEqual(len(logger.handlers), 1)
+        self.assertIsInstance(logger.handlers[0], logging.FileHandler)
+        self.assertTrue(os.path.exists(os.path.join(log_dir, "custom_log.log")))
+        self.assertEqual(logging_config.logging_options(), {"log_dir": log_dir, "level": logging.INFO})
+
+    @patch.dict(logging_config._state, {"configured": None})
+    @patch.object(logging_config, "_declared", {})
+    def test_get_logger_after_configure(self):
+        """Test that a logger declared after configure_logging is set up at once."""
+        configure_logging(log_dir=TEST_LOG_DIR)
+        logger = get_logger("test_logger")
+        self.assertEqual(len(logger.handlers), 1)
+        self.assertFalse(logger.propagate)
 
 if __name__ == '__main__':
     unittest.main()
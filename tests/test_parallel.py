@@ -0,0 +1,165 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+import pandas as pd
+import pysam
+from pandas.testing import assert_frame_equal
+import numpy as np
+from read_stats.check_overlap import IntervalIndex
+from read_stats.file_reader import fetch_all, fetch_bed_regions
+from read_stats.parallel import make_shards, make_region_shards, scan_parallel
+from read_stats.stats import StatsBatch, compute_stats_batches
+
+BAM_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "input.bam")
+
+
+def index_stats(contig, mapped, unmapped=0):
+    stats = MagicMock()
+    stats.contig = contig
+    stats.mapped = mapped
+    stats.total = mapped + unmapped
+    return stats
+
+
+class TestMakeShards(unittest.TestCase):
+    def test_shards_follow_read_counts(self):
+        bam = MagicMock()
+        bam.nocoordinate = 0
+        bam.references = ("chr1", "chr2", "chr3")
+        bam.lengths = (1000, 500, 300)
+        bam.get_index_statistics.return_value = [
+            index_stats("chr1", 300), index_stats("chr2", 0), index_stats("chr3", 100)
+        ]
+        shards = make_shards(bam, 4)
+        self.assertEqual(shards, [
+            ("chr1", 0, 334), ("chr1", 334, 668), ("chr1", 668, 1000), ("chr3", 0, 300)
+        ])
+
+    def test_whole_contigs(self):
+        bam = MagicMock()
+        bam.nocoordinate = 0
+        bam.references = ("chr1", "chr2", "chr3")
+        bam.lengths = (1000, 500, 300)
+        bam.get_index_statistics.return_value = [
+            index_stats("chr1", 300), index_stats("chr2", 0), index_stats("chr3", 100)
+        ]
+        self.assertEqual(make_shards(bam, 4, whole_contigs=True),
+                         [("chr1", 0, 1000), ("chr3", 0, 300)])
+
+    def test_unplaced_reads_shard(self):
+        bam = MagicMock()
+        bam.nocoordinate = 5
+        bam.references = ("chr1",)
+        bam.lengths = (1000,)
+        bam.get_index_statistics.return_value = [index_stats("chr1", 10)]
+        self.assertEqual(make_shards(bam, 1), [("chr1", 0, 1000), ("*", 0, 0)])
+        bam.get_index_statistics.return_value = [index_stats("chr1", 0)]
+        self.assertEqual(make_shards(bam, 1), [("*", 0, 0)])
+
+    def test_placed_unmapped_reads_shard(self):
+        bam = MagicMock()
+        bam.nocoordinate = 0
+        bam.references = ("chr1", "chr2")
+        bam.lengths = (1000, 500)
+        bam.get_index_statistics.return_value = [index_stats("chr1", 10),
+                                                 index_stats("chr2", 0, unmapped=3)]
+        self.assertEqual(make_shards(bam, 1), [("chr1", 0, 1000), ("chr2", 0, 500)])
+
+    def test_no_mapped_reads(self):
+        bam = MagicMock()
+        bam.nocoordinate = 0
+        bam.references = ("chr1",)
+        bam.lengths = (1000,)
+        bam.get_index_statistics.return_value = [index_stats("chr1", 0)]
+        self.assertEqual(make_shards(bam, 4), [])
+
+
+class TestMakeRegionShards(unittest.TestCase):
+    def test_intervals_are_grouped_by_covered_bases(self):
+        bam = MagicMock()
+        bam.nocoordinate = 0
+        bam.references = ("chr1", "chr2")
+        regions = IntervalIndex(pd.DataFrame({
+            "Chromosome": ["chr2", "chr1", "chr1", "chr1"],
+            "Start": [0, 0, 200, 400],
+            "End": [100, 100, 300, 500]
+        })).merged
+        shards = [(c, s.tolist(), e.tolist(), a) for c, s, e, a in make_region_shards(bam, regions, 2)]
+        self.assertEqual(shards, [
+            ("chr1", [0, 200], [100, 300], 0), ("chr1", [400], [500], 300), ("chr2", [0], [100], 0)
+        ])
+        shards = [(c, s.tolist(), e.tolist(), a)
+                  for c, s, e, a in make_region_shards(bam, regions, 2, whole_contigs=True)]
+        self.assertEqual(shards, [
+            ("chr1", [0, 200, 400], [100, 300, 500], 0), ("chr2", [0], [100], 0)
+        ])
+
+
+class TestScanParallel(unittest.TestCase):
+    def test_matches_serial_scan(self):
+        with pysam.AlignmentFile(BAM_PATH, "rb") as bam:
+            self.assertGreater(len(make_shards(bam, 12)), 5)
+            expected = StatsBatch.concat(compute_stats_batches(bam.fetch(), bam.references)).to_frame()
+        result = StatsBatch.concat(scan_parallel(BAM_PATH, 3)).to_frame()
+        assert_frame_equal(result, expected)
+
+    def test_unmapped_reads_are_counted(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            bam_path = os.path.join(tmpdir, "unplaced.bam")
+            with pysam.AlignmentFile(BAM_PATH, "rb") as bam, \
+                    pysam.AlignmentFile(bam_path, "wb", template=bam) as out:
+                # Placed unmapped reads on the first contig, which has no mapped reads
+                self.assertEqual(bam.get_index_statistics()[0].total, 0)
+                for i in range(3):
+                    read = pysam.AlignedSegment(out.header)
+                    read.query_name = f"placed{i}"
+                    read.flag = 4
+                    read.reference_id = 0
+                    read.reference_start = 100 + i
+                    read.query_sequence = "ACGT" * 5
+                    out.write(read)
+                for read in bam.fetch():
+                    out.write(read)
+                for i in range(5):
+                    read = pysam.AlignedSegment(out.header)
+                    read.query_name = f"unplaced{i}"
+                    read.flag = 4
+                    read.query_sequence = "ACGT" * 5
+                    out.write(read)
+            pysam.index(bam_path)
+            with pysam.AlignmentFile(bam_path, "rb") as bam:
+                expected = StatsBatch.concat(compute_stats_batches(fetch_all(bam), bam.references,
+                                                                   unmapped_names=100))
+            result = StatsBatch.concat(scan_parallel(bam_path, 2, unmapped_names=100))
+        self.assertEqual(expected.unmapped.counts[(-1, 4)], 5)
+        self.assertEqual(expected.unmapped.counts[(0, 4)], 3)
+        self.assertEqual(result.unmapped.counts, expected.unmapped.counts)
+        self.assertEqual(result.unmapped.names, expected.unmapped.names)
+        assert_frame_equal(result.to_frame(), expected.to_frame())
+
+    def test_regions_match_serial_scan(self):
+        regions = {"1": (np.array([10600, 10625, 10710, 12000]), np.array([10620, 10700, 10711, 16000]))}
+        with pysam.AlignmentFile(BAM_PATH, "rb") as bam:
+            self.assertEqual(len(make_region_shards(bam, regions, 4096)), 4)
+            expected = StatsBatch.concat(compute_stats_batches(fetch_bed_regions(bam, regions),
+                                                               bam.references)).to_frame()
+        self.assertGreater(len(expected), 0)
+        # One shard per interval, so reads spanning intervals cross shard boundaries
+        with patch("read_stats.parallel.SHARDS_PER_WORKER", 2048):
+            result = StatsBatch.concat(scan_parallel(BAM_PATH, 2, regions=regions)).to_frame()
+        assert_frame_equal(result, expected)
+
+    def test_per_fragment_matches_serial_scan(self):
+        with pysam.AlignmentFile(BAM_PATH, "rb") as bam:
+            expected = StatsBatch.concat(compute_stats_batches(
+                bam.fetch(), bam.references, per_fragment=True)).to_frame()
+        self.assertEqual(len(expected), 583)
+        self.assertTrue(expected.groupby("Chromosome", sort=False)["Start"]
+                        .apply(lambda starts: starts.is_monotonic_increasing).all())
+        result = StatsBatch.concat(scan_parallel(BAM_PATH, 3, per_fragment=True)).to_frame()
+        assert_frame_equal(result, expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
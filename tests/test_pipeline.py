@@ -0,0 +1,90 @@
+import threading
+import time
+import unittest
+from read_stats.pipeline import Pipeline
+
+
+class TestPipeline(unittest.TestCase):
+    def test_items_in_order(self):
+        with Pipeline(queue_size=2) as pipeline:
+            doubled = pipeline.stage("double", (i * 2 for i in range(100)))
+            result = list(pipeline.stage("increment", (i + 1 for i in doubled)))
+        self.assertEqual(result, [i * 2 + 1 for i in range(100)])
+
+    def test_decode(self):
+        with Pipeline() as pipeline:
+            reads = list(pipeline.decode(iter(range(10)), chunk=3))
+        self.assertEqual(reads, list(range(10)))
+        self.assertEqual(pipeline.stages[0].name, "decode")
+        self.assertEqual(pipeline.stages[0].items, 4)
+
+    def test_backpressure(self):
+        produced = []
+
+        def source():
+            for i in range(20):
+                produced.append(i)
+                yield i
+
+        with Pipeline(queue_size=2) as pipeline:
+            items = pipeline.stage("source", source())
+            self.assertEqual(next(items), 0)
+            time.sleep(0.3)
+            # One item consumed, two queued and one waiting for room in the queue
+            self.assertLessEqual(len(produced), 4)
+            self.assertEqual(list(items), list(range(1, 20)))
+
+    def test_error_is_raised_downstream(self):
+        def failing():
+            yield 1
+            raise ValueError("bad record")
+
+        with Pipeline() as pipeline:
+            items = pipeline.stage("failing", failing())
+            self.assertEqual(next(items), 1)
+            with self.assertRaisesRegex(ValueError, "bad record"):
+                next(items)
+
+    def test_error_is_raised_unchanged(self):
+        error = SystemExit(1)
+
+        def exiting():
+            yield 1
+            raise error
+
+        with Pipeline() as pipeline:
+            items = pipeline.stage("exiting", exiting())
+            self.assertEqual(next(items), 1)
+            with self.assertRaises(SystemExit) as raised:
+                next(items)
+        self.assertIs(raised.exception, error)
+        self.assertIs(pipeline.stages[0].error, error)
+
+    def test_close_stops_blocked_stages(self):
+        pipeline = Pipeline(queue_size=1)
+        items = pipeline.stage("endless", iter(int, 1))
+        next(items)
+        pipeline.close()
+        self.assertFalse(any(thread.is_alive() for thread in pipeline._threads))
+        self.assertNotIn("read_stats-endless", [thread.name for thread in threading.enumerate()])
+
+    def test_report(self):
+        def slow(items):
+            for item in items:
+                time.sleep(0.01)
+                yield item
+
+        with Pipeline(sink="writer") as pipeline:
+            items = pipeline.stage("fast", iter(range(20)))
+            list(pipeline.stage("slow", slow(items)))
+        report = pipeline.report()
+        self.assertEqual(list(report["stages"]), ["fast", "slow", "writer"])
+        self.assertEqual(report["bottleneck"], "slow")
+        self.assertEqual(report["stages"]["writer"]["items"], 20)
+        for stage in report["stages"].values():
+            self.assertGreaterEqual(stage["occupancy"], 0)
+            self.assertLessEqual(stage["occupancy"], 1.01)
+
+
+if __name__ == "__main__":
+    unittest.main()
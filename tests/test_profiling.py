@@ -0,0 +1,63 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+from read_stats.profiling import StageProfiler
+
+
+class TestStageProfiler(unittest.TestCase):
+    def test_nested_stage_time_is_exclusive(self):
+        profiler = StageProfiler()
+        with profiler.stage("outer"):
+            time.sleep(0.02)
+            with profiler.stage("inner"):
+                time.sleep(0.05)
+        report = profiler.report()
+        outer = report["stages"]["outer"]["wall_seconds"]
+        inner = report["stages"]["inner"]["wall_seconds"]
+        self.assertGreaterEqual(inner, 0.05)
+        self.assertLess(outer, 0.05)
+        self.assertAlmostEqual(report["total"]["wall_seconds"], outer + inner)
+
+    def test_iterate_counts_reads(self):
+        profiler = StageProfiler()
+        batches = [[1, 2, 3], [4, 5]]
+        self.assertEqual(list(profiler.iterate("stats", batches)), batches)
+        self.assertEqual(list(profiler.iterate("scan", range(4), reads=None)), [0, 1, 2, 3])
+        profiler.add_reads("stats", 10)
+        stages = profiler.report()["stages"]
+        self.assertEqual(stages["stats"]["reads"], 15)
+        self.assertEqual(stages["scan"]["reads"], 4)
+
+    def test_iterate_charges_consumer_to_enclosing_stage(self):
+        profiler = StageProfiler()
+        with profiler.stage("output"):
+            for _ in profiler.iterate("stats", range(3), reads=None):
+                time.sleep(0.02)
+        stages = profiler.report()["stages"]
+        self.assertGreaterEqual(stages["output"]["wall_seconds"], 0.06)
+        self.assertLess(stages["stats"]["wall_seconds"], 0.02)
+
+    def test_disabled_profiler_passes_through(self):
+        profiler = StageProfiler(enabled=False)
+        with profiler.stage("stats"):
+            items = list(profiler.iterate("scan", [[1], [2]]))
+        profiler.add_reads("scan", 3)
+        self.assertEqual(items, [[1], [2]])
+        self.assertEqual(profiler.stages, {})
+
+    def test_write_json(self):
+        profiler = StageProfiler()
+        list(profiler.iterate("scan", [[1, 2]]))
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "out", "profile.json")
+            profiler.write_json(path)
+            with open(path, encoding="utf-8") as f:
+                report = json.load(f)
+        self.assertEqual(report["stages"]["scan"]["reads"], 2)
+        self.assertIn("peak_rss_mb", report["total"])
+
+
+if __name__ == "__main__":
+    unittest.main()
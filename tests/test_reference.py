@@ -0,0 +1,145 @@
+import hashlib
+import os
+import random
+import tempfile
+import unittest
+from unittest.mock import patch
+import pysam
+from pandas.testing import assert_frame_equal
+from read_stats.file_reader import read_bam
+from read_stats.parallel import scan_parallel
+from read_stats.reference import Reference, ReferenceWindows, is_cram
+from read_stats.stats import StatsBatch, compute_stats_batches
+
+
+def write_dataset(directory):
+    """Write ref.fa, an indexed BAM with NM tags and the same reads as an indexed CRAM."""
+    rng = random.Random(0)
+    sequences = {"c1": "".join(rng.choice("ACGT") for _ in range(6000)),
+                 "c2": "".join(rng.choice("ACGT") for _ in range(3000))}
+    fasta_path = os.path.join(directory, "ref.fa")
+    with open(fasta_path, "w", encoding="utf-8") as f:
+        for name, sequence in sequences.items():
+            # Lower-case bases must not change the M5 checksum
+            lines = [sequence[i:i + 60].lower() for i in range(0, len(sequence), 60)]
+            f.write(f">{name}\n" + "\n".join(lines) + "\n")
+    header = {"HD": {"VN": "1.6", "SO": "coordinate"},
+              "SQ": [{"SN": name, "LN": len(sequence)} for name, sequence in sequences.items()]}
+    bam_path = os.path.join(directory, "reads.bam")
+    with pysam.AlignmentFile(bam_path, "wb", header=header) as bam:
+        for contig, (name, sequence) in enumerate(sequences.items()):
+            for i, start in enumerate(sorted(rng.randrange(len(sequence) - 50) for _ in range(200))):
+                read = pysam.AlignedSegment(bam.header)
+                read.query_name = f"{name}-{i}"
+                read.reference_id = contig
+                read.reference_start = start
+                bases = list(sequence[start:start + 50])
+                mismatches = i % 3
+                for j in range(mismatches):
+                    bases[5 + 10 * j] = "A" if bases[5 + 10 * j] != "A" else "C"
+                read.query_sequence = "".join(bases)
+                read.query_qualities = pysam.qualitystring_to_array("I5?" * 16 + "II")
+                read.cigartuples = [(0, 50)]
+                read.mapping_quality = 60
+                read.template_length = 200 + i
+                read.set_tag("NM", mismatches)
+                bam.write(read)
+    pysam.index(bam_path)
+    cram_path = os.path.join(directory, "reads.cram")
+    with pysam.AlignmentFile(bam_path, "rb") as bam, \
+            pysam.AlignmentFile(cram_path, "wc", template=bam, reference_filename=fasta_path) as cram:
+        for read in bam:
+            cram.write(read)
+    pysam.index(cram_path)
+    return fasta_path, bam_path, cram_path, sequences
+
+
+def scan(bam):
+    return StatsBatch.concat(compute_stats_batches(bam.fetch(), bam.references),
+                             bam.references).to_frame()
+
+
+class TestReference(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.fasta, self.bam_path, self.cram_path, self.sequences = write_dataset(self.tmpdir.name)
+        self.cache_dir = os.path.join(self.tmpdir.name, "ref_cache")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_is_cram(self):
+        self.assertTrue(is_cram(self.cram_path))
+        self.assertFalse(is_cram(self.bam_path))
+        self.assertFalse(is_cram(os.path.join(self.tmpdir.name, "missing.cram")))
+
+    def test_cache_fasta(self):
+        md5s = Reference(self.fasta, self.cache_dir).cache_fasta()
+        for name, sequence in self.sequences.items():
+            md5 = hashlib.md5(sequence.encode("ascii")).hexdigest()
+            self.assertEqual(md5s[name], md5)
+            with open(os.path.join(self.cache_dir, md5[:2], md5[2:4], md5[4:]), "rb") as f:
+                self.assertEqual(f.read(), sequence.encode("ascii"))
+        # An unchanged FASTA is neither read nor hashed again
+        with patch("pysam.FastaFile", side_effect=AssertionError("FASTA read again")):
+            self.assertEqual(Reference(self.fasta, self.cache_dir).cache_fasta(), md5s)
+
+    def test_cram_matches_bam(self):
+        Reference(self.fasta, self.cache_dir).cache_fasta()
+        # Later runs decode from the cache alone, without the FASTA
+        reference = Reference(None, self.cache_dir).for_file(self.cram_path)
+        self.assertFalse(reference.use_fasta)
+        with read_bam(self.bam_path) as bam, read_bam(self.cram_path, reference=reference) as cram:
+            expected = scan(bam)
+            assert_frame_equal(scan(cram), expected)
+        self.assertEqual(len(expected), 400)
+        self.assertEqual(os.environ["REF_PATH"], os.path.join(self.cache_dir, "%2s/%2s/%s"))
+
+    def test_parallel_cram_scan(self):
+        reference = Reference(self.fasta, self.cache_dir)
+        reference.cache_fasta()
+        reference = reference.for_file(self.cram_path)
+        with read_bam(self.bam_path) as bam:
+            expected = scan(bam)
+            contigs = bam.references
+        batches = scan_parallel(self.cram_path, 2, reference=reference)
+        assert_frame_equal(StatsBatch.concat(batches, contigs).to_frame(), expected)
+
+    def test_windows(self):
+        reference = Reference(self.fasta, self.cache_dir)
+        reference.cache_fasta()
+        windows = ReferenceWindows(reference, window=100)
+        sequence = self.sequences["c1"]
+        for start, end in [(0, 50), (60, 150), (140, 400), (5900, 6000), (10, 20)]:
+            self.assertEqual(windows.fetch("c1", start, end), sequence[start:end].encode("ascii"))
+        self.assertIsNone(windows.fetch("c1", 5990, 6010))
+        self.assertIsNone(windows.fetch("unknown", 0, 10))
+        self.assertEqual(windows.fetch("c2", 0, 10), self.sequences["c2"][:10].encode("ascii"))
+
+    def test_mismatches_without_nm_tag(self):
+        bam_path = os.path.join(self.tmpdir.name, "no_nm.bam")
+        with pysam.AlignmentFile(self.bam_path, "rb") as bam, \
+                pysam.AlignmentFile(bam_path, "wb", template=bam) as out:
+            for read in bam:
+                read.set_tag("NM", None)
+                out.write(read)
+        pysam.index(bam_path)
+        reference = Reference(self.fasta, self.cache_dir)
+        reference.cache_fasta()
+        with read_bam(self.bam_path) as bam, read_bam(bam_path) as no_nm:
+            expected = scan(bam)
+            self.assertTrue(scan(no_nm)["NumMismatches"].isna().all())
+            batches = compute_stats_batches(no_nm.fetch(), no_nm.references, batch_size=64,
+                                            reference=reference)
+            result = StatsBatch.concat(batches, no_nm.references).to_frame()
+        assert_frame_equal(result, expected)
+
+    def test_missing_reference(self):
+        with self.assertRaisesRegex(ValueError, "reference is required"):
+            read_bam(self.cram_path)
+        with self.assertRaisesRegex(ValueError, "--reference"):
+            Reference(None, self.cache_dir).for_file(self.cram_path)
+
+
+if __name__ == "__main__":
+    unittest.main()
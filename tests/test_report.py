@@ -2,7 +2,9 @@ import os
 import tempfile
 import unittest
 import pandas as pd
-from read_stats.report import write_simple_html, write_tsv
+import pyarrow as pa
+import pyarrow.parquet as pq
+from read_stats.report import write_simple_html, write_tsv, write_html, TsvWriter, ColumnarWriter, write_columnar
 
 class TestReport(unittest.TestCase):
     def test_basic_html_output(self):
@@ -167,4 +169,164 @@ class TestReport(unittest.TestCase):
             write_tsv(df, output_path)
             with open(output_path, "r", encoding="utf-8") as f:
                 content = f.read()
-            self.assertEqual(content, expected_tsv)
\ No newline at end of file
+            self.assertEqual(content, expected_tsv)
+
+class TestTsvWriter(unittest.TestCase):
+    def setUp(self):
+        self.df = pd.DataFrame({
+            "ReadID": ["read1", "read2", "read3"],
+            "FragmentLength": [100, 90, 80],
+            "AvgBaseQuality": [35.123, 30.0, None],
+            "GCContent": [48.5, 50.0, None],
+            "NumMismatches": [2, 0, None],
+            "Overlap": [1, 0, 0]
+        })
+
+    def test_chunks_match_write_tsv(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            expected_path = os.path.join(tmpdir, "expected.tsv")
+            stream_path = os.path.join(tmpdir, "stream.tsv")
+            write_tsv(self.df, expected_path)
+            with TsvWriter(stream_path) as writer:
+                writer.write(self.df.iloc[:2])
+                writer.write(self.df.iloc[2:2])
+                writer.write(self.df.iloc[2:])
+            with open(expected_path, encoding="utf-8") as f:
+                expected = f.read()
+            with open(stream_path, encoding="utf-8") as f:
+                self.assertMultiLineEqual(f.read(), expected)
+            self.assertEqual(writer.rows, 3)
+
+    def test_missing_metric_columns_are_left_out(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            output_path = os.path.join(tmpdir, "output.tsv")
+            write_tsv(self.df[["ReadID", "FragmentLength", "Overlap"]], output_path)
+            with open(output_path, encoding="utf-8") as f:
+                self.assertEqual(f.readline(), "ReadID\tFragmentLength\tOverlap\n")
+
+    def test_no_rows_writes_nothing(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            output_path = os.path.join(tmpdir, "output.tsv")
+            with TsvWriter(output_path) as writer:
+                writer.write(self.df.iloc[:0])
+            self.assertFalse(os.path.exists(output_path))
+
+
+class TestColumnarWriter(unittest.TestCase):
+    def setUp(self):
+        self.df = pd.DataFrame({
+            "ReadID": ["read1", "read2", "read3"],
+            "FragmentLength": [100, 90, 80],
+            "AvgBaseQuality": [35.125, 30.0, 20.5],
+            "GCContent": [0.5, 0.25, 0.0],
+            "NumMismatches": [2, None, 0],
+            "Chromosome": ["chr2", "chr1", "chr1"],
+            "Start": [10, 20, 30],
+            "End": [110, 110, 110],
+            "Overlap": [1, 0, 0]
+        })
+
+    def check_table(self, table):
+        self.assertEqual(table.schema.field("FragmentLength").type, pa.int32())
+        self.assertEqual(table.schema.field("AvgBaseQuality").type, pa.float32())
+        self.assertEqual(table.schema.field("Overlap").type, pa.bool_())
+        self.assertTrue(pa.types.is_dictionary(table.schema.field("Chromosome").type))
+        self.assertEqual(table.column("NumMismatches").to_pylist(), [2, None, 0])
+        self.assertEqual(table.column("Overlap").to_pylist(), [True, False, False])
+        self.assertEqual(table.column("Chromosome").to_pylist(), ["chr2", "chr1", "chr1"])
+        self.assertEqual(table.column("AvgBaseQuality").to_pylist(), [35.125, 30.0, 20.5])
+
+    def test_parquet_row_group_per_chunk(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            output_path = os.path.join(tmpdir, "output.parquet")
+            with ColumnarWriter(output_path, "parquet", contigs=["chr1", "chr2"]) as writer:
+                writer.write(self.df.iloc[:2])
+                writer.write(self.df.iloc[2:])
+            self.assertEqual(pq.ParquetFile(output_path).num_row_groups, 2)
+            self.check_table(pq.read_table(output_path))
+
+    def test_arrow_is_memory_mappable(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            output_path = os.path.join(tmpdir, "output.arrow")
+            with ColumnarWriter(output_path, "arrow", contigs=["chr1", "chr2"]) as writer:
+                writer.write(self.df.iloc[:1])
+                writer.write(self.df.iloc[1:])
+            with pa.memory_map(output_path) as source:
+                reader = pa.ipc.open_file(source)
+                self.assertEqual(reader.num_record_batches, 2)
+                self.check_table(reader.read_all())
+
+    def test_missing_metric_columns_are_left_out(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            output_path = os.path.join(tmpdir, "output.parquet")
+            write_columnar(self.df.drop(columns=["AvgBaseQuality", "NumMismatches"]), output_path)
+            self.assertEqual(pq.read_table(output_path).column_names,
+                             ["ReadID", "FragmentLength", "GCContent", "Overlap", "Chromosome",
+                              "Start", "End"])
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            ColumnarWriter("output.csv", "csv")
+
+
+class TestWriteHtml(unittest.TestCase):
+    def make_stats(self, n):
+        return pd.DataFrame({
+            "ReadID": [f"read{i}" for i in range(n)],
+            "FragmentLength": [100 + i % 300 for i in range(n)],
+            "AvgBaseQuality": [20 + i % 17 for i in range(n)],
+            "GCContent": [(i % 50) / 50 for i in range(n)],
+            "NumMismatches": [i % 6 for i in range(n)],
+            "Overlap": [i % 2 for i in range(n)]
+        })
+
+    def test_size_independent_of_read_count(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            small_path = os.path.join(tmpdir, "small.html")
+            large_path = os.path.join(tmpdir, "large.html")
+            write_html(self.make_stats(100), small_path)
+            write_html(self.make_stats(20000), large_path)
+            with open(large_path, encoding="utf-8") as f:
+                html = f.read()
+            self.assertNotIn("read1", html)
+            self.assertIn('"Overlap": [10000, 10000]', html)
+            self.assertIn('"NumMismatches": {"x": [0, 1, 2, 3, 4, 5]', html)
+            self.assertLess(abs(os.path.getsize(large_path) - os.path.getsize(small_path)), 200)
+
+    def test_charts_of_computed_metrics_only(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            output_path = os.path.join(tmpdir, "output.html")
+            write_html(self.make_stats(10)[["ReadID", "FragmentLength", "Overlap"]], output_path)
+            with open(output_path, encoding="utf-8") as f:
+                html = f.read()
+            self.assertIn('id="fragmentLength"', html)
+            self.assertIn('id="overlapChart"', html)
+            self.assertNotIn('id="gcContent"', html)
+            self.assertNotIn("data.AvgBaseQuality", html)
+
+    def test_filtered_reads_table(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            output_path = os.path.join(tmpdir, "output.html")
+            write_html(self.make_stats(10), output_path, {"DUP": 4, "MAPQ < 20": 2})
+            with open(output_path, encoding="utf-8") as f:
+                html = f.read()
+            self.assertIn("<h2>Filtered Reads</h2>", html)
+            self.assertIn("<tr><td>MAPQ &lt; 20</td><td>2</td></tr>", html)
+
+    def test_profile_table(self):
+        profile = {"stages": {"stats": {"wall_seconds": 2.0, "cpu_seconds": 1.5, "reads": 1000,
+                                        "peak_rss_mb": 120.0, "reads_per_sec": 500.0}},
+                   "total": {"wall_seconds": 2.0, "cpu_seconds": 1.5, "peak_rss_mb": 120.0,
+                             "peak_rss_children_mb": 0.0}}
+        with tempfile.TemporaryDirectory() as tmpdir:
+            plain_path = os.path.join(tmpdir, "plain.html")
+            output_path = os.path.join(tmpdir, "output.html")
+            write_html(self.make_stats(10), plain_path)
+            write_html(self.make_stats(10), output_path, profile=profile)
+            with open(plain_path, encoding="utf-8") as f:
+                self.assertNotIn("<h2>Profile</h2>", f.read())
+            with open(output_path, encoding="utf-8") as f:
+                html = f.read()
+            self.assertIn("<h2>Profile</h2>", html)
+            self.assertIn("<tr><td>stats</td><td>2.000</td><td>1.500</td><td>1000</td>"
+                          "<td>500</td><td>120</td></tr>", html)
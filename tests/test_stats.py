@@ -1,6 +1,42 @@
 import unittest
-from unittest.mock import Mock, patch
-from read_stats.stats import compute_avg_quality, compute_stats
+from unittest.mock import Mock, call, patch
+import numpy as np
+import pandas as pd
+from pandas.testing import assert_frame_equal
+from Bio.SeqUtils import gc_fraction as bio_gc_fraction
+from read_stats.stats import (
+    compute_avg_quality, compute_stats, compute_stats_batches, StatsBatch, MISSING_NM,
+    gc_fraction, batch_avg_quality, batch_gc_fraction, UnmappedReads, parse_metrics,
+    DEFAULT_METRICS, ReadFilter, parse_flags, pair_mates, md_edit_distance, batch_mismatches,
+    DEFAULT_BATCH_SIZE, MAX_READ_NAME, budget_batch_size
+)
+
+
+def make_read(name, tlen=200, quals=(10, 20, 30, 40), seq="AGCT", nm=1,
+              ref_id=0, ref_name="chr1", start=100, end=300, unmapped=False, flag=0, mapq=60):
+    read = Mock()
+    read.is_unmapped = unmapped
+    read.flag = flag | 4 if unmapped else flag
+    read.mapping_quality = mapq
+    read.query_name = name
+    read.template_length = tlen
+    read.query_qualities = list(quals)
+    read.query_sequence = seq
+    read.has_tag.return_value = nm is not None
+    read.get_tag.return_value = nm
+    read.reference_id = ref_id
+    read.reference_name = ref_name
+    read.reference_start = start
+    read.reference_end = end
+    return read
+
+def make_mate(name, start, mate_start, end=None, **kwargs):
+    read = make_read(name, start=start, end=start + 50 if end is None else end, flag=0x1, **kwargs)
+    read.is_paired = True
+    read.mate_is_unmapped = mate_start is None
+    read.next_reference_id = read.reference_id if mate_start is not None else -1
+    read.next_reference_start = mate_start if mate_start is not None else -1
+    return read
 
 class TestStats(unittest.TestCase):
     def test_compute_avg_quality_with_base_qualities(self):
@@ -75,7 +111,8 @@ class TestStats(unittest.TestCase):
 
         stats = compute_stats(mock_read)
         self.assertIsNone(stats["NumMismatches"])
-        mock_read.has_tag.assert_called_once_with("NM")
+        # Without NM the MD tag is tried next
+        self.assertEqual(mock_read.has_tag.call_args_list, [call("NM"), call("MD")])
         mock_read.get_tag.assert_not_called()
 
     @patch('read_stats.stats.gc_fraction')
@@ -100,5 +137,230 @@ class TestStats(unittest.TestCase):
         self.assertEqual(str(context_manager.exception), "Test error on gc_fraction")
 
 
+class TestVectorizedStats(unittest.TestCase):
+    SEQUENCES = ["AGCT", "", "NNNN", "GATTACA", "acgtnSWRYK", "GDVV", "ggccU", "N"]
+
+    def test_gc_fraction_matches_biopython(self):
+        for seq in self.SEQUENCES:
+            self.assertEqual(gc_fraction(seq), bio_gc_fraction(seq), seq)
+
+    def test_batch_gc_fraction_matches_biopython(self):
+        sequences = np.frombuffer("".join(self.SEQUENCES).encode("ascii"), dtype=np.uint8)
+        lengths = np.array([len(s) for s in self.SEQUENCES])
+        expected = [bio_gc_fraction(s) for s in self.SEQUENCES]
+        self.assertEqual(batch_gc_fraction(sequences, lengths).tolist(), expected)
+
+    def test_batch_avg_quality_matches_per_read(self):
+        reads = [[10, 20, 30, 40], [], [41], [2, 3, 5, 7, 11, 13]]
+        qualities = np.array([q for r in reads for q in r], dtype=np.uint8)
+        lengths = np.array([len(r) for r in reads])
+        expected = [compute_avg_quality(r) for r in reads]
+        self.assertEqual(batch_avg_quality(qualities, lengths).tolist(), expected)
+
+
+    def test_md_edit_distance(self):
+        read = Mock()
+        read.has_tag.side_effect = lambda tag: tag == "MD"
+        # 2 mismatches, 3 deleted bases and 2 inserted bases
+        read.get_tag.return_value = "10A5^ACG12T0"
+        read.get_cigar_stats.return_value = ([29, 2, 3, 0, 0, 0, 0, 0, 0, 0, 0], [])
+        self.assertEqual(md_edit_distance(read), 7)
+        read.has_tag.side_effect = None
+        read.has_tag.return_value = False
+        self.assertIsNone(md_edit_distance(read))
+
+    def test_batch_mismatches(self):
+        query = np.frombuffer(b"ACGTN" + b"AC=T", dtype=np.uint8)
+        reference = np.frombuffer(b"ACCTN" + b"TCGT", dtype=np.uint8)
+        # N matches nothing, "=" matches anything
+        self.assertEqual(batch_mismatches(query, reference, np.array([5, 0, 4])).tolist(),
+                         [2, 0, 1])
+
+
+class TestStatsBatches(unittest.TestCase):
+    def setUp(self):
+        self.contigs = ("chr1", "chr2")
+        self.reads = [
+            make_read("read1", tlen=-150, nm=2),
+            make_read("read2", unmapped=True),
+            make_read("read3", seq="GGGG", nm=None, ref_id=1, ref_name="chr2", start=5, end=55),
+            make_read("read4", quals=(), seq="ATAT", nm=0, ref_id=1, ref_name="chr2", start=7, end=57),
+        ]
+
+    def test_batches_are_split_by_size(self):
+        batches = list(compute_stats_batches(self.reads, self.contigs, batch_size=2))
+        self.assertEqual([len(b) for b in batches], [2, 1])
+        self.assertEqual(batches[0].read_ids.tolist(), [b"read1", b"read3"])
+        self.assertEqual(batches[0].fragment_length.dtype, np.int32)
+        self.assertEqual(batches[1].contig.tolist(), [1])
+
+    def test_budget_batch_size(self):
+        self.assertEqual(budget_batch_size(1 << 40), DEFAULT_BATCH_SIZE)
+        self.assertEqual(budget_batch_size(0), 1)
+        # Fewer metrics leave room for more reads
+        self.assertGreater(budget_batch_size(10000, ["fragment_length"]), budget_batch_size(10000))
+        reads = [make_read("r" * MAX_READ_NAME, start=i, end=i + 50) for i in range(20)]
+        budget = 1000
+        batches = list(compute_stats_batches(reads, self.contigs,
+                                             batch_size=budget_batch_size(budget)))
+        self.assertGreater(len(batches), 1)
+        for batch in batches:
+            self.assertLessEqual(batch.nbytes, budget)
+
+    def test_columns(self):
+        batch = StatsBatch.concat(compute_stats_batches(self.reads, self.contigs))
+        self.assertEqual(batch.fragment_length.tolist(), [150, 200, 200])
+        self.assertEqual(batch.avg_base_quality.tolist(), [25.0, 25.0, 0.0])
+        self.assertEqual(batch.gc_content.tolist(), [0.5, 1.0, 0.0])
+        self.assertEqual(batch.num_mismatches.tolist(), [2, MISSING_NM, 0])
+        self.assertEqual(batch.start.tolist(), [100, 5, 7])
+        self.assertEqual(batch.end.tolist(), [300, 55, 57])
+
+    def test_to_frame_matches_per_read_dicts(self):
+        expected = pd.DataFrame([s for s in map(compute_stats, self.reads) if s])
+        batch = StatsBatch.concat(compute_stats_batches(self.reads, self.contigs, batch_size=2))
+        assert_frame_equal(batch.to_frame(), expected)
+
+    def test_unmapped_reads_are_counted(self):
+        reads = self.reads + [make_read("read5", unmapped=True, ref_id=-1),
+                              make_read("read6", unmapped=True)]
+        with self.assertNoLogs('read_stats.stats', level='INFO'):
+            batches = list(compute_stats_batches(reads, self.contigs, batch_size=2, unmapped_names=1))
+        self.assertEqual([len(b) for b in batches], [2, 1])
+        batch = StatsBatch.concat(batches)
+        self.assertEqual(batch.unmapped.counts, {(0, 4): 2, (-1, 4): 1})
+        self.assertEqual(batch.unmapped.names, ["read2"])
+
+    def test_unmapped_reads_merge(self):
+        first, second = UnmappedReads(max_names=2), UnmappedReads(max_names=2)
+        for name in ("a", "b", "c"):
+            second.add(make_read(name, unmapped=True))
+        first.add(make_read("z", unmapped=True, ref_id=1))
+        first.merge(second)
+        self.assertEqual(first.total, 4)
+        self.assertEqual(first.names, ["z", "a"])
+
+    def test_concat_no_batches(self):
+        batch = StatsBatch.concat([], self.contigs)
+        self.assertEqual(len(batch), 0)
+        self.assertTrue(batch.to_frame().empty)
+
+    def test_selected_metrics_are_the_only_ones_decoded(self):
+        reads = [r for r in self.reads if not r.is_unmapped]
+        for read in reads:
+            # Accessing a deleted Mock attribute raises AttributeError
+            del read.query_sequence
+            del read.query_qualities
+        batches = list(compute_stats_batches(reads, self.contigs, batch_size=2,
+                                             metrics=("fragment_length", "mismatches")))
+        for read in reads:
+            self.assertEqual(read.has_tag.call_args_list[0], call("NM"))
+            self.assertLessEqual({c.args[0] for c in read.has_tag.call_args_list}, {"NM", "MD"})
+        batch = StatsBatch.concat(batches, self.contigs)
+        self.assertEqual(batch.metrics, ("fragment_length", "mismatches"))
+        self.assertIsNone(batch.gc_content)
+        self.assertEqual(batch.fragment_length.tolist(), [150, 200, 200])
+        self.assertEqual(batch.to_frame().columns.tolist(),
+                         ["ReadID", "FragmentLength", "NumMismatches", "Chromosome", "Start", "End"])
+
+    def test_selected_metrics_match_per_read_dicts(self):
+        metrics = ("base_quality",)
+        expected = pd.DataFrame([s for s in (compute_stats(r, metrics) for r in self.reads) if s])
+        batch = StatsBatch.concat(compute_stats_batches(self.reads, self.contigs, metrics=metrics))
+        assert_frame_equal(batch.to_frame(), expected)
+        self.assertEqual(StatsBatch.concat([], self.contigs, metrics).metrics, metrics)
+
+
+class TestReadFilter(unittest.TestCase):
+    def test_parse_flags(self):
+        self.assertEqual(parse_flags("0"), 0)
+        self.assertEqual(parse_flags("1024"), 0x400)
+        self.assertEqual(parse_flags("0xF00"), 0xF00)
+        self.assertEqual(parse_flags("010"), 8)
+        self.assertEqual(parse_flags("secondary,DUP"), 0x500)
+        self.assertEqual(parse_flags("SUPPLEMENTARY,0x200"), 0xA00)
+        with self.assertRaisesRegex(ValueError, "Unknown SAM flag: DUPLICATE"):
+            parse_flags("DUPLICATE")
+
+    def test_reasons(self):
+        read_filter = ReadFilter(require_flags=0x1, exclude_flags=0xD00, min_mapq=20)
+        self.assertIsNone(read_filter.reason(make_read("r", flag=0x1)))
+        self.assertEqual(read_filter.reason(make_read("r", flag=0x501)), "SECONDARY")
+        self.assertEqual(read_filter.reason(make_read("r", flag=0x801)), "SUPPLEMENTARY")
+        self.assertEqual(read_filter.reason(make_read("r", flag=0x2)), "missing required flags")
+        self.assertEqual(read_filter.reason(make_read("r", flag=0x1, mapq=5)), "MAPQ < 20")
+        self.assertFalse(ReadFilter().active)
+
+    def test_filtered_reads_are_counted_and_not_decoded(self):
+        reads = [make_read("kept"), make_read("dup", flag=0x400), make_read("low", mapq=3),
+                 make_read("unmapped", unmapped=True, flag=0x400)]
+        for read in reads[1:3]:
+            del read.query_sequence
+            del read.query_qualities
+            del read.template_length
+        read_filter = ReadFilter(exclude_flags=parse_flags("DUP"), min_mapq=10)
+        batch = StatsBatch.concat(compute_stats_batches(reads, ("chr1",), batch_size=1,
+                                                        read_filter=read_filter))
+        self.assertEqual(batch.read_ids.tolist(), [b"kept"])
+        self.assertEqual(batch.filtered, {"DUP": 1, "MAPQ < 10": 1})
+        self.assertEqual(batch.unmapped.total, 1)
+
+
+class TestPerFragment(unittest.TestCase):
+    def test_mates_are_paired_in_fragment_order(self):
+        a1, b1, b2, a2 = (make_mate("a", 100, 300), make_mate("b", 150, 200),
+                          make_mate("b", 200, 150), make_mate("a", 300, 100))
+        single = make_read("c", start=400)
+        single.is_paired = False
+        pairs = list(pair_mates([a1, b1, b2, a2, single]))
+        self.assertEqual(pairs, [(a1, a2), (b1, b2), (single, None)])
+
+    def test_reads_without_mate_are_evicted(self):
+        lost = make_mate("lost", 100, 250)
+        far = make_mate("far", 120, 900)
+        unmapped_mate = make_mate("alone", 130, None)
+        late = make_mate("late", 300, 320)
+        other_contig = make_mate("next", 10, 20, ref_id=1)
+        pairs = pair_mates([lost, far, unmapped_mate, late, other_contig], max_distance=500)
+        # "lost" is released once the stream passes 250; "late" when the contig ends
+        self.assertEqual([(first.query_name, mate) for first, mate in pairs],
+                         [("lost", None), ("far", None), ("alone", None), ("late", None),
+                          ("next", None)])
+
+    def test_fragment_stats(self):
+        reads = [make_mate("a", 100, 180, end=160, quals=(10, 20), seq="GG", nm=1, tlen=130),
+                 make_mate("b", 120, 500),
+                 make_mate("a", 180, 100, end=230, quals=(30, 60), seq="AT", nm=2, tlen=-130),
+                 make_read("a", flag=0x101, start=200),
+                 make_read("u", unmapped=True)]
+        for batch_size in (1, 64):
+            batch = StatsBatch.concat(compute_stats_batches(reads, ("chr1", "chr2"), batch_size,
+                                                            per_fragment=True))
+            df = batch.to_frame()
+            self.assertEqual(df["ReadID"].tolist(), ["a", "b"])
+            self.assertEqual(df.loc[0, ["FragmentLength", "AvgBaseQuality", "GCContent",
+                                        "NumMismatches", "Start", "End"]].tolist(),
+                             [130, 30.0, 0.5, 3, 100, 230])
+            self.assertEqual(batch.filtered, {"SECONDARY": 1})
+            self.assertEqual(batch.unmapped.total, 1)
+
+
+class TestParseMetrics(unittest.TestCase):
+    def test_default_is_all_metrics(self):
+        self.assertEqual(parse_metrics(None), DEFAULT_METRICS)
+
+    def test_registry_order(self):
+        self.assertEqual(parse_metrics("mismatches, fragment_length"),
+                         ("fragment_length", "mismatches"))
+
+    def test_unknown_metric(self):
+        with self.assertRaisesRegex(ValueError, "Unknown metrics: coverage"):
+            parse_metrics("fragment_length,coverage")
+
+    def test_no_metric(self):
+        with self.assertRaises(ValueError):
+            parse_metrics(",")
+
+
 if __name__ == '__main__':
     unittest.main()
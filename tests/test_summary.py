@@ -0,0 +1,139 @@
+import unittest
+import numpy as np
+import pandas as pd
+from read_stats.summary import StatsSummary, QuantileSketch, summarize_batch
+from read_stats.check_overlap import IntervalIndex
+from read_stats.stats import StatsBatch
+
+
+class TestStatsSummary(unittest.TestCase):
+    def setUp(self):
+        self.df = pd.DataFrame({
+            "FragmentLength": [0, 50, 51, 700, 120],
+            "AvgBaseQuality": [30.0, 20.0, None, 10.0, 40.0],
+            "GCContent": [0.0, 0.25, 0.3, 1.0, None],
+            "NumMismatches": [0, 1, 2, 15, None],
+            "Overlap": [1, 0, 1, 0, 0]
+        })
+
+    def test_bins_match_pd_cut(self):
+        summary = StatsSummary()
+        summary.update(self.df)
+        self.assertEqual(summary.total_reads, 5)
+        self.assertEqual(summary.overlap_count, 2)
+        self.assertEqual(summary.fragment_counts.tolist(), [2, 1, 1] + [0] * 10 + [1])
+        self.assertEqual(summary.gc_counts.tolist(), [2, 1, 0, 1])
+        self.assertEqual(summary.mismatch_counts.tolist(), [2, 1, 0, 0, 0, 0, 0, 0, 0, 0, 1])
+        self.assertEqual(summary.avg_base_quality, 25.0)
+        np.testing.assert_array_equal(summary.gc_avg_base_quality(), [25.0, np.nan, np.nan, 10.0])
+
+    def test_histograms(self):
+        summary = StatsSummary()
+        summary.update(self.df)
+        self.assertEqual(summary.quality_histogram.sum(), 4)
+        self.assertEqual(np.flatnonzero(summary.quality_histogram).tolist(), [10, 20, 30, 40])
+        self.assertEqual(summary.gc_histogram.sum(), 4)
+        self.assertEqual(summary.gc_histogram[[0, 25, 30, 99]].tolist(), [1, 1, 1, 1])
+        values, counts = summary.mismatches.value_counts()
+        self.assertEqual(values.tolist(), [0, 1, 2, 15])
+        self.assertEqual(counts.tolist(), [1, 1, 1, 1])
+
+    def test_chunked_updates(self):
+        whole = StatsSummary()
+        whole.update(self.df)
+        chunked = StatsSummary()
+        for start in range(0, len(self.df), 2):
+            chunked.update(self.df.iloc[start:start + 2])
+        self.assertEqual(chunked.total_reads, whole.total_reads)
+        self.assertEqual(chunked.fragment_counts.tolist(), whole.fragment_counts.tolist())
+        self.assertEqual(chunked.gc_quality_sum.tolist(), whole.gc_quality_sum.tolist())
+        self.assertEqual(chunked.avg_base_quality, whole.avg_base_quality)
+
+    def test_merge_matches_single_summary(self):
+        whole = StatsSummary()
+        whole.update(self.df)
+        merged = StatsSummary()
+        for start in range(0, len(self.df), 2):
+            part = StatsSummary()
+            part.update(self.df.iloc[start:start + 2])
+            merged.merge(part)
+        self.assertEqual(merged.total_reads, whole.total_reads)
+        self.assertEqual(merged.overlap_count, whole.overlap_count)
+        self.assertEqual(merged.gc_counts.tolist(), whole.gc_counts.tolist())
+        self.assertEqual(merged.quality_histogram.tolist(), whole.quality_histogram.tolist())
+        self.assertEqual(merged.avg_base_quality, whole.avg_base_quality)
+        self.assertEqual(merged.fragment_lengths.median(), whole.fragment_lengths.median())
+        self.assertEqual(merged.fragment_lengths.median(), 51.0)
+        self.assertEqual(merged.qualities.median(), 25.0)
+
+    def test_empty(self):
+        summary = StatsSummary()
+        summary.update(self.df.iloc[:0])
+        self.assertEqual(summary.total_reads, 0)
+        self.assertTrue(np.isnan(summary.avg_base_quality))
+
+
+    def test_selected_metrics(self):
+        summary = StatsSummary(("fragment_length",))
+        summary.update(self.df[["FragmentLength", "Overlap"]])
+        self.assertEqual(summary.total_reads, 5)
+        self.assertEqual(summary.fragment_counts.sum(), 5)
+        self.assertEqual(summary.gc_counts.sum(), 0)
+        self.assertEqual(summary.mismatches.count, 0)
+        self.assertTrue(np.isnan(summary.avg_base_quality))
+
+
+class TestQuantileSketch(unittest.TestCase):
+    def test_integer_quantiles_are_exact(self):
+        rng = np.random.default_rng(0)
+        values = np.append(rng.integers(0, 1000, 999), 10 ** 9)
+        sketch = QuantileSketch(dense_limit=512)
+        sketch.update(values[:500])
+        other = QuantileSketch(dense_limit=512)
+        other.update(values[500:])
+        sketch.merge(other)
+        self.assertEqual(sketch.count, 1000)
+        for q in (0, 0.05, 0.25, 0.5, 0.9, 1):
+            self.assertAlmostEqual(sketch.quantile(q), np.quantile(values, q))
+        self.assertAlmostEqual(sketch.mean(), values.mean())
+
+    def test_resolution(self):
+        sketch = QuantileSketch(0.01)
+        sketch.update([30.123, 30.127, np.nan, 40.0])
+        self.assertAlmostEqual(sketch.median(), 30.13)
+        self.assertEqual(sketch.count, 3)
+
+    def test_merge_different_resolution(self):
+        with self.assertRaises(ValueError):
+            QuantileSketch(0.01).merge(QuantileSketch(0.001))
+
+    def test_empty(self):
+        self.assertTrue(np.isnan(QuantileSketch().median()))
+
+
+class TestSummarizeBatch(unittest.TestCase):
+    def test_overlap_and_summary(self):
+        batch = StatsBatch(
+            ("chr1",), np.array([b"r1", b"r2"]), np.array([100, 200], dtype=np.int32),
+            np.array([30.0, 20.0]), np.array([0.5, 0.4]), np.array([1, -1], dtype=np.int32),
+            np.array([0, 0], dtype=np.int32), np.array([10, 500], dtype=np.int32),
+            np.array([60, 550], dtype=np.int32))
+        index = IntervalIndex(pd.DataFrame({"Chromosome": ["chr1"], "Start": [0], "End": [50]}))
+        df, summary = summarize_batch(batch, index)
+        self.assertEqual(df["Overlap"].tolist(), [1, 0])
+        self.assertEqual(df["OverlapBases"].tolist(), [40, 0])
+        self.assertEqual(summary.overlap_count, 1)
+        self.assertEqual(summary.mismatches.count, 1)
+        df, summary = summarize_batch(batch)
+        self.assertEqual(summary.overlap_count, 0)
+
+    def test_filtered_counts_are_merged(self):
+        batch = StatsBatch.empty(("chr1",))
+        batch.filtered.update({"DUP": 3})
+        _, first = summarize_batch(batch)
+        _, second = summarize_batch(batch)
+        self.assertEqual(first.merge(second).filtered, {"DUP": 6})
+
+
+if __name__ == "__main__":
+    unittest.main()